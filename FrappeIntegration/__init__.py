@@ -1,5 +1,8 @@
 from .frappe import Frappe
 from redbot.core.bot import Red
+from redbot.core.utils import get_end_user_data_statement
+
+__red_end_user_data_statement__ = get_end_user_data_statement(file=__file__)
 
 async def setup(bot: Red) -> None:
 	await bot.add_cog(Frappe(bot))
\ No newline at end of file
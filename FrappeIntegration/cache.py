@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import time
+import typing
+
+from .persistent_cache import PersistentCache
+
+log = logging.getLogger(__name__)
+
+# fetch(etag, last_modified) -> (value or None when not modified, etag, last_modified)
+Fetcher = typing.Callable[
+    [typing.Optional[str], typing.Optional[str]],
+    typing.Awaitable[typing.Tuple[typing.Any, typing.Optional[str], typing.Optional[str]]],
+]
+
+
+class CacheEntry:
+    __slots__ = ("value", "fetched_at", "etag", "last_modified")
+
+    def __init__(
+        self,
+        value: typing.Any,
+        etag: typing.Optional[str] = None,
+        last_modified: typing.Optional[str] = None,
+    ) -> None:
+        self.value: typing.Any = value
+        self.fetched_at: float = time.monotonic()
+        self.etag: typing.Optional[str] = etag
+        self.last_modified: typing.Optional[str] = last_modified
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class ResponseCache:
+    """
+    In-memory response cache with a TTL and stale-while-revalidate.
+
+    - Younger than `ttl`: served from memory.
+    - Younger than `ttl + stale_ttl`: served from memory while one background refresh runs.
+    - Older, or missing: the caller waits for the refresh.
+
+    Refreshes send the stored ETag/Last-Modified, so an unchanged response only costs a 304.
+    Concurrent callers of the same key share a single refresh.
+
+    With a `store`, responses are also written to disk and a key missing from memory is looked up
+    there first, keeping its age: after a restart a recent response is served at once. The store
+    may be shared, so entries are kept under `namespace` and `invalidate` only drops those.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        stale_ttl: float = 600,
+        store: typing.Optional[PersistentCache] = None,
+        *,
+        namespace: str = "response",
+    ) -> None:
+        self.ttl: float = ttl
+        self.stale_ttl: float = stale_ttl
+        self.store: typing.Optional[PersistentCache] = store
+        self.namespace: str = namespace
+        self._entries: typing.Dict[typing.Hashable, CacheEntry] = {}
+        self._refreshing: typing.Dict[typing.Hashable, asyncio.Task] = {}
+
+    async def get(
+        self,
+        key: typing.Hashable,
+        fetch: Fetcher,
+        *,
+        ttl: typing.Optional[float] = None,
+        stale_ttl: typing.Optional[float] = None,
+    ) -> typing.Any:
+        """The value of `key`; `ttl` and `stale_ttl` override the cache-wide ones for this call."""
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        entry = self._entries.get(key)
+        if entry is None and self.store is not None and self.store.is_open:
+            entry = await self._load(key)
+        if entry is not None:
+            if entry.age < ttl:
+                return entry.value
+            if entry.age < ttl + stale_ttl:
+                task = self._refresh(key, fetch)
+                task.add_done_callback(self._log_background_error)
+                return entry.value
+        return await self._refresh(key, fetch)
+
+    def invalidate(self, key: typing.Optional[typing.Hashable] = None) -> None:
+        """Drop one key, or everything when no key is given."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+        if self.store is not None and self.store.is_open:
+            task = asyncio.create_task(
+                self.store.clear(self.namespace + ":") if key is None else self.store.delete(self._store_key(key))
+            )
+            task.add_done_callback(self._log_background_error)
+
+    def _store_key(self, key: typing.Hashable) -> str:
+        return self.namespace + ":" + repr(key)
+
+    async def _load(self, key: typing.Hashable) -> typing.Optional[CacheEntry]:
+        stored = await self.store.get(self._store_key(key))
+        if stored is None:
+            return None
+        etag, last_modified = json.loads(stored.validator) if stored.validator else (None, None)
+        entry = CacheEntry(stored.value, etag, last_modified)
+        entry.fetched_at -= stored.age
+        self._entries[key] = entry
+        return entry
+
+    async def _save(self, key: typing.Hashable, entry: CacheEntry) -> None:
+        if self.store is not None and self.store.is_open:
+            await self.store.put(self._store_key(key), entry.value, json.dumps([entry.etag, entry.last_modified]))
+
+    def _refresh(self, key: typing.Hashable, fetch: Fetcher) -> asyncio.Task:
+        task = self._refreshing.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(self._do_refresh(key, fetch))
+            self._refreshing[key] = task
+        return task
+
+    async def _do_refresh(self, key: typing.Hashable, fetch: Fetcher) -> typing.Any:
+        try:
+            entry = self._entries.get(key)
+            value, etag, last_modified = await fetch(
+                entry.etag if entry else None, entry.last_modified if entry else None
+            )
+            if value is None and entry is not None:
+                # 304 Not Modified: the stored value is fresh again.
+                entry.fetched_at = time.monotonic()
+                entry.etag, entry.last_modified = etag, last_modified
+                await self._save(key, entry)
+                return entry.value
+            entry = self._entries[key] = CacheEntry(value, etag, last_modified)
+            await self._save(key, entry)
+            return value
+        finally:
+            self._refreshing.pop(key, None)
+
+    @staticmethod
+    def _log_background_error(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("Background cache refresh failed.", exc_info=task.exception())
@@ -0,0 +1,104 @@
+import typing
+
+import discord
+from redbot.core import commands
+from redbot.core.utils.views import SimpleMenu
+
+DESCRIPTION_LIMIT = 4096
+MESSAGE_LIMIT = 2000
+
+
+def join_within(items: typing.Iterable[str], separator: str = " ", limit: int = DESCRIPTION_LIMIT) -> typing.Iterator[str]:
+    """
+    Join `items` into as few strings as possible of at most `limit` characters each,
+    breaking only between items so a mention or emoji is never cut in half.
+    """
+    chunk: typing.List[str] = []
+    length = 0
+    for item in items:
+        added = len(item) + (len(separator) if chunk else 0)
+        if chunk and length + added > limit:
+            yield separator.join(chunk)
+            chunk = []
+            length = 0
+            added = len(item)
+        chunk.append(item)
+        length += added
+    if chunk:
+        yield separator.join(chunk)
+
+
+class EmbedPages:
+    """
+    Collect lines for an embed description and split them over as many embeds as needed.
+
+    Lines are kept in a list per page and joined once, so building the listing is linear
+    in its size. Every page stays below Discord's description limit; a line is only split
+    when it does not fit on an empty page by itself.
+    """
+
+    def __init__(
+        self,
+        title: str,
+        *,
+        colour: int = 0xFF0502,
+        footer: str = "© Shadowzone Gaming",
+        limit: int = DESCRIPTION_LIMIT,
+    ) -> None:
+        self.title: str = title
+        self.colour: int = colour
+        self.footer: str = footer
+        self.limit: int = limit
+        self._pages: typing.List[str] = []
+        self._lines: typing.List[str] = []
+        self._length: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self._pages or self._lines)
+
+    def add_line(self, line: str = "") -> None:
+        if not self._lines:
+            # Blank lines used as spacing are pointless at the top of a page.
+            line = line.lstrip("\n")
+        while len(line) > self.limit:
+            self._flush()
+            self._lines.append(line[: self.limit])
+            self._length = self.limit
+            line = line[self.limit :]
+        added = len(line) + (1 if self._lines else 0)
+        if self._length + added > self.limit:
+            self._flush()
+            line = line.lstrip("\n")
+            added = len(line)
+        self._lines.append(line)
+        self._length += added
+
+    def extend(self, lines: typing.Iterable[str]) -> "EmbedPages":
+        for line in lines:
+            self.add_line(line)
+        return self
+
+    def _flush(self) -> None:
+        if self._lines:
+            self._pages.append("\n".join(self._lines))
+        self._lines = []
+        self._length = 0
+
+    def build(self) -> typing.List[discord.Embed]:
+        self._flush()
+        pages = self._pages or [""]
+        embeds = []
+        for number, description in enumerate(pages, start=1):
+            embed = discord.Embed(title=self.title, description=description, colour=self.colour)
+            footer = self.footer if len(pages) == 1 else f"{self.footer} • {number}/{len(pages)}"
+            embed.set_footer(text=footer)
+            embeds.append(embed)
+        return embeds
+
+    async def send(self, ctx: commands.Context) -> None:
+        """Send the listing, with page buttons when it needs more than one embed."""
+        embeds = self.build()
+        if len(embeds) == 1:
+            await ctx.send(embed=embeds[0])
+        else:
+            await SimpleMenu(embeds, timeout=60 * 15).start(ctx)
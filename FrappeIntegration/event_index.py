@@ -0,0 +1,149 @@
+import typing
+
+
+class _TrieNode:
+    __slots__ = ("children", "names")
+
+    def __init__(self) -> None:
+        self.children: typing.Dict[str, "_TrieNode"] = {}
+        self.names: typing.Set[str] = set()
+
+
+class PrefixTrie:
+    """
+    Case-insensitive prefix trie over names. Every word of a name is indexed as well,
+    so `zomer` finds `Event 12: Zomerkamp`.
+    """
+
+    def __init__(self) -> None:
+        self._root: _TrieNode = _TrieNode()
+
+    @staticmethod
+    def _keys(name: str) -> typing.Iterator[str]:
+        words = name.lower().split()
+        for index in range(len(words)):
+            yield " ".join(words[index:])
+
+    def insert(self, name: str) -> None:
+        for key in self._keys(name):
+            node = self._root
+            for char in key:
+                node = node.children.setdefault(char, _TrieNode())
+            node.names.add(name)
+
+    def remove(self, name: str) -> None:
+        for key in self._keys(name):
+            path = [self._root]
+            for char in key:
+                node = path[-1].children.get(char)
+                if node is None:
+                    break
+                path.append(node)
+            else:
+                path[-1].names.discard(name)
+                # Prune nodes that no longer lead to any name.
+                for char, parent, node in zip(reversed(key), reversed(path[:-1]), reversed(path[1:])):
+                    if node.names or node.children:
+                        break
+                    del parent.children[char]
+
+    def search(self, prefix: str, limit: int = 25) -> typing.List[str]:
+        node = self._root
+        for char in " ".join(prefix.lower().split()):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        found: typing.List[str] = []
+        seen: typing.Set[str] = set()
+        stack = [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            for name in sorted(node.names):
+                if name not in seen:
+                    seen.add(name)
+                    found.append(name)
+            stack.extend(node.children[char] for char in sorted(node.children, reverse=True))
+        return found[:limit]
+
+
+class EventNameIndex:
+    """
+    The event names of `Beheer events`, kept in a `PrefixTrie` for autocomplete.
+
+    `load` takes the current rows (from the doctype mirror) and only touches the trie for
+    events that were added, renamed or removed since the previous load. Several documents may
+    carry the same event name; the name stays searchable until the last of them is gone.
+    """
+
+    def __init__(self) -> None:
+        self._trie: PrefixTrie = PrefixTrie()
+        self._events: typing.Dict[str, typing.Tuple[str, str]] = {}  # doc name -> (event_name, creation)
+        self._docs: typing.Dict[str, typing.Set[str]] = {}  # event_name -> doc names carrying it
+        self._by_lower: typing.Dict[str, str] = {}  # lowercased event_name -> event_name
+
+    def _upsert(self, name: str, event_name: str, creation: str) -> None:
+        self._remove(name)
+        self._events[name] = (event_name, creation)
+        docs = self._docs.setdefault(event_name, set())
+        if not docs:
+            self._trie.insert(event_name)
+            self._by_lower.setdefault(event_name.lower(), event_name)
+        docs.add(name)
+
+    def _remove(self, name: str) -> None:
+        old = self._events.pop(name, None)
+        if old is None:
+            return
+        event_name = old[0]
+        docs = self._docs[event_name]
+        docs.discard(name)
+        if docs:
+            return
+        del self._docs[event_name]
+        self._trie.remove(event_name)
+        lower = event_name.lower()
+        if self._by_lower.get(lower) == event_name:
+            del self._by_lower[lower]
+            # Another spelling of the same name may still be around.
+            other = next((other for other in self._docs if other.lower() == lower), None)
+            if other is not None:
+                self._by_lower[lower] = other
+
+    def load(self, rows: typing.Iterable[dict]) -> None:
+        """Bring the index in line with `rows`, each having `name`, `event_name` and `creation`."""
+        current = {row["name"]: (row["event_name"], row["creation"]) for row in rows if row.get("event_name")}
+        for name in self._events.keys() - current.keys():
+            self._remove(name)
+        for name, event in current.items():
+            if self._events.get(name) != event:
+                self._upsert(name, *event)
+
+    def resolve(self, event_name: str) -> typing.Optional[str]:
+        """
+        The stored spelling of `event_name` (case-insensitive), or None if it is unknown.
+        The name of a document carrying the event, as handed out by `short_key`, resolves as well.
+        """
+        event_name = event_name.strip()
+        resolved = self._by_lower.get(event_name.lower())
+        if resolved is None and event_name in self._events:
+            resolved = self._events[event_name][0]
+        return resolved
+
+    def short_key(self, event_name: str, limit: int = 100) -> typing.Optional[str]:
+        """
+        A string of at most `limit` characters that `resolve` turns back into `event_name`:
+        the name itself, or a document name when the event name is too long. None if neither fits.
+        """
+        if len(event_name) <= limit:
+            return event_name
+        return next((name for name in sorted(self._docs.get(event_name, ())) if len(name) <= limit), None)
+
+    def search(self, prefix: str, limit: int = 25) -> typing.List[str]:
+        if not prefix.strip():
+            return self.all_names()[:limit]
+        return self._trie.search(prefix, limit)
+
+    def all_names(self) -> typing.List[str]:
+        """All event names, newest first, each once."""
+        events = sorted(self._events.values(), key=lambda event: event[1], reverse=True)
+        return list(dict.fromkeys(event_name for event_name, creation in events))
@@ -1,43 +1,343 @@
+import asyncio
 import discord
+from discord import app_commands
+from discord.ext import tasks
 import logging
 from redbot.core.bot import Red
-from redbot.core import commands
-import requests
+from redbot.core import commands, Config
+from redbot.core.data_manager import cog_data_path
 import datetime
 import aiohttp
 import io
-from frappeclient import FrappeClient
+import time
+import typing
 import pytz
 
+from .cache import ResponseCache
+from .embeds import DESCRIPTION_LIMIT, MESSAGE_LIMIT, EmbedPages, join_within
+from .event_index import EventNameIndex
+from .frappe_api import AsyncFrappeClient, CircuitOpenError, FrappeError, FRAPPE_ERRORS
+from .jobs import Job, JobRunner
+from .media import Prefetcher
+from .metrics import Metrics, prometheus, route_key, summary_line
+from .persistent_cache import PersistentCache
+from .reconcile import EventRoleDiff, index_ranking, reconcile_event_roles
+from .resolver import MemberResolver
+from .roles import EventRoleIndex, RoleApplyResult, RoleChange, apply_role_changes, event_role_name
+from .sync import DoctypeMirror, MirrorSpec
+from .sponsorkliks import SponsorkliksClient, append_snapshot, from_snapshot, snapshot_at, to_snapshot
+from .tiers import MemberTierCache
+from .webhook import DELETE_EVENTS, WebhookServer, send_webhook
+
+class FrappeServices(typing.NamedTuple):
+    """Wat de Frappe cog met een andere cog deelt, via `bot.get_cog("Frappe").services(cog)`"""
+    client: AsyncFrappeClient
+    cache: typing.Optional[PersistentCache]  # None zolang de cache niet open is
+    responses: ResponseCache  # Stale-while-revalidate per cog, op de cache hierboven
+    metrics: Metrics  # Apart per cog in `[p]frappe metrics`
+    errors = FRAPPE_ERRORS
+    FrappeError = FrappeError
+    CircuitOpenError = CircuitOpenError
+
 class Frappe(commands.Cog):
+    route_key = staticmethod(route_key)
+
     def __init__(self, bot: Red) -> None:
         self.bot = bot
         self.Frappeclient = None
+        self.cache = None
+        self.mirror = None
+        self.event_index = EventNameIndex()
+        self._events_refresh = None
+        self.webhook = None
         self.local_timezone = pytz.timezone('Europe/Amsterdam')
         self.target_guild_id = 331058477541621774
         self.log = logging.getLogger(__name__)
 
+        self.config = Config.get_conf(self, identifier=331058477541621774, force_registration=True)
+        default_global = {
+            "ranking_ttl": 300,  # Seconden dat de event ranking vers is
+            "ranking_stale_ttl": 600,  # Seconden daarna nog serveren terwijl op de achtergrond ververst wordt
+            "sponsorkliks_history": [],  # [unix tijd, P, A, S, Q, T], alleen als de bedragen veranderd zijn
+            "sponsorkliks_checked": 0,  # Unix tijd van de laatste geslaagde controle
+            "webhook_enabled": False,  # Frappe webhooks ontvangen in plaats van pollen
+            "webhook_host": "127.0.0.1",
+            "webhook_port": 8765,
+        }
+        self.config.register_global(**default_global)
+        self.ranking_cache = ResponseCache()
+        self.event_roles = EventRoleIndex()
+        self.tiers = MemberTierCache()
+        self.sponsorkliks_client = SponsorkliksClient()
+        self.metrics = Metrics()
+        self.cog_metrics = {}  # cog naam -> Metrics van de andere cogs
+        self.cog_responses = {}  # cog naam -> ResponseCache van de andere cogs
+        self.resolver = MemberResolver(metrics=self.metrics)
+        self.jobs = JobRunner()
+
     async def cog_load(self):
+        self.ranking_cache.ttl = await self.config.ranking_ttl()
+        self.ranking_cache.stale_ttl = await self.config.ranking_stale_ttl()
+
         frappe_keys = await self.bot.get_shared_api_tokens("frappelogin")
-        api_key =  frappe_keys.get("username")
-        api_secret = frappe_keys.get("password")
-        if api_key and api_secret:
-            self.Frappeclient = FrappeClient("https://shadowzone.nl")
-            self.Frappeclient.login(api_key, api_secret)
+        self.Frappeclient = AsyncFrappeClient.from_tokens("https://shadowzone.nl", frappe_keys, metrics=self.metrics)
+        # Alleen de kolommen die de commando's lezen, plus discord_id om gegevens per gebruiker te kunnen verwijderen.
+        # Vrije tekst (opmerkingen, dieetwensen, ideeën) blijft in Frappe en wordt live opgehaald.
+        self.mirror = DoctypeMirror(self.Frappeclient, cog_data_path(self) / "mirror.sqlite3", [
+            MirrorSpec('Member', ['discord_id', 'membership_type', 'member_name', 'custom_achternaam', 'custom_startdatum_donateur', 'custom_einddatum_donateur', 'custom_begin_datum', 'custom_start_lidmaatschap', 'custom_einde_datum'], {'custom_contributies': ['jaar']}),
+            MirrorSpec('Event deelnemers', ['event', 'creation', 'payment_status', 'discord_id', 'pakket1', 'vertrek', 'aankomst']),
+            MirrorSpec('Beheer events', ['event_name', 'creation']),
+        ])
+        await self.mirror.open()
+        # Op schijf, zodat de event ranking en de gegevens van de andere cogs na een herstart of reload direct beschikbaar zijn
+        self.cache = PersistentCache(cog_data_path(self) / "cache.sqlite3")
+        await self.cache.open()
+        self.ranking_cache.store = self.cache
+        if self.Frappeclient.has_credentials:
+            try:
+                await self.Frappeclient.login()
+            except FRAPPE_ERRORS as error:
+                self.log.error(f"Login bij Frappe mislukt: {error}")
         else:
             self.log.error("API keys for Frappe are missing.")
 
+        self.sponsorkliks_loop.start()
+        self.mirror_loop.start()
+        if await self.config.webhook_enabled():
+            await self._start_webhook()
+
+    async def cog_unload(self):
+        self.jobs.cancel_all()
+        self.sponsorkliks_loop.cancel()
+        self.mirror_loop.cancel()
+        if self._events_refresh:
+            self._events_refresh.cancel()
+        if self.webhook:
+            await self.webhook.stop()
+        if self.mirror:
+            await self.mirror.close()
+        if self.cache:
+            await self.cache.close()
+        await self.sponsorkliks_client.close()
+        if self.Frappeclient:
+            await self.Frappeclient.close()
+
+    async def red_delete_data_for_user(self, *, requester, user_id: int):
+        """Verwijder de lokale kopie van de Frappe gegevens van deze gebruiker; Frappe zelf blijft ongewijzigd"""
+        if self.mirror and self.mirror.is_open:
+            await self.mirror.purge('discord_id', [str(user_id), user_id])
+        # De bewaarde event ranking bevat Discord ID's en wordt bij het volgende gebruik opnieuw opgehaald
+        self.ranking_cache.invalidate()
+
+    async def cog_command_error(self, ctx: commands.Context, error: Exception):
+        if not await self.handle_command_error(ctx, error):
+            await self.bot.on_command_error(ctx, error, unhandled_by_cog=True)
+
+    async def handle_command_error(self, ctx: commands.Context, error: Exception) -> bool:
+        """
+        Meld een Frappe fout uit een commando aan de gebruiker, ook voor de andere cogs.
+        Geeft False terug als het geen Frappe fout is.
+        """
+        original = getattr(error, "original", error)
+        if isinstance(original, CircuitOpenError):
+            await ctx.send(f"⚠️ Frappe is op dit moment onbereikbaar. Probeer het over {original.retry_in:.0f} seconden opnieuw.")
+        elif isinstance(original, FRAPPE_ERRORS):
+            self.log.warning(f"Frappe fout tijdens {ctx.command.qualified_name}: {original!r}")
+            await ctx.send("⚠️ Frappe reageert niet zoals verwacht. Probeer het later opnieuw.")
+        elif isinstance(original, commands.UserFeedbackCheckFailure):
+            # Uit services(), binnen het commando in plaats van in een check
+            await ctx.send(original.message)
+        else:
+            return False
+        return True
+
+    @tasks.loop(hours=1)
+    async def sponsorkliks_loop(self):
+        """
+        Legt elk uur de Sponsorkliks stand vast, zodat het commando direct kan antwoorden.
+        """
+        try:
+            await self._snapshot_sponsorkliks()
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as error:
+            self.log.warning(f"Sponsorkliks stand ophalen mislukt: {error}")
+
+    @sponsorkliks_loop.before_loop
+    async def before_sponsorkliks_loop(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(minutes=5)
+    async def mirror_loop(self):
+        """
+        Houdt de lokale kopie van de Frappe doctypes bij. Alleen gewijzigde documenten worden opgehaald.
+        """
+        if self.webhook_running:
+            # Wijzigingen komen binnen via de webhook
+            return
+        try:
+            await self.mirror.sync()
+            self.event_index.load(await self.mirror.rows('Beheer events'))
+        except FRAPPE_ERRORS as error:
+            self.log.warning(f"Frappe synchroniseren mislukt: {error}")
+
+    @mirror_loop.before_loop
+    async def before_mirror_loop(self):
+        await self.bot.wait_until_ready()
+
+    async def _refresh_events(self):
+        await self.mirror.ensure_fresh('Beheer events')
+        self.event_index.load(await self.mirror.rows('Beheer events'))
+
+    def metrics_for(self, cog: commands.Cog) -> Metrics:
+        """De metrics van een andere cog, die `[p]frappe metrics` apart toont"""
+        return self.cog_metrics.setdefault(cog.qualified_name, Metrics())
+
+    def responses_for(self, cog: commands.Cog) -> ResponseCache:
+        """De ResponseCache van een andere cog, met eigen sleutels in de gedeelde cache op schijf"""
+        responses = self.cog_responses.setdefault(cog.qualified_name, ResponseCache(namespace=cog.qualified_name))
+        responses.store = self.cache
+        return responses
+
+    def services(self, cog: commands.Cog) -> FrappeServices:
+        """De client, caches en metrics voor een andere cog; zonder API keys een melding voor de gebruiker"""
+        if self.Frappeclient is None or not self.Frappeclient.has_credentials:
+            raise commands.UserFeedbackCheckFailure("⚠️ Frappe is niet ingesteld: de API keys ontbreken.")
+        cache = self.cache if self.cache is not None and self.cache.is_open else None
+        return FrappeServices(self.Frappeclient, cache, self.responses_for(cog), self.metrics_for(cog))
+
+    @property
+    def webhook_running(self) -> bool:
+        """Of Frappe wijzigingen naar de bot pusht; andere cogs slaan dan hun polling over"""
+        return self.webhook is not None and self.webhook.running
+
+    async def _start_webhook(self):
+        """Start de webhook ontvanger, geeft een foutmelding terug als dat niet lukt"""
+        webhook_keys = await self.bot.get_shared_api_tokens("frappewebhook")
+        if not webhook_keys.get("secret"):
+            return "Er is geen webhook secret ingesteld. Gebruik `[p]set api frappewebhook secret,<secret>`."
+        if self.webhook:
+            await self.webhook.stop()
+        self.webhook = WebhookServer(
+            webhook_keys["secret"],
+            lambda doctype, event, doc: self.bot.dispatch("frappe_doc_event", doctype, event, doc),
+            host=await self.config.webhook_host(),
+            port=await self.config.webhook_port(),
+        )
+        try:
+            await self.webhook.start()
+        except OSError as error:
+            self.webhook = None
+            self.log.error(f"Frappe webhook starten mislukt: {error}")
+            return f"Webhook starten mislukt: {error}"
+        return None
+
+    @commands.Cog.listener()
+    async def on_red_api_tokens_update(self, service_name: str, api_tokens: dict):
+        if service_name == "frappewebhook" and self.webhook and api_tokens.get("secret"):
+            self.webhook.secret = api_tokens["secret"]
+
+    @commands.Cog.listener()
+    async def on_frappe_doc_event(self, doctype: str, event: str, doc: dict):
+        """Verwerk een gepushte wijziging in de lokale kopie en de caches"""
+        if doctype in self.mirror.specs:
+            if event in DELETE_EVENTS:
+                await self.mirror.remove(doctype, doc['name'])
+            else:
+                await self.mirror.upsert(doctype, doc)
+        if doctype == 'Beheer events':
+            self.event_index.load(await self.mirror.rows('Beheer events'))
+        elif doctype == 'Event deelnemers':
+            self.ranking_cache.invalidate()
+
+    async def _refresh_events_quietly(self):
+        try:
+            await self._refresh_events()
+        except FRAPPE_ERRORS as error:
+            self.log.warning(f"Events verversen mislukt: {error}")
+
+    async def _snapshot_sponsorkliks(self) -> dict:
+        """Haal de stand op en voeg die toe aan de geschiedenis als er iets veranderd is"""
+        totals = await self.sponsorkliks_client.fetch()
+        async with self.config.sponsorkliks_history() as history:
+            append_snapshot(history, to_snapshot(totals))
+        await self.config.sponsorkliks_checked.set(int(time.time()))
+        return totals
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role):
+        self.event_roles.role_created(role)
+        self.tiers.invalidate(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self.event_roles.role_updated(before, after)
+        if before.name != after.name:
+            self.tiers.invalidate(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.event_roles.role_deleted(role)
+        self.tiers.invalidate(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.event_roles.invalidate(guild.id)
+        self.tiers.invalidate(guild.id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        self.tiers.member_updated(before, after)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        self.tiers.member_removed(member)
+        self.resolver.forget(member.guild.id, member.id)
+
+    async def _event_ranking(self, ctx: commands.Context):
+        """
+        Haal de event ranking op met de `frappe` API tokens, of stuur een foutmelding en geef None terug.
+        Het antwoord komt uit `self.ranking_cache`, zodat opeenvolgende commando's de server hooguit één keer per TTL raken.
+        """
+        frappe_keys = await self.bot.get_shared_api_tokens("frappe")
+        if frappe_keys.get("api_key") is None:
+            await ctx.send("The Frappe API key has not been set. Use `[p]set api` to do this.")
+            return None
+        api_key =  frappe_keys.get("api_key")
+        api_secret = frappe_keys.get("api_secret")
+        headers = {'Authorization': 'token ' +api_key+ ':' +api_secret}
+
+        async def fetch(etag, last_modified):
+            return await self.Frappeclient.call_method_conditional(
+                'event_ranking', headers=headers, etag=etag, last_modified=last_modified
+            )
+
+        try:
+            return await self.ranking_cache.get(('event_ranking', api_key), fetch)
+        except CircuitOpenError:
+            # Naar cog_command_error, die meldt dat Frappe onbereikbaar is
+            raise
+        except FrappeError as error:
+            await ctx.send("Status code:" +str(error.status))
+            return None
+
     @commands.guild_only()
     @commands.hybrid_command(name="sponsorkliks", description="Zie de Sponsorkliks status")
     async def sponsorkliks(self, ctx):
         """Zie de Sponsorkliks status"""
-        response = requests.get("https://www.sponsorkliks.com/api/?club=11592&call=commissions_total", headers={'User-Agent': 'My User Agent 1.0'})
-        json_object = response.json()
-        pending = float(json_object['commissions_total']['pending'])
-        accepted = float(json_object['commissions_total']['accepted'])
-        ontvangen = float(json_object['commissions_total']['sponsorkliks'])
-        qualified = float(json_object['commissions_total']['qualified'])
-        total = float(json_object['commissions_total']['transferred'])
+        history = await self.config.sponsorkliks_history()
+        if not history or time.time() - await self.config.sponsorkliks_checked() > 3600:
+            try:
+                await self._snapshot_sponsorkliks()
+                history = await self.config.sponsorkliks_history()
+            except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as error:
+                self.log.warning(f"Sponsorkliks stand ophalen mislukt: {error}")
+                if not history:
+                    return await ctx.send("Sponsorkliks is op dit moment niet bereikbaar")
+        totals = from_snapshot(history[-1])
+        pending = totals['pending']
+        accepted = totals['accepted']
+        ontvangen = totals['sponsorkliks']
+        qualified = totals['qualified']
+        total = totals['transferred']
 
         description = "P: € " +str(round(pending, 2))+ " \n A: € " +str(round(accepted, 2))+ " \n S: € " +str(round(ontvangen, 2))+ " \n Q: € " +str(round(qualified, 2))+ " \n\n T: € " +str(round(total, 2))
         
@@ -46,9 +346,23 @@ class Frappe(commands.Cog):
         embed.title = "Sponsorkliks"
         embed.colour = int("ff0502", 16)
         embed.add_field(name="\u200B", value=description, inline=False)
+        trend = self._sponsorkliks_trend(history)
+        if trend:
+            embed.add_field(name="Opgebouwd", value=trend, inline=False)
         embed.add_field(name="\u200B", value="-# P: In behandeling • A: Geaccepteerd • S: Ontvangen door Sponsorkliks • Q: Onderweg naar Shadowzone • T: Totaal overgemaakt", inline=False)
         await ctx.send(embed=embed)
 
+    @staticmethod
+    def _sponsorkliks_trend(history: list) -> str:
+        """Toename van alle commissies samen (P + A + S + Q + T) over de afgelopen week en maand"""
+        now = sum(history[-1][1:])
+        lines = []
+        for label, days in (("7 dagen", 7), ("30 dagen", 30)):
+            past = snapshot_at(history, time.time() - days * 86400)
+            if past:
+                lines.append(f"{label}: € {round(now - sum(past[1:]), 2):+}")
+        return " \n ".join(lines)
+
     @commands.guild_only()
     @commands.has_permissions(administrator=True)
     @commands.bot_has_permissions(embed_links=True)
@@ -61,87 +375,222 @@ class Frappe(commands.Cog):
     @commands.is_owner()
     async def steljezelfvoor(self, ctx: commands.Context):
         """Send stel jezelf voor berichten"""
-        response = self.Frappeclient.get_list('Stel jezelf voor planner', filters = {'concept': 0}, fields = ['concept', 'name', 'dag', 'titel', 'url', 'text', 'url_ai'], limit_page_length=float('inf'))
-        
+        today = datetime.datetime.now(self.local_timezone).date()
+        # Alleen de aankondigingen die vandaag of eerder aan de beurt zijn komen van de server
+        due = [
+            aankondiging
+            async for aankondiging in self.Frappeclient.iter_list('Stel jezelf voor planner', filters = {'concept': 0, 'dag': ['<=', str(today)]}, fields = ['name', 'dag', 'titel', 'url', 'text', 'url_ai'])
+        ]
+
         channel = ctx.guild.get_channel(1053344324487761980)
-        if response:
-            for aankondiging in response:
-                if datetime.datetime.strptime(aankondiging['dag'], '%Y-%m-%d').date() <= datetime.datetime.now(self.local_timezone).date():
+        if due:
+            # Alle podcasts alvast downloaden (max 3 tegelijk) terwijl de eerdere threads geplaatst worden
+            async with Prefetcher(concurrency=3) as prefetcher:
+                for aankondiging in due:
+                    if aankondiging['url_ai']:
+                        prefetcher.prefetch(aankondiging['name'], aankondiging['url_ai'])
+                for aankondiging in due:
                     if aankondiging['url_ai']:
-                        url = aankondiging['url_ai']
-                        async with aiohttp.ClientSession() as session:
-                                async with session.get(url) as resp:
-                                    if resp.status == 200:
-                                        image_data = await resp.read()
-                                        with io.BytesIO(image_data) as file:
-                                            await channel.create_thread(name = aankondiging['titel'], content = aankondiging['text'] + '\n\n [Lees verder...](' + aankondiging['url'] + ') \n\n Of luister naar een door AI gegenereerde podcast over deze persoon:', file=discord.File(file, aankondiging['titel'] + ".wav"))
-                                            self.Frappeclient.delete('Stel jezelf voor planner', aankondiging['name'])
+                        file = await prefetcher.take(aankondiging['name'])
+                        if file is None:
+                            continue
+                        with file:
+                            await channel.create_thread(name = aankondiging['titel'], content = aankondiging['text'] + '\n\n [Lees verder...](' + aankondiging['url'] + ') \n\n Of luister naar een door AI gegenereerde podcast over deze persoon:', file=discord.File(file, aankondiging['titel'] + ".wav"))
+                        await self.Frappeclient.delete('Stel jezelf voor planner', aankondiging['name'])
                     else:
                         await channel.create_thread(name = aankondiging['titel'], content = aankondiging['text'] + '\n\n [Lees verder...](' + aankondiging['url'] + ')')
-                        self.Frappeclient.delete('Stel jezelf voor planner', aankondiging['name'])           
+                        await self.Frappeclient.delete('Stel jezelf voor planner', aankondiging['name'])
 
     @frappe.command()
     @commands.has_permissions(administrator=True)
     async def contributie(self, ctx: commands.Context, jaar: int):
         """Check of contributie betaald is"""
         if jaar > 2018:
-            data = self.Frappeclient.get_list('Member', fields = ['name', 'membership_type','member_name', 'custom_achternaam', 'custom_status', 'custom_startdatum_donateur', 'custom_einddatum_donateur', 'custom_begin_datum', 'custom_start_lidmaatschap', 'custom_einde_datum'], order_by = 'member_name asc', filters=None, limit_start=0, limit_page_length=float('inf'))
-            if data:
-                message = ""
-                aantal = 0
-                for member in data:
-                    progress = 0
-                    if member['membership_type'] == 'Lid':
-                        if datetime.datetime.strptime(member['custom_start_lidmaatschap'], '%Y-%m-%d').year <= jaar:
-                            if member['custom_einde_datum']:
-                                if datetime.datetime.strptime(member['custom_einde_datum'], '%Y-%m-%d').year >= jaar:
-                                    logo = '<:szglogo:945293100824277002>'
-                                    progress = 1
-                            else:
+            result = await self.jobs.run(ctx, f"contributie {jaar}", lambda job: self._contributie_report(job, jaar))
+            await self._send_result(ctx, result)
+        else:
+            await ctx.send("Pas sinds 2019 zijn betalingen mogelijk")
+
+    async def _contributie_report(self, job: Job, jaar: int):
+        # Members and their contribution rows come from the local mirror, joined in memory below
+        job.report("leden synchroniseren")
+        await self.mirror.ensure_fresh('Member')
+        data = await self.mirror.rows('Member', order_by = 'member_name asc')
+        contributies = await self.mirror.children('Member', 'custom_contributies')
+        job.report("contributies controleren")
+        if data:
+            message = []
+            aantal = 0
+            for member in data:
+                progress = 0
+                if member['membership_type'] == 'Lid':
+                    if datetime.datetime.strptime(member['custom_start_lidmaatschap'], '%Y-%m-%d').year <= jaar:
+                        if member['custom_einde_datum']:
+                            if datetime.datetime.strptime(member['custom_einde_datum'], '%Y-%m-%d').year >= jaar:
                                 logo = '<:szglogo:945293100824277002>'
                                 progress = 1
-                    if progress == 0:
-                        if member['custom_startdatum_donateur']:
-                            startdatum = member['custom_startdatum_donateur']
                         else:
-                            startdatum = member['custom_begin_datum']
-                        if startdatum:
-                            if datetime.datetime.strptime(startdatum, '%Y-%m-%d').year <= jaar:
-                                if member['custom_einddatum_donateur']:
-                                    if datetime.datetime.strptime(member['custom_einddatum_donateur'], '%Y-%m-%d').year >= jaar:
-                                        logo = '<:SZGplus:1188373927119040562>'
-                                        progress = 1
-                                elif not member['custom_einde_datum']:
+                            logo = '<:szglogo:945293100824277002>'
+                            progress = 1
+                if progress == 0:
+                    if member['custom_startdatum_donateur']:
+                        startdatum = member['custom_startdatum_donateur']
+                    else:
+                        startdatum = member['custom_begin_datum']
+                    if startdatum:
+                        if datetime.datetime.strptime(startdatum, '%Y-%m-%d').year <= jaar:
+                            if member['custom_einddatum_donateur']:
+                                if datetime.datetime.strptime(member['custom_einddatum_donateur'], '%Y-%m-%d').year >= jaar:
                                     logo = '<:SZGplus:1188373927119040562>'
                                     progress = 1
+                            elif not member['custom_einde_datum']:
+                                logo = '<:SZGplus:1188373927119040562>'
+                                progress = 1
 
-                    if progress == 1:
-                        jaarcheck = 0
-                        doc = self.Frappeclient.get_doc("Member", member['name'])
-                        for item in doc.get("custom_contributies"):
-                            if item['jaar'] == jaar:
-                                jaarcheck = 1
-                            
-                        if jaarcheck == 0:
-                            message = message + '<:wrong:847044649679716383> ' + logo + member['member_name'] + ' ' + member['custom_achternaam'] + '\n'
-                            aantal = aantal + 1
-                        else:
-                            message = message + '<:check:847044460666814484> ' + logo + member['member_name'] + ' ' + member['custom_achternaam'] + '\n'
-                            aantal = aantal + 1
-                if message:
-                    embed = discord.Embed()
-                    embed.description = "Aantal: " + str(aantal) + '\n\n' + message
-                    embed.title = " Betaalde contributies/donaties " + str(jaar)
-                    embed.colour = int("ff0502", 16)
-                    embed.set_footer(text="© Shadowzone Gaming")
-                    await ctx.send(embed=embed)
-                else:
-                    await ctx.send('Niks gevonden voor dit jaar')
+                if progress == 1:
+                    jaarcheck = 0
+                    for item in contributies.get(member['name'], []):
+                        if item['jaar'] == jaar:
+                            jaarcheck = 1
+                        
+                    if jaarcheck == 0:
+                        message.append('<:wrong:847044649679716383> ' + logo + member['member_name'] + ' ' + member['custom_achternaam'])
+                        aantal = aantal + 1
+                    else:
+                        message.append('<:check:847044460666814484> ' + logo + member['member_name'] + ' ' + member['custom_achternaam'])
+                        aantal = aantal + 1
+            if message:
+                pages = EmbedPages(" Betaalde contributies/donaties " + str(jaar))
+                pages.add_line("Aantal: " + str(aantal) + '\n')
+                pages.extend(message)
+                return pages
             else:
-                await ctx.send("Er is een fout opgetreden in de API")
+                return 'Niks gevonden voor dit jaar'
         else:
-            await ctx.send("Pas sinds 2019 zijn betalingen mogelijk")
-    
+            return "Er is een fout opgetreden in de API"
+
+    async def _send_result(self, ctx: commands.Context, result):
+        """Stuur het resultaat van een job: tekst, EmbedPages of een lijst daarvan"""
+        if result is None:
+            return
+        for part in result if isinstance(result, list) else [result]:
+            if isinstance(part, EmbedPages):
+                await part.send(ctx)
+            else:
+                await ctx.send(part)
+
+    @frappe.group(name="jobs")
+    async def frappe_jobs(self, ctx: commands.Context) -> None:
+        """Lopende en afgeronde rapporten, zoals contributie, checksystem en roleupdate"""
+        pass
+
+    @frappe_jobs.command(name="lijst")
+    async def frappe_jobs_lijst(self, ctx: commands.Context):
+        """Laat de lopende rapporten en de bewaarde resultaten zien"""
+        lines = [f"⏳ **{job.name}**: {job.status} ({job.elapsed:.0f}s) {job.message.jump_url}" for job in self.jobs.running(ctx.guild.id)]
+        lines += [f"✅ **{result.name}** <t:{int(result.finished)}:R>" for result in self.jobs.results(ctx.guild.id)]
+        await ctx.send("\n".join(lines) if lines else "Er lopen geen rapporten en er zijn geen resultaten bewaard")
+
+    @frappe_jobs.command(name="stop")
+    async def frappe_jobs_stop(self, ctx: commands.Context, *, naam: str = None):
+        """Annuleer een lopend rapport, of zonder naam alle rapporten in deze server"""
+        cancelled = self.jobs.cancel(ctx.guild.id, naam)
+        await ctx.send(f"🛑 {cancelled} rapport(en) geannuleerd" if cancelled else "Geen lopend rapport gevonden")
+
+    @frappe_jobs.command(name="toon")
+    async def frappe_jobs_toon(self, ctx: commands.Context, *, naam: str):
+        """Laat het laatste resultaat van een rapport opnieuw zien, zonder het opnieuw uit te voeren"""
+        result = self.jobs.last_result(ctx.guild.id, naam)
+        if result is None:
+            return await ctx.send("Geen bewaard resultaat voor `" + naam + "`")
+        await ctx.send(f"Resultaat van <t:{int(result.finished)}:R>:")
+        await self._send_result(ctx, result.result)
+
+    @frappe.group(name="cache")
+    async def frappe_cache(self, ctx: commands.Context) -> None:
+        """Beheer de cache van de event ranking"""
+        pass
+
+    @frappe_cache.command(name="clear")
+    async def frappe_cache_clear(self, ctx: commands.Context):
+        """Leeg de cache, het volgende commando haalt de event ranking opnieuw op"""
+        self.ranking_cache.invalidate()
+        await ctx.send("🧹 De cache van de event ranking is geleegd.")
+
+    @frappe_cache.command(name="ttl")
+    @commands.is_owner()
+    async def frappe_cache_ttl(self, ctx: commands.Context, ttl: commands.Range[int, 0, 86400], stale_ttl: commands.Range[int, 0, 86400] = None):
+        """Stel in hoeveel seconden de event ranking vers is, en optioneel hoe lang die daarna nog geserveerd wordt tijdens verversen"""
+        await self.config.ranking_ttl.set(ttl)
+        self.ranking_cache.ttl = ttl
+        if stale_ttl is not None:
+            await self.config.ranking_stale_ttl.set(stale_ttl)
+            self.ranking_cache.stale_ttl = stale_ttl
+        await ctx.send(f"✅ Event ranking is {self.ranking_cache.ttl} seconden vers en wordt daarna nog {self.ranking_cache.stale_ttl} seconden geserveerd tijdens verversen.")
+
+    @frappe.group(name="webhook")
+    @commands.is_owner()
+    async def frappe_webhook(self, ctx: commands.Context) -> None:
+        """Frappe wijzigingen laten pushen in plaats van pollen"""
+        pass
+
+    @frappe_webhook.command(name="start")
+    async def frappe_webhook_start(self, ctx: commands.Context, host: str = None, port: commands.Range[int, 1, 65535] = None):
+        """Start de webhook ontvanger, optioneel op een ander adres"""
+        if host is not None:
+            await self.config.webhook_host.set(host)
+        if port is not None:
+            await self.config.webhook_port.set(port)
+        error = await self._start_webhook()
+        if error:
+            return await ctx.send(error)
+        await self.config.webhook_enabled.set(True)
+        await ctx.send(f"✅ De webhook luistert op `{self.webhook.url}`. Polling wordt overgeslagen zolang die draait.")
+
+    @frappe_webhook.command(name="stop")
+    async def frappe_webhook_stop(self, ctx: commands.Context):
+        """Stop de webhook ontvanger en ga terug naar pollen"""
+        await self.config.webhook_enabled.set(False)
+        if self.webhook:
+            await self.webhook.stop()
+            self.webhook = None
+        await ctx.send("✅ De webhook is gestopt, wijzigingen worden weer opgehaald.")
+
+    @frappe_webhook.command(name="test")
+    async def frappe_webhook_test(self, ctx: commands.Context, doctype: str, name: str, event: str = "on_update"):
+        """Stuur een document als ondertekende webhook naar de eigen ontvanger, zoals Frappe dat zou doen"""
+        if not self.webhook_running:
+            return await ctx.send("De webhook draait niet.")
+        if event in DELETE_EVENTS:
+            doc = {'doctype': doctype, 'name': name}
+        else:
+            try:
+                doc = await self.Frappeclient.get_doc(doctype, name)
+            except CircuitOpenError:
+                raise
+            except FrappeError as error:
+                return await ctx.send("Status code: " + str(error.status))
+        status = await send_webhook(self.webhook.url, self.webhook.secret, doctype, event, doc)
+        await ctx.send(f"Webhook verstuurd, status: {status}")
+
+    @frappe.command(name="metrics")
+    @commands.is_owner()
+    async def frappe_metrics(self, ctx: commands.Context, prometheus_formaat: bool = False):
+        """Aantallen, duur, fouten en bytes van alle Frappe en Discord requests, per cog en endpoint"""
+        sources = {self.qualified_name: self.metrics, **dict(sorted(self.cog_metrics.items()))}
+        if prometheus_formaat:
+            file = discord.File(io.BytesIO(prometheus(sources).encode()), filename="metrics.prom")
+            return await ctx.send(file=file)
+        pages = EmbedPages("Request metrics")
+        for cog_name, metrics in sources.items():
+            items = metrics.items()
+            if items:
+                pages.add_line(f"\n**{cog_name}** (sinds <t:{int(metrics.since)}:R>)")
+                pages.extend(summary_line(kind, endpoint, series) for kind, endpoint, series in items)
+        if not any(metrics.items() for metrics in sources.values()):
+            pages.add_line("Nog geen requests gemeten")
+        await pages.send(ctx)
+
     @commands.guild_only()
     @commands.bot_has_permissions(embed_links=True)
     @commands.hybrid_group()
@@ -151,332 +600,298 @@ class Frappe(commands.Cog):
 
     @events.command()
     async def list(self, ctx: commands.Context):
-        frappe_keys = await self.bot.get_shared_api_tokens("frappe")
         """Krijg een lijst op basis van de eventrollen"""
-        if frappe_keys.get("api_key") is None:
-            return await ctx.send("The Frappe API key has not been set. Use `[p]set api` to do this.")
-        api_key =  frappe_keys.get("api_key")
-        api_secret = frappe_keys.get("api_secret")
-        headers = {'Authorization': 'token ' +api_key+ ':' +api_secret}
-        api = requests.get('http://shadowzone.nl/api/method/event_ranking', headers=headers)
-        if api.status_code == 200:
-            response = api.json()
-            embed = discord.Embed()
-            data = ""
-            prevamount = ""
-
+        response = await self._event_ranking(ctx)
+        if response is not None:
             if response['result']:
                 maxevents = max(response['result'], key=lambda x:x['events'])
-                for eventnumber in reversed(range(1, maxevents['events'] + 1)):
-                    if eventnumber == 1:
-                        role = discord.utils.get(ctx.guild.roles, name="1 event")
-                    else:
-                        role = discord.utils.get(ctx.guild.roles, name= str(eventnumber) + " events")
-                    
-                    if role:
-                        for member in role.members:
-                            if any('SZGlid' in role.name for role in member.roles):
-                                icon = "<:szglogo:945293100824277002>"
-                            elif any('SZG+' in role.name for role in member.roles):
-                                icon = "<:SZGplus:1188373927119040562>"
-                            else:
-                                icon = "<:szglogozwart:945293372099272724>"
-
-                            if eventnumber == prevamount:
-                                data = data + icon + '<@' + str(member.id) + '> ' + '\n'
-                            else:
-                                if eventnumber == 1:
-                                    data = data + '\n' + str(eventnumber) + ' event\n' + icon + '<@' + str(member.id) + '> ' + '\n'
-                                else:
-                                    data = data + '\n' + str(eventnumber) + ' events\n' + icon + '<@' + str(member.id) + '> ' + '\n'
-                            prevamount = eventnumber
-                
-                embed.title = "Event ranking"
-                embed.set_footer(text="© Shadowzone Gaming")
-                embed.colour = int("ff0502", 16)
-                embed.description = data
-                await ctx.send(embed=embed)
-        else:
-            return await ctx.send("Status code:" +str(api.status_code))
+                pages = EmbedPages("Event ranking")
+                pages.extend(self._list_lines(ctx.guild, maxevents['events']))
+                await pages.send(ctx)
+
+    def _list_lines(self, guild: discord.Guild, maxevents: int) -> typing.Iterator[str]:
+        prevamount = None
+        for eventnumber in reversed(range(1, maxevents + 1)):
+            role = self.event_roles.get_role(guild, eventnumber)
+            if role:
+                for member in role.members:
+                    icon = self.tiers.get_icon(member)
+                    if eventnumber != prevamount:
+                        yield '\n' + event_role_name(eventnumber)
+                    yield icon + '<@' + str(member.id) + '> '
+                    prevamount = eventnumber
 
     @events.command()
     async def listdatabase(self, ctx: commands.Context):
-        frappe_keys = await self.bot.get_shared_api_tokens("frappe")
         """Krijg een lijst op basis van de events in de database"""
-        if frappe_keys.get("api_key") is None:
-            return await ctx.send("The Frappe API key has not been set. Use `[p]set api` to do this.")
-        api_key =  frappe_keys.get("api_key")
-        api_secret = frappe_keys.get("api_secret")
-        headers = {'Authorization': 'token ' +api_key+ ':' +api_secret}
-        api = requests.get('http://shadowzone.nl/api/method/event_ranking', headers=headers)
-
-        if api.status_code == 200:
-            response = api.json()
-            data = ""
-            prevamount = ""
-            embed = discord.Embed()
+        response = await self._event_ranking(ctx)
+        if response is not None:
             if response['result']:
-                for member in response['result']:
-                    name = member['discord_id']
-                    amount = member['events']
-                    if member['status'] == 'Actief' and amount > 0:
-                        if amount == prevamount:
-                            data = data + '<@' + name + '> ' + '\n'
-                        else:
-                            if amount == 1:
-                                data = data + '\n' + str(amount) + ' event\n <@' + name + '> ' + '\n'
-                            else:
-                                data = data + '\n' + str(amount) + ' events\n <@' + name + '> ' + '\n'
-                        
-                        embed.description = data
-                        prevamount = amount
-                embed.title = "Aantal bezochte events:"
-                embed.colour = int("ff0502", 16)
-                embed.set_footer(text="© Shadowzone Gaming")
-                await ctx.send(embed=embed)
-            pass
+                pages = EmbedPages("Aantal bezochte events:")
+                pages.extend(self._listdatabase_lines(response['result']))
+                await pages.send(ctx)
+
+    @staticmethod
+    def _listdatabase_lines(ranking: typing.List[dict]) -> typing.Iterator[str]:
+        prevamount = None
+        for member in ranking:
+            name = str(member['discord_id'])
+            amount = member['events']
+            if member['status'] == 'Actief' and amount > 0:
+                if amount != prevamount:
+                    yield '\n' + event_role_name(amount)
+                yield ' <@' + name + '> '
+                prevamount = amount
 
-        else:
-            return await ctx.send("Status code:" +str(api.status_code))
-    
     @events.command()
     @commands.has_permissions(administrator=True)
-    async def roleupdate(self, ctx: commands.Context):
-        frappe_keys = await self.bot.get_shared_api_tokens("frappe")
-        """Checkt op basis van de events in de database of gebruikers de juiste rollen hebben"""
-        if frappe_keys.get("api_key") is None:
-            return await ctx.send("The Frappe API key has not been set. Use `[p]set api` to do this.")
-        api_key =  frappe_keys.get("api_key")
-        api_secret = frappe_keys.get("api_secret")
-        headers = {'Authorization': 'token ' +api_key+ ':' +api_secret}
-        api = requests.get('http://shadowzone.nl/api/method/event_ranking', headers=headers)
-        if api.status_code == 200:
-            response = api.json()
-            embed = discord.Embed()
-            notfound = None
-            amount_changes = 0
-            if response['result']:
-                for member in response['result']:
-                    discord_id = member['discord_id']
-                    amount = member['events']
-
-                    member = ctx.guild.get_member(int(discord_id))
-                    if member:
-                        embed.title = "Eventrol wijziging"
-                        embed.set_footer(text="© Shadowzone Gaming")
-                        embed.colour = int("ff0502", 16)
-                        try:
-                            for role in member.roles:
-                                if 'events' in role.name:
-                                    currentrole = role
-                                elif '1 event' in role.name:
-                                    currentrole = role
-
-                            if not any('events' in role.name for role in member.roles):
-                                if not any('1 event' in role.name for role in member.roles):
-                                    currentrole = None
-
-                            if amount == 1:
-                                role = discord.utils.get(ctx.guild.roles, name="1 event")
-                            else:
-                                role = discord.utils.get(ctx.guild.roles, name= str(amount) + " events")
-                            
-                            if role:
-                                if currentrole:
-                                    if not currentrole.name == role.name:
-                                        embed.description = "Gebruiker: <@" + discord_id + "> \n\n <:wrong:847044649679716383> <@&" +str(currentrole.id)+ "> \n <:check:847044460666814484> <@&" +str(role.id)+ ">"
-                                        await ctx.send(embed=embed)
-                                        amount_changes = amount_changes + 1
-                                else:
-                                    embed.description = "Gebruiker: <@" + discord_id + "> \n\n <:check:847044460666814484> <@&" +str(role.id)+ ">"
-                                    await ctx.send(embed=embed)
-                                    amount_changes = amount_changes + 1
-                            elif amount == 0:
-                                if currentrole:
-                                    embed.description = "Gebruiker: <@" + discord_id + "> \n\n <:wrong:847044649679716383> <@&" +str(currentrole.id)+ ">"
-                                    await ctx.send(embed=embed)
-                                    amount_changes = amount_changes + 1
-                            else:
-                                embed.description = "Gebruiker: <@" + discord_id + "> \n\n Rol `" +str(amount)+ " events` bestaat niet"
-                                await ctx.send(embed=embed)
-                                amount_changes = amount_changes + 1 
-                        except Exception as error:
-                            return await ctx.send("Error: `" +str(error)+ "`")
-                    else:
-                        if notfound:
-                            notfound = notfound + "<@" + discord_id + "> "
-                        else:
-                            notfound = "<@" + discord_id + "> "
-                if amount_changes == 0:
-                    if notfound:
-                        await ctx.send("<:check:847044460666814484> eventrollen zijn up-to-date voor leden en SZG+ \n" + "-# Gebruikers" + notfound + "niet gevonden in deze server")
-                    else:
-                        await ctx.send("<:check:847044460666814484> eventrollen zijn up-to-date voor leden en SZG+")
-                else:
-                    await ctx.send(str(amount_changes) + " wijzigingen voor leden en SZG+ \n" + "-# Gebruikers" + notfound + "niet gevonden in deze server")
-        else:
-            return await ctx.send("Status code:" +str(api.status_code))
-        
+    async def roleupdate(self, ctx: commands.Context, toepassen: bool = False):
+        """
+        Checkt op basis van de events in de database of gebruikers de juiste rollen hebben
+
+        Met `toepassen` op True worden alle wijzigingen direct doorgevoerd, met één samenvatting aan het einde.
+        """
+        name = "roleupdate toepassen" if toepassen else "roleupdate"
+        result = await self.jobs.run(ctx, name, lambda job: self._roleupdate_report(ctx, job, toepassen))
+        await self._send_result(ctx, result)
+
+    async def _roleupdate_report(self, ctx: commands.Context, job: Job, toepassen: bool):
+        job.report("event ranking ophalen")
+        response = await self._event_ranking(ctx)
+        if response is None or not response['result']:
+            return None
+        job.report("leden opzoeken")
+        members = await self.resolver.resolve(ctx.guild, index_ranking(response['result']))
+        job.report("wijzigingen berekenen")
+        changes, missing_roles, notfound = self._plan_roleupdate(ctx.guild, response['result'], members)
+
+        lines = []
+        for change in changes:
+            line = "<@" + str(change.member.id) + "> "
+            if change.remove:
+                line = line + " ".join("<:wrong:847044649679716383> <@&" + str(role.id) + ">" for role in change.remove) + " "
+            if change.add:
+                line = line + "<:check:847044460666814484> <@&" + str(change.add.id) + ">"
+            lines.append(line)
+        for discord_id, amount in missing_roles:
+            lines.append("<@" + discord_id + "> Rol `" + event_role_name(amount) + "` bestaat niet")
+        # Per regel een deel van de mentions, zodat een lange lijst nooit midden in een mention afgekapt wordt
+        notfound_lines = []
+        if notfound:
+            notfound_lines.append("-# Niet gevonden in deze server:")
+            notfound_lines.extend("-# " + chunk for chunk in join_within(("<@" + discord_id + ">" for discord_id in notfound), limit=MESSAGE_LIMIT - 3))
+
+        if not lines:
+            return list(join_within(["<:check:847044460666814484> eventrollen zijn up-to-date voor leden en SZG+"] + notfound_lines, separator="\n", limit=MESSAGE_LIMIT))
+
+        header = str(len(lines)) + " wijzigingen voor leden en SZG+"
+        failed = []
+        if toepassen and changes:
+            result = await self._apply_roleupdate(job, changes)
+            header = str(len(result.applied)) + " wijzigingen toegepast voor leden en SZG+"
+            if result.failed:
+                header = header + "\n<:wrong:847044649679716383> " + str(len(result.failed)) + " mislukt:"
+                failed = join_within("<@" + str(change.member.id) + ">" for change, error in result.failed)
+
+        pages = EmbedPages("Eventrol wijzigingen")
+        pages.add_line(header)
+        pages.extend(failed)
+        pages.add_line()
+        pages.extend(lines)
+        if notfound_lines:
+            pages.add_line()
+            pages.extend(notfound_lines)
+        return pages
+
+    def _plan_roleupdate(self, guild: discord.Guild, ranking: typing.List[dict], members: typing.Dict[int, discord.Member]):
+        """Bereken alle eventrol wijzigingen vooraf, zonder iets aan te passen; `members` komt van de resolver"""
+        changes = []
+        missing_roles = []
+        notfound = []
+        for row in ranking:
+            discord_id = str(row['discord_id'])
+            amount = row['events']
+            try:
+                member = members.get(int(discord_id))
+            except (TypeError, ValueError):
+                continue
+            if not member:
+                notfound.append(discord_id)
+                continue
+
+            current = self.event_roles.member_event_roles(member)
+            if amount > 0:
+                role = self.event_roles.get_role(guild, amount)
+                if not role:
+                    missing_roles.append((discord_id, amount))
+                    continue
+                remove = [current_role for current_role in current if current_role != role]
+                if role not in current or remove:
+                    changes.append(RoleChange(member, add=role if role not in current else None, remove=remove))
+            elif current:
+                changes.append(RoleChange(member, remove=current))
+        return changes, missing_roles, notfound
+
+    async def _apply_roleupdate(self, job: Job, changes: typing.List[RoleChange]) -> RoleApplyResult:
+        """Voer de wijzigingen uit; de job werkt het voortgangsbericht bij, hooguit eens per twee seconden"""
+        async def progress(done: int, total: int):
+            job.progress(done, total, "rollen aangepast")
+
+        return await apply_role_changes(
+            changes, reason="Eventrollen bijgewerkt op basis van de database", progress=progress, metrics=self.metrics
+        )
 
     @events.command()
     @commands.has_permissions(administrator=True)
     async def checksystem(self, ctx: commands.Context):
-        frappe_keys = await self.bot.get_shared_api_tokens("frappe")
         """Check of de eventrollen overeenkomen met de database en geeft de verschillen weer"""
-        if frappe_keys.get("api_key") is None:
-            return await ctx.send("The Frappe API key has not been set. Use `[p]set api` to do this.")
-        api_key =  frappe_keys.get("api_key")
-        api_secret = frappe_keys.get("api_secret")
-        headers = {'Authorization': 'token ' +api_key+ ':' +api_secret}
-        api = requests.get('http://shadowzone.nl/api/method/event_ranking', headers=headers)
-        if api.status_code == 200:
-            response = api.json()
-            embed = discord.Embed()
-            notfoundDatabase = "\n\n Wel rol, niet in database: \n"
-            notfoundServertext = "\n\n Wel in database, niet in server: \n"
-            notfoundServer = []
-            data = []
-            prevamount = ""
-            description = ""
+        result = await self.jobs.run(ctx, "checksystem", lambda job: self._checksystem_report(ctx, job))
+        await self._send_result(ctx, result)
 
-            if response['result']:
-                maxevents = max(response['result'], key=lambda x:x['events'])
-                for eventnumber in reversed(range(1, maxevents['events'] + 1)):
-                    if eventnumber == 1:
-                        role = discord.utils.get(ctx.guild.roles, name="1 event")
-                    else:
-                        role = discord.utils.get(ctx.guild.roles, name= str(eventnumber) + " events")
-                    
-                    if role:
-                        for member in role.members:
-                            if any(str(member.id) in user['discord_id'] for user in response['result']):
-                                for user in response['result']:
-                                    if user['discord_id'] == str(member.id):
-                                        if user['events'] == eventnumber:
-                                            icon = ":heavy_minus_sign:"
-                                        else:
-                                            userdata = {
-                                                "events": user['events'],
-                                                "member": str(member.id),
-                                                "icon": "<:plus:1137646873042243625>",
-                                            }
-                                            if not any(user['discord_id'] in x['member'] for x in data):
-                                                data.append(userdata)
-                                            else:
-                                                for x in data:
-                                                    if user['discord_id'] == x['member']:
-                                                        if not any(str(user['events']) in str(x['events']) for x in data):
-                                                            data.append(userdata)
-                                            icon = "<:min:1137646894827454565>"
-                                            
-                                        userdata = {
-                                            "events": eventnumber,
-                                            "member": str(member.id),
-                                            "icon": icon,
-                                        }
-                                        data.append(userdata)
-                            else:
-                                notfoundDatabase = notfoundDatabase + "<@" + str(member.id) + "> "
-                    else:
-                        await ctx.send("Rol voor `" + str(eventnumber) + " events` niet gevonden")
-                    
-                for user in response['result']:
-                    if not str(user['discord_id']) in notfoundServer:
-                        serveruser = ctx.guild.get_member(int(user['discord_id']))
-                        if not serveruser:
-                            notfoundServertext = notfoundServertext + "<@" + str(user['discord_id']) + "> "
-                            notfoundServer.append(str(user['discord_id']))
-                        elif not any(user['discord_id'] in x['member'] for x in data):
-                            if user['events'] > 0:
-                                userdata = {
-                                    "events": user['events'],
-                                    "member": user['discord_id'],
-                                    "icon": "<:plus:1137646873042243625>",
-                                }
-                                data.append(userdata)
-
-                data.sort(key= lambda x:x['events'], reverse=True)
-                for data in data:
-                    if data["events"] == prevamount:
-                        description = description + data["icon"] + '<@' + data["member"] + '> ' + '\n'
-                    else:
-                        description = description + f'\n{str(data["events"])} event{"s" if data["events"] > 1 else ""}\n{data["icon"]}<@{data["member"]}>\n'
-                    prevamount = data["events"]
-
-                embed.title = "Check systeem op eventrollen"
-                embed.set_footer(text="© Shadowzone Gaming")
-                embed.colour = int("ff0502", 16)
-                embed.description = description + notfoundDatabase + notfoundServertext
-                await ctx.send(embed=embed)
-        else:
-            return await ctx.send("Status code:" +str(api.status_code))
+    async def _checksystem_report(self, ctx: commands.Context, job: Job):
+        job.report("event ranking ophalen")
+        response = await self._event_ranking(ctx)
+        if response is None or not response['result']:
+            return None
+        job.report("leden opzoeken")
+        members = await self.resolver.resolve(ctx.guild, index_ranking(response['result']))
+        job.report("rollen vergelijken")
+        maxevents = max(response['result'], key=lambda x:x['events'])
+        role_members = {}
+        for eventnumber in range(1, maxevents['events'] + 1):
+            role = self.event_roles.get_role(ctx.guild, eventnumber)
+            role_members[eventnumber] = [member.id for member in role.members] if role else None
+        # Leden die de resolver buiten de cache vond (zonder members intent) staan niet in `role.members`
+        for member_id, member in members.items():
+            if ctx.guild.get_member(member_id) is not None:
+                continue
+            for role in self.event_roles.member_event_roles(member):
+                events = self.event_roles.get_events(role)
+                if role_members.get(events) is not None:
+                    role_members[events].append(member_id)
+
+        diff = reconcile_event_roles(response['result'], role_members, lambda member_id: member_id in members)
+        result = []
+        if diff.missing_roles:
+            result.append("\n".join("Rol voor `" + str(eventnumber) + " events` niet gevonden" for eventnumber in diff.missing_roles))
+
+        pages = EmbedPages("Check systeem op eventrollen")
+        pages.extend(self._render_checksystem(diff))
+        result.append(pages)
+        return result
+
+    @staticmethod
+    def _render_checksystem(diff: EventRoleDiff) -> typing.Iterator[str]:
+        """Zet het verschil om naar regels per aantal events, gevolgd door de leden die niet gevonden zijn"""
+        entries = []
+        for member_id, events in diff.correct:
+            entries.append((events, ":heavy_minus_sign:", member_id))
+        plus_added = set()
+        for member_id, role_events, database_events in diff.wrong_count:
+            entries.append((role_events, "<:min:1137646894827454565>", member_id))
+            if database_events > 0 and member_id not in plus_added:
+                plus_added.add(member_id)
+                entries.append((database_events, "<:plus:1137646873042243625>", member_id))
+        for member_id, events in diff.missing:
+            entries.append((events, "<:plus:1137646873042243625>", member_id))
+        entries.sort(key=lambda entry: entry[0], reverse=True)
+
+        prevamount = None
+        for events, icon, member_id in entries:
+            if events != prevamount:
+                yield f'\n{events} event{"s" if events > 1 else ""}'
+            yield f"{icon}<@{member_id}>"
+            prevamount = events
+
+        # Een regel per deel van de mentions, zodat een lange lijst nooit midden in een mention afgekapt wordt
+        yield "\n\n Wel rol, niet in database: "
+        yield from join_within((f"<@{member_id}>" for member_id in diff.surplus), limit=DESCRIPTION_LIMIT)
+        yield "\n Wel in database, niet in server: "
+        yield from join_within((f"<@{member_id}>" for member_id in diff.not_in_server), limit=DESCRIPTION_LIMIT)
+
+    async def _resolve_event(self, ctx: commands.Context, event: str):
+        """De volledige naam van `event`, of van het laatste event met aanmeldingen als er geen event is opgegeven"""
+        if not event:
+            await self.mirror.ensure_fresh('Event deelnemers')
+            latest = await self.mirror.rows('Event deelnemers', order_by = 'creation desc', limit = 1)
+            if not latest:
+                await ctx.send("Geen aanmeldingen gevonden")
+                return None
+            event = latest[0]['event']
+        await self._refresh_events()
+        resolved = self.event_index.resolve(event)
+        if resolved is None:
+            pages = EmbedPages("Event niet gevonden")
+            pages.add_line("Zorg dat je de volledige titel invult tussen aanhalingstekens \n\n __**Alle events:**__ ")
+            pages.extend(f'`"{name}"`' for name in self.event_index.all_names())
+            await pages.send(ctx)
+        return resolved
 
     @events.command()
     @commands.has_permissions(administrator=True)
     async def aanmeldingen(self, ctx: commands.Context, event: str = None, betalingen: int = 1):
         """Krijg een lijst van de aanmeldingen voor een specifiek event"""
-        deelnemers = self.Frappeclient.get_list('Event deelnemers', fields = ["event"], order_by = 'creation desc', limit_page_length=float('inf'))
+        event = await self._resolve_event(ctx, event)
         if not event:
-            event = deelnemers[0]['event']
-        eventcheck = self.Frappeclient.get_value("Beheer events", "event_name", {"event_name": event})
-        data = ""
-        amount = 0
-        if eventcheck:
-            deelnemers = self.Frappeclient.get_list('Event deelnemers', fields = ["event", "payment_status", "discord_id", "pakket1", "vertrek", "aankomst"], filters = {'event':event}, order_by = 'creation asc', limit_page_length=float('inf'))
-            embed = discord.Embed()
-            if deelnemers:
-                for deelnemer in deelnemers:
-                    if not deelnemer['payment_status'] == "Cancelled":
-                        amount = amount + 1
-                        data = data + f"\n {'<:min:1137646894827454565>' if deelnemer['payment_status'] != 'Completed' and betalingen == 1 else ''} <@{deelnemer['discord_id']}>"
-                        if deelnemer['pakket1']:
-                            data = data + "(BBQ only)"
-                        else:
-                            data = data + f"({deelnemer['aankomst']} - {deelnemer['vertrek']})"
-                data = str(amount) + " aanmeldingen \n" + data + f"\n\n{'-# <:min:1137646894827454565> betekent niet betaald' if betalingen == 1 else ''}"
-            else:
-                data = "Geen deelnemers gevonden"
-            embed.description = data
-            embed.title = event + " deelnemers:"
-            embed.colour = int("ff0502", 16)
-            embed.set_footer(text="© Shadowzone Gaming")
-            await ctx.send(embed=embed)
+            return
+        await self.mirror.ensure_fresh('Event deelnemers')
+        deelnemers = await self.mirror.rows('Event deelnemers', filters = {'event':event}, order_by = 'creation asc')
+        pages = EmbedPages(event + " deelnemers:")
+        if deelnemers:
+            lines = []
+            for deelnemer in deelnemers:
+                if not deelnemer['payment_status'] == "Cancelled":
+                    line = f" {'<:min:1137646894827454565>' if deelnemer['payment_status'] != 'Completed' and betalingen == 1 else ''} <@{deelnemer['discord_id']}>"
+                    if deelnemer['pakket1']:
+                        line = line + "(BBQ only)"
+                    else:
+                        line = line + f"({deelnemer['aankomst']} - {deelnemer['vertrek']})"
+                    lines.append(line)
+            pages.add_line(str(len(lines)) + " aanmeldingen \n")
+            pages.extend(lines)
+            if betalingen == 1:
+                pages.add_line("\n-# <:min:1137646894827454565> betekent niet betaald")
         else:
-            events = self.Frappeclient.get_list('Beheer events', fields = ['event_name'], order_by = 'creation desc', limit_page_length=float('inf'))
-            for event in events:
-                    data = data + f"\n `{event['event_name']}`" 
-            return await ctx.send("Event niet gevonden. Zorg dat je de volledige titel invult tussen aanhalingstekens \n\n __**Alle events:**__ " +str(data))
-    
+            pages.add_line("Geen deelnemers gevonden")
+        await pages.send(ctx)
+
     @events.command()
     @commands.has_permissions(administrator=True)
     async def opmerkingen(self, ctx: commands.Context, event: str = None):
         """Krijg een lijst van de opmerkingen, dieetwensen en ideeën voor een specifiek event"""
-        deelnemers = self.Frappeclient.get_list('Event deelnemers', fields = ["event"], order_by = 'creation desc', limit_page_length=float('inf'))
+        event = await self._resolve_event(ctx, event)
         if not event:
-            event = deelnemers[0]['event']
-        eventcheck = self.Frappeclient.get_value("Beheer events", "event_name", {"event_name": event})
-        data = ""
-        amount = 0
-        if eventcheck:
-            deelnemers = self.Frappeclient.get_list('Event deelnemers', fields = ["event", "discord_id", "dieetwensen_ideeën_voor_tussendoortjes_etc", "ideeën_voor_het_event", "opmerkingen", "payment_status"], filters = {'event':event}, order_by = 'creation desc', limit_page_length=float('inf'))
-            embed = discord.Embed()
-            if deelnemers:
-                for deelnemer in deelnemers:
-                    if not deelnemer['payment_status'] == "Cancelled":
-                        eten_part = f'\n **Eten:** {deelnemer["dieetwensen_ideeën_voor_tussendoortjes_etc"]}' if deelnemer.get('dieetwensen_ideeën_voor_tussendoortjes_etc') else ''
-                        dieet_part = f'\n **Ideeën:** {deelnemer["ideeën_voor_het_event"]}' if deelnemer.get('ideeën_voor_het_event') else ''
-                        opmerkingen_part = f'\n **Opmerkingen:** {deelnemer["opmerkingen"]}' if deelnemer.get('opmerkingen') else ''
-                        if eten_part or dieet_part or opmerkingen_part:
-                            data = data + f"\n\n <@{deelnemer['discord_id']}>  {eten_part}{dieet_part}{opmerkingen_part}"
-            else:
-                data = "Geen deelnemers gevonden"
-            embed.description = data
-            embed.title = event + " deelnemers:"
-            embed.colour = int("ff0502", 16)
-            embed.set_footer(text="© Shadowzone Gaming")
-            await ctx.send(embed=embed)
+            return
+        # Vrije tekst staat niet in de mirror, dus direct uit Frappe
+        deelnemers = [
+            deelnemer
+            async for deelnemer in self.Frappeclient.iter_list('Event deelnemers', fields = ['discord_id', 'creation', 'payment_status', 'dieetwensen_ideeën_voor_tussendoortjes_etc', 'ideeën_voor_het_event', 'opmerkingen'], filters = {'event':event})
+        ]
+        deelnemers.sort(key=lambda deelnemer: deelnemer['creation'], reverse=True)
+        pages = EmbedPages(event + " deelnemers:")
+        if deelnemers:
+            for deelnemer in deelnemers:
+                if not deelnemer['payment_status'] == "Cancelled":
+                    eten_part = f'\n **Eten:** {deelnemer["dieetwensen_ideeën_voor_tussendoortjes_etc"]}' if deelnemer.get('dieetwensen_ideeën_voor_tussendoortjes_etc') else ''
+                    dieet_part = f'\n **Ideeën:** {deelnemer["ideeën_voor_het_event"]}' if deelnemer.get('ideeën_voor_het_event') else ''
+                    opmerkingen_part = f'\n **Opmerkingen:** {deelnemer["opmerkingen"]}' if deelnemer.get('opmerkingen') else ''
+                    if eten_part or dieet_part or opmerkingen_part:
+                        pages.add_line(f"\n <@{deelnemer['discord_id']}>  {eten_part}{dieet_part}{opmerkingen_part}")
         else:
-            events = self.Frappeclient.get_list('Beheer events', fields = ['event_name'], order_by = 'creation desc', limit_page_length=float('inf'))
-            for event in events:
-                    data = data + '\n `"' + event['event_name'] + '"`'
-            return await ctx.send("Event niet gevonden. Zorg dat je de volledige titel invult tussen aanhalingstekens \n\n __**Alle events:**__ " +str(data))
\ No newline at end of file
+            pages.add_line("Geen deelnemers gevonden")
+        await pages.send(ctx)
+
+    @aanmeldingen.autocomplete("event")
+    @opmerkingen.autocomplete("event")
+    async def event_autocomplete(self, interaction: discord.Interaction, current: str):
+        # Autocomplete must answer within 3 seconds, so serve the index as is and refresh it afterwards.
+        if self._events_refresh is None or self._events_refresh.done():
+            self._events_refresh = asyncio.create_task(self._refresh_events_quietly())
+        # Choices are limited to 100 characters; a longer name is shortened for display only and
+        # sent as a key that `_resolve_event` turns back into the full name.
+        choices = []
+        for name in self.event_index.search(current, limit=25):
+            key = self.event_index.short_key(name)
+            if key is not None:
+                choices.append(app_commands.Choice(name=name if len(name) <= 100 else name[:99] + "…", value=key))
+        return choices
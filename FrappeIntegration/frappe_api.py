@@ -0,0 +1,504 @@
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+import typing
+from urllib.parse import quote, unquote, urlencode
+
+import aiohttp
+
+from .metrics import Metrics
+
+log = logging.getLogger(__name__)
+
+
+class FrappeError(Exception):
+    """Raised when the Frappe API answers with an error status."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(f"Frappe API error {status}: {message}")
+        self.status: int = status
+        self.message: str = message
+
+
+class CircuitOpenError(FrappeError):
+    """Raised without contacting the site while the circuit breaker considers it down."""
+
+    def __init__(self, retry_in: float) -> None:
+        super().__init__(503, f"Frappe is onbereikbaar, nieuwe poging over {retry_in:.0f} seconden")
+        self.retry_in: float = retry_in
+
+
+# Everything a Frappe call can raise besides programming errors.
+FRAPPE_ERRORS = (FrappeError, aiohttp.ClientError, asyncio.TimeoutError)
+
+# Methods that may be sent again after a failure without side effects.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the site is down. After `failure_threshold` consecutive failures the circuit
+    opens and calls raise `CircuitOpenError` at once. Every `reset_timeout` seconds a single call
+    is let through as a probe; the first success closes the circuit again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.failures: int = 0
+        self.opened_at: typing.Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def check(self) -> None:
+        if self.opened_at is None:
+            return
+        waited = time.monotonic() - self.opened_at
+        if waited < self.reset_timeout:
+            raise CircuitOpenError(self.reset_timeout - waited)
+        # Let this call probe the site; others keep failing fast until the next window.
+        self.opened_at = time.monotonic()
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            log.info("Frappe is weer bereikbaar.")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                log.warning(f"Frappe faalde {self.failures} keer achter elkaar, calls falen {self.reset_timeout:.0f} seconden direct.")
+            self.opened_at = time.monotonic()
+
+
+class AsyncFrappeClient:
+    """
+    Non-blocking drop-in for the parts of ``frappeclient.FrappeClient`` used by the cogs.
+    All calls share one keep-alive aiohttp connection pool and log in again automatically
+    when the session has expired; concurrent calls that hit the expiry share one login.
+    Idempotent requests are retried with jittered exponential backoff on connection errors,
+    timeouts, 429 and 5xx, and a `CircuitBreaker` fails fast while the site is down.
+    With `metrics`, every request is recorded per endpoint.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        username: typing.Optional[str] = None,
+        password: typing.Optional[str] = None,
+        *,
+        max_concurrency: int = 8,
+        timeout: float = 30.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        breaker: typing.Optional[CircuitBreaker] = None,
+        metrics: typing.Optional[Metrics] = None,
+    ) -> None:
+        self.url: str = url.rstrip("/")
+        self.username: typing.Optional[str] = username
+        self.password: typing.Optional[str] = password
+        self.max_concurrency: int = max_concurrency
+        self.timeout: float = timeout
+        self.retries: int = retries
+        self.backoff: float = backoff
+        self.max_backoff: float = max_backoff
+        self.breaker: CircuitBreaker = breaker or CircuitBreaker()
+        self.metrics: typing.Optional[Metrics] = metrics
+
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+        self._login_lock: asyncio.Lock = asyncio.Lock()
+        # Bumped on every login, so callers that saw the same expired session log in only once.
+        self._login_generation: int = 0
+
+    @classmethod
+    def from_tokens(
+        cls, url: str, tokens: typing.Mapping[str, str], *, metrics: typing.Optional[Metrics] = None
+    ) -> "AsyncFrappeClient":
+        """
+        Build a client from the `frappelogin` shared API tokens.
+        Besides `username` and `password`, the optional `max_concurrency`, `timeout` and `retries` tokens are honoured,
+        and a `url` token points the client at another site than `url`, such as a staging server.
+        """
+        return cls(
+            tokens.get("url") or url,
+            tokens.get("username"),
+            tokens.get("password"),
+            max_concurrency=int(tokens.get("max_concurrency") or 8),
+            timeout=float(tokens.get("timeout") or 30),
+            retries=int(tokens.get("retries") or 3),
+            metrics=metrics,
+        )
+
+    @property
+    def has_credentials(self) -> bool:
+        return bool(self.username and self.password)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                cookie_jar=aiohttp.CookieJar(),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def login(self) -> None:
+        async with self._login_lock:
+            await self._login()
+
+    async def _login(self) -> None:
+        await self._request(
+            "POST",
+            "/api/method/login",
+            data={"usr": self.username, "pwd": self.password},
+            retry_login=False,
+        )
+        self._login_generation += 1
+
+    async def _relogin(self, seen_generation: int) -> None:
+        """Log in again, unless another call already did so after `seen_generation`."""
+        async with self._login_lock:
+            if self._login_generation == seen_generation:
+                log.info("Frappe session expired, logging in again.")
+                await self._login()
+
+    def _backoff_delay(self, attempt: int, retry_after: typing.Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        # Full jitter: spreads out the retries of calls that failed together.
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        params: typing.Optional[typing.Dict[str, typing.Any]],
+        data: typing.Optional[typing.Dict[str, typing.Any]],
+        headers: typing.Optional[typing.Dict[str, str]],
+    ) -> typing.Tuple[int, typing.Any, bytes]:
+        """One attempt, with the circuit breaker and metrics kept up to date."""
+        async with self._semaphore:
+            # Checked after queueing, so calls that waited for a slot during an outage fail fast too.
+            self.breaker.check()
+            start = time.perf_counter()
+            try:
+                async with self.session.request(
+                    method, self.url + path, params=params, data=data, headers=headers
+                ) as resp:
+                    status = resp.status
+                    response_headers = resp.headers
+                    body = await resp.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self._observe(method, path, start, error=True)
+                self.breaker.record_failure()
+                raise
+        self._observe(method, path, start, error=status >= 400, body=body, params=params, data=data)
+        if status >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return status, response_headers, body
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: typing.Optional[typing.Dict[str, typing.Any]] = None,
+        data: typing.Optional[typing.Dict[str, typing.Any]] = None,
+        headers: typing.Optional[typing.Dict[str, str]] = None,
+        retry_login: bool = True,
+        raw: bool = False,
+        with_headers: bool = False,
+    ) -> typing.Any:
+        generation = self._login_generation
+        attempts = self.retries + 1 if method in IDEMPOTENT_METHODS else 1
+        for attempt in range(attempts):
+            last_attempt = attempt + 1 == attempts
+            try:
+                status, response_headers, body = await self._send(method, path, params, data, headers)
+            except CircuitOpenError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                if last_attempt:
+                    raise
+                log.debug(f"{method} {path} mislukt ({error!r}), poging {attempt + 2} van {attempts}")
+                await asyncio.sleep(self._backoff_delay(attempt))
+                continue
+            if (status == 429 or status >= 500) and not last_attempt:
+                await asyncio.sleep(self._backoff_delay(attempt, response_headers.get("Retry-After")))
+                continue
+            break
+
+        token_auth = bool(headers and "Authorization" in headers)
+        if status in (401, 403) and retry_login and self.has_credentials and not token_auth:
+            await self._relogin(generation)
+            return await self._request(
+                method,
+                path,
+                params=params,
+                data=data,
+                headers=headers,
+                retry_login=False,
+                raw=raw,
+                with_headers=with_headers,
+            )
+        if status >= 400:
+            raise FrappeError(status, self._error_message(body))
+        if status == 304:
+            payload = None
+        elif raw:
+            payload = body
+        else:
+            payload = json.loads(body) if body else {}
+        if with_headers:
+            return payload, response_headers
+        return payload
+
+    def _observe(
+        self,
+        method: str,
+        path: str,
+        start: float,
+        *,
+        error: bool,
+        body: bytes = b"",
+        params: typing.Optional[dict] = None,
+        data: typing.Optional[dict] = None,
+    ) -> None:
+        if self.metrics is None:
+            return
+        self.metrics.observe(
+            "frappe",
+            self._endpoint(method, path),
+            time.perf_counter() - start,
+            error=error,
+            bytes_in=len(body),
+            bytes_out=len(urlencode(params or {})) + len(urlencode(data or {})),
+        )
+
+    @staticmethod
+    def _endpoint(method: str, path: str) -> str:
+        """`GET Member`, `GET Member/<name>` or `GET method/...`: one series per doctype or method, not per document."""
+        if path.startswith("/api/resource/"):
+            doctype, _, name = path[len("/api/resource/"):].partition("/")
+            return f"{method} {unquote(doctype)}" + ("/<name>" if name else "")
+        if path.startswith("/api/method/"):
+            return f"{method} method/{path[len('/api/method/'):]}"
+        return f"{method} file"
+
+    @staticmethod
+    def _error_message(body: bytes) -> str:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return body[:200].decode(errors="replace")
+        if isinstance(payload, dict):
+            return str(payload.get("exception") or payload.get("message") or payload.get("exc_type") or payload)
+        return str(payload)
+
+    @staticmethod
+    def _resource_path(doctype: str, name: typing.Optional[str] = None) -> str:
+        path = "/api/resource/" + quote(doctype)
+        if name is not None:
+            path += "/" + quote(str(name), safe="")
+        return path
+
+    async def get_list(
+        self,
+        doctype: str,
+        fields: typing.Union[typing.List[str], str] = "*",
+        filters: typing.Optional[typing.Union[dict, list]] = None,
+        limit_start: int = 0,
+        limit_page_length: typing.Union[int, float] = 0,
+        order_by: typing.Optional[str] = None,
+    ) -> typing.List[dict]:
+        """Return the rows of a doctype. A `limit_page_length` of 0 (or infinity) returns every row."""
+        if isinstance(fields, str):
+            fields = [fields]
+        if isinstance(limit_page_length, float) and not math.isfinite(limit_page_length):
+            limit_page_length = 0
+        params = {
+            "fields": json.dumps(fields),
+            "limit_start": str(int(limit_start)),
+            "limit_page_length": str(int(limit_page_length)),
+        }
+        if filters:
+            params["filters"] = json.dumps(filters)
+        if order_by:
+            params["order_by"] = order_by
+        response = await self._request("GET", self._resource_path(doctype), params=params)
+        return response.get("data", [])
+
+    async def iter_list(
+        self,
+        doctype: str,
+        fields: typing.Union[typing.List[str], str] = "*",
+        filters: typing.Optional[typing.Union[dict, list]] = None,
+        page_length: int = 500,
+    ) -> typing.AsyncIterator[dict]:
+        """
+        Yield the rows of a doctype page by page, ordered by name. The next page is already being
+        fetched while the caller works through the current one.
+
+        Pages continue after the last name seen instead of at an offset, so the caller may delete
+        or update the rows it was given without rows being skipped or returned twice.
+        """
+        if isinstance(fields, str):
+            fields = [fields]
+        if "*" not in fields and "name" not in fields:
+            fields = fields + ["name"]
+        if isinstance(filters, dict):
+            filters = [
+                [field, *value] if isinstance(value, (list, tuple)) else [field, "=", value]
+                for field, value in filters.items()
+            ]
+        filters = list(filters or [])
+
+        def fetch(after: typing.Optional[str]) -> asyncio.Task:
+            page_filters = filters + [["name", ">", after]] if after is not None else filters
+            return asyncio.create_task(
+                self.get_list(
+                    doctype,
+                    fields=fields,
+                    filters=page_filters,
+                    limit_page_length=page_length,
+                    order_by="name asc",
+                )
+            )
+
+        pending = fetch(None)
+        try:
+            while pending is not None:
+                rows = await pending
+                pending = fetch(rows[-1]["name"]) if len(rows) >= page_length else None
+                for row in rows:
+                    yield row
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def get_child_rows(
+        self,
+        doctype: str,
+        table_field: str,
+        fields: typing.List[str],
+        filters: typing.Optional[typing.Union[dict, list]] = None,
+        batch_size: int = 200,
+    ) -> typing.Dict[str, typing.List[dict]]:
+        """
+        Fetch the rows of the child table `table_field` of every matching document and group them
+        by parent name, instead of calling `get_doc` once per document. Parents without child rows
+        map to an empty list.
+
+        The parents are paged with `iter_list`; the child rows of each `batch_size` parents come in
+        one joined query, so no single response holds more than one batch. Paging the join itself
+        would split a parent's children over two pages.
+        """
+        columns = ["name"] + [f"{table_field}.{field} as {field}" for field in fields]
+        grouped: typing.Dict[str, typing.List[dict]] = {}
+
+        async def fetch(batch: typing.List[str]) -> None:
+            rows = await self.get_list(doctype, fields=columns, filters=[["name", "in", batch]], limit_page_length=0)
+            for row in rows:
+                # The join yields a single all-NULL row for parents without children.
+                if any(row.get(field) is not None for field in fields):
+                    grouped[row["name"]].append({field: row.get(field) for field in fields})
+
+        batch: typing.List[str] = []
+        async for parent in self.iter_list(doctype, fields=["name"], filters=filters, page_length=batch_size):
+            grouped[parent["name"]] = []
+            batch.append(parent["name"])
+            if len(batch) >= batch_size:
+                await fetch(batch)
+                batch = []
+        if batch:
+            await fetch(batch)
+        return grouped
+
+    async def get_doc(self, doctype: str, name: str) -> dict:
+        response = await self._request("GET", self._resource_path(doctype, name))
+        return response.get("data", {})
+
+    async def get_value(
+        self,
+        doctype: str,
+        fieldname: typing.Optional[str] = None,
+        filters: typing.Optional[typing.Union[dict, list, str]] = None,
+    ) -> typing.Optional[dict]:
+        params = {"doctype": doctype, "fieldname": fieldname or "name"}
+        if filters:
+            params["filters"] = filters if isinstance(filters, str) else json.dumps(filters)
+        response = await self._request("GET", "/api/method/frappe.client.get_value", params=params)
+        return response.get("message")
+
+    async def update(self, doc: dict) -> dict:
+        response = await self._request(
+            "PUT",
+            self._resource_path(doc["doctype"], doc["name"]),
+            data={"data": json.dumps(doc, default=str)},
+        )
+        return response.get("data", {})
+
+    async def delete(self, doctype: str, name: str) -> typing.Any:
+        response = await self._request(
+            "POST", "/api/method/frappe.client.delete", data={"doctype": doctype, "name": name}
+        )
+        return response.get("message")
+
+    async def call_method(
+        self,
+        method: str,
+        params: typing.Optional[typing.Dict[str, typing.Any]] = None,
+        headers: typing.Optional[typing.Dict[str, str]] = None,
+    ) -> dict:
+        """Call a whitelisted server method and return the complete JSON response."""
+        return await self._request("GET", "/api/method/" + method, params=params, headers=headers)
+
+    async def call_method_conditional(
+        self,
+        method: str,
+        params: typing.Optional[typing.Dict[str, typing.Any]] = None,
+        headers: typing.Optional[typing.Dict[str, str]] = None,
+        etag: typing.Optional[str] = None,
+        last_modified: typing.Optional[str] = None,
+    ) -> typing.Tuple[typing.Optional[dict], typing.Optional[str], typing.Optional[str]]:
+        """
+        Like `call_method`, but revalidates with `If-None-Match`/`If-Modified-Since`.
+        Returns `(response, etag, last_modified)`, where `response` is None if the server answered 304.
+        """
+        headers = dict(headers or {})
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        response, response_headers = await self._request(
+            "GET", "/api/method/" + method, params=params, headers=headers, with_headers=True
+        )
+        return (
+            response,
+            response_headers.get("ETag") or etag,
+            response_headers.get("Last-Modified") or last_modified,
+        )
+
+    async def get_file(self, path: str) -> bytes:
+        """Download a file (e.g. `/files/banner.png`) hosted on the Frappe site."""
+        return await self._request("GET", "/" + path.lstrip("/"), retry_login=False, raw=True)
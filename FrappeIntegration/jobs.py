@@ -0,0 +1,152 @@
+import asyncio
+import dataclasses
+import logging
+import time
+import typing
+
+import discord
+from redbot.core import commands
+
+log = logging.getLogger(__name__)
+
+T = typing.TypeVar("T")
+
+
+class Job:
+    """
+    A running report. `report` updates the status line; the progress message is edited at most
+    once every `interval` seconds, always with the latest status.
+    """
+
+    def __init__(self, guild_id: int, name: str, message: discord.Message, interval: float) -> None:
+        self.guild_id: int = guild_id
+        self.name: str = name
+        self.message: discord.Message = message
+        self.interval: float = interval
+        self.status: str = "gestart"
+        self.started: float = time.monotonic()
+        self.task: typing.Optional[asyncio.Task] = None
+        self._last_edit: float = 0.0
+        self._edit_task: typing.Optional[asyncio.Task] = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def report(self, status: str) -> None:
+        self.status = status
+        if self._edit_task is None or self._edit_task.done():
+            self._edit_task = asyncio.create_task(self._push())
+
+    def progress(self, done: int, total: int, what: str = "") -> None:
+        self.report(f"{what} {done}/{total}".strip())
+
+    async def _push(self) -> None:
+        delay = self._last_edit + self.interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._last_edit = time.monotonic()
+        await self._edit(f"⏳ **{self.name}**: {self.status} ({self.elapsed:.0f}s)")
+
+    async def _edit(self, content: str) -> None:
+        try:
+            await self.message.edit(content=content)
+        except discord.HTTPException:
+            pass
+
+    async def finish(self, content: str) -> None:
+        if self._edit_task is not None:
+            self._edit_task.cancel()
+        await self._edit(content)
+
+
+@dataclasses.dataclass
+class JobResult:
+    name: str
+    result: typing.Any
+    finished: float  # unix time
+
+
+class JobRunner:
+    """
+    Runs long reports per guild in the background.
+
+    A job is identified by `(guild, name)`: while it runs, callers asking for the same job wait
+    for the same result instead of starting a second scan. Every job gets one progress message,
+    can be cancelled with `cancel`, and its result is kept for `keep` seconds for `last_result`.
+    """
+
+    def __init__(self, interval: float = 2.0, keep: float = 3600) -> None:
+        self.interval: float = interval
+        self.keep: float = keep
+        self._running: typing.Dict[typing.Tuple[int, str], Job] = {}
+        self._results: typing.Dict[typing.Tuple[int, str], JobResult] = {}
+
+    async def run(
+        self,
+        ctx: commands.Context,
+        name: str,
+        work: typing.Callable[[Job], typing.Awaitable[T]],
+    ) -> typing.Optional[T]:
+        """
+        Run `work` as job `name` in the guild of `ctx`, or attach to it if it's already running.
+        Returns the result, or None when the job was cancelled.
+        """
+        key = (ctx.guild.id, name)
+        job = self._running.get(key)
+        if job is not None:
+            await ctx.send(f"⏳ **{name}** loopt al sinds {job.elapsed:.0f} seconden, het resultaat volgt hier ook. {job.message.jump_url}")
+        else:
+            message = await ctx.send(f"⏳ **{name}**: gestart")
+            job = Job(ctx.guild.id, name, message, self.interval)
+            job.task = asyncio.create_task(self._execute(key, job, work))
+            self._running[key] = job
+        try:
+            return await asyncio.shield(job.task)
+        except asyncio.CancelledError:
+            if job.task.cancelled():
+                return None
+            raise
+
+    async def _execute(self, key: typing.Tuple[int, str], job: Job, work: typing.Callable[[Job], typing.Awaitable[T]]) -> T:
+        try:
+            result = await work(job)
+        except asyncio.CancelledError:
+            await job.finish(f"🛑 **{job.name}** geannuleerd na {job.elapsed:.0f} seconden")
+            raise
+        except Exception:
+            await job.finish(f"❌ **{job.name}** mislukt na {job.elapsed:.0f} seconden")
+            raise
+        finally:
+            self._running.pop(key, None)
+        self._results[key] = JobResult(job.name, result, time.time())
+        await job.finish(f"✅ **{job.name}** klaar in {job.elapsed:.0f} seconden")
+        return result
+
+    def running(self, guild_id: int) -> typing.List[Job]:
+        return [job for (job_guild, _), job in self._running.items() if job_guild == guild_id]
+
+    def cancel(self, guild_id: int, name: typing.Optional[str] = None) -> int:
+        """Cancel one job, or all jobs of the guild; returns how many were cancelled."""
+        jobs = [job for job in self.running(guild_id) if name is None or job.name == name]
+        for job in jobs:
+            job.task.cancel()
+        return len(jobs)
+
+    def results(self, guild_id: int) -> typing.List[JobResult]:
+        """The kept results of the guild, newest first."""
+        cutoff = time.time() - self.keep
+        for key in [key for key, result in self._results.items() if result.finished < cutoff]:
+            del self._results[key]
+        return sorted(
+            (result for (job_guild, _), result in self._results.items() if job_guild == guild_id),
+            key=lambda result: result.finished,
+            reverse=True,
+        )
+
+    def last_result(self, guild_id: int, name: str) -> typing.Optional[JobResult]:
+        return next((result for result in self.results(guild_id) if result.name == name), None)
+
+    def cancel_all(self) -> None:
+        for job in self._running.values():
+            job.task.cancel()
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import tempfile
+import typing
+
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+
+async def spool_download(
+    session: aiohttp.ClientSession,
+    url: str,
+    *,
+    chunk_size: int = 1 << 16,
+) -> typing.Optional[typing.IO[bytes]]:
+    """
+    Stream `url` into a temporary file on disk chunk by chunk and return it rewound,
+    or None when the status isn't 200.
+    A real file rather than a SpooledTemporaryFile: before Python 3.11 that lacks the
+    io methods `discord.File` relies on, such as `seekable`.
+    """
+    async with session.get(url) as resp:
+        if resp.status != 200:
+            log.error(f"Download van {url} mislukt. Status: {resp.status}")
+            return None
+        file = tempfile.TemporaryFile()
+        try:
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                file.write(chunk)
+        except BaseException:
+            file.close()
+            raise
+    file.seek(0)
+    return file
+
+
+class Prefetcher:
+    """
+    Start downloads ahead of their use with bounded concurrency, over one shared session.
+    Use as an async context manager: on exit, unfinished downloads are cancelled and files
+    that were never taken are closed.
+    """
+
+    def __init__(self, concurrency: int = 3, timeout: float = 300) -> None:
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+        self._timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._tasks: typing.Dict[typing.Hashable, asyncio.Task] = {}
+
+    async def __aenter__(self) -> "Prefetcher":
+        self._session = aiohttp.ClientSession(timeout=self._timeout)
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+        for task in self._tasks.values():
+            try:
+                file = await task
+            except BaseException:
+                continue
+            if file is not None:
+                file.close()
+        self._tasks.clear()
+        await self._session.close()
+
+    async def _download(self, url: str) -> typing.Optional[typing.IO[bytes]]:
+        async with self._semaphore:
+            return await spool_download(self._session, url)
+
+    def prefetch(self, key: typing.Hashable, url: str) -> None:
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._download(url))
+
+    async def take(self, key: typing.Hashable) -> typing.Optional[typing.IO[bytes]]:
+        """Wait for the download of `key` and hand its file over to the caller, who must close it."""
+        task = self._tasks.pop(key)
+        try:
+            return await task
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            log.error(f"Download mislukt: {error}")
+            return None
@@ -0,0 +1,171 @@
+import bisect
+import contextlib
+import re
+import time
+import typing
+
+# Upper bounds in seconds of the latency histogram buckets.
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_SNOWFLAKE = re.compile(r"\d{15,}")
+
+
+def route_key(method: str, path: str) -> str:
+    """`PATCH /channels/{id}/messages/{id}` for a concrete Discord path, so ids don't explode the series."""
+    return f"{method} {_SNOWFLAKE.sub('{id}', path.split('?', 1)[0])}"
+
+
+class Series:
+    """Totals and a latency histogram of one endpoint."""
+
+    __slots__ = ("count", "errors", "seconds", "bytes_in", "bytes_out", "buckets")
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.errors: int = 0
+        self.seconds: float = 0.0
+        self.bytes_in: int = 0
+        self.bytes_out: int = 0
+        self.buckets: typing.List[int] = [0] * (len(BUCKETS) + 1)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding quantile `q`; infinity when it's past the last bucket."""
+        rank = q * self.count
+        seen = 0
+        for bound, amount in zip(BUCKETS, self.buckets):
+            seen += amount
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Call:
+    """Handed out by `Metrics.track` so the caller can record the bytes of a call."""
+
+    __slots__ = ("bytes_in", "bytes_out")
+
+    def __init__(self) -> None:
+        self.bytes_in: int = 0
+        self.bytes_out: int = 0
+
+
+class Metrics:
+    """
+    In-process request metrics per `(kind, endpoint)`: call and error counters, bytes in and out
+    and a fixed-bucket latency histogram. Recording is a few additions, cheap enough to leave on.
+    """
+
+    def __init__(self) -> None:
+        self._series: typing.Dict[typing.Tuple[str, str], Series] = {}
+        self.since: float = time.time()
+
+    def observe(
+        self,
+        kind: str,
+        endpoint: str,
+        seconds: float,
+        *,
+        error: bool = False,
+        bytes_in: int = 0,
+        bytes_out: int = 0,
+    ) -> None:
+        series = self._series.get((kind, endpoint))
+        if series is None:
+            series = self._series[(kind, endpoint)] = Series()
+        series.count += 1
+        series.errors += error
+        series.seconds += seconds
+        series.bytes_in += bytes_in
+        series.bytes_out += bytes_out
+        series.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    @contextlib.contextmanager
+    def track(self, kind: str, endpoint: str) -> typing.Iterator[Call]:
+        """Time the block; an exception escaping it counts as an error."""
+        call = Call()
+        start = time.perf_counter()
+        error = False
+        try:
+            yield call
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(
+                kind,
+                endpoint,
+                time.perf_counter() - start,
+                error=error,
+                bytes_in=call.bytes_in,
+                bytes_out=call.bytes_out,
+            )
+
+    def items(self) -> typing.List[typing.Tuple[str, str, Series]]:
+        """All series, the ones with the most time spent first."""
+        return sorted(
+            ((kind, endpoint, series) for (kind, endpoint), series in self._series.items()),
+            key=lambda item: item[2].seconds,
+            reverse=True,
+        )
+
+    def reset(self) -> None:
+        self._series.clear()
+        self.since = time.time()
+
+
+def _format_bytes(amount: int) -> str:
+    for unit in ("B", "kB", "MB"):
+        if amount < 1000:
+            return f"{amount:.0f} {unit}" if unit == "B" else f"{amount:.1f} {unit}"
+        amount /= 1000
+    return f"{amount:.1f} GB"
+
+
+def summary_line(kind: str, endpoint: str, series: Series) -> str:
+    p95 = series.quantile(0.95)
+    p95_text = f"≤ {p95 * 1000:.0f} ms" if p95 != float("inf") else f"> {BUCKETS[-1]:.0f} s"
+    line = (
+        f"`{kind} {endpoint}` {series.count}× · gem. {series.seconds / series.count * 1000:.0f} ms"
+        f" · p95 {p95_text} · totaal {series.seconds:.1f} s"
+    )
+    if series.bytes_in or series.bytes_out:
+        line += f" · {_format_bytes(series.bytes_in)} in / {_format_bytes(series.bytes_out)} uit"
+    if series.errors:
+        line += f" · **{series.errors} fout{'en' if series.errors > 1 else ''}**"
+    return line
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus(sources: typing.Mapping[str, Metrics], prefix: str = "szg") -> str:
+    """The metrics of every cog in `sources` in the Prometheus text exposition format."""
+    counters = {
+        "requests_total": ("Aantal requests", lambda series: series.count),
+        "request_errors_total": ("Aantal mislukte requests", lambda series: series.errors),
+        "request_bytes_in_total": ("Ontvangen bytes", lambda series: series.bytes_in),
+        "request_bytes_out_total": ("Verstuurde bytes", lambda series: series.bytes_out),
+    }
+    rows = [
+        (f'cog="{_escape(cog)}",kind="{_escape(kind)}",endpoint="{_escape(endpoint)}"', series)
+        for cog, metrics in sources.items()
+        for kind, endpoint, series in metrics.items()
+    ]
+    lines = []
+    for name, (help_text, value) in counters.items():
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} counter")
+        lines.extend(f"{prefix}_{name}{{{labels}}} {value(series)}" for labels, series in rows)
+    name = f"{prefix}_request_duration_seconds"
+    lines.append(f"# HELP {name} Duur van requests")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, series in rows:
+        cumulative = 0
+        for bound, amount in zip(BUCKETS, series.buckets):
+            cumulative += amount
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {series.count}')
+        lines.append(f"{name}_sum{{{labels}}} {series.seconds}")
+        lines.append(f"{name}_count{{{labels}}} {series.count}")
+    return "\n".join(lines) + "\n"
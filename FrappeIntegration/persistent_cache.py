@@ -0,0 +1,107 @@
+import json
+import pathlib
+import sqlite3
+import time
+import typing
+
+from .sqlite_store import SQLiteStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    validator TEXT,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_stored_at ON entries (stored_at);
+"""
+
+
+class StoredEntry(typing.NamedTuple):
+    value: typing.Any
+    validator: typing.Optional[str]
+    stored_at: float  # unix time
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+
+class PersistentCache(SQLiteStore):
+    """
+    On-disk cache of Frappe responses and downloaded files, so a reloaded or restarted cog starts
+    warm instead of fetching everything again. The Frappe cog keeps one, shared with the other cogs.
+
+    Values are JSON or bytes. Every entry keeps the validator it was fetched with (a `modified`
+    timestamp, an ETag, ...) so the value can be checked cheaply; `ResponseCache` does that with
+    stale-while-revalidate on top of this store. Keys are JSON-serialisable; once the entries
+    exceed `max_bytes` the oldest are dropped.
+    """
+
+    schema = _SCHEMA
+    label = "Cache"
+
+    def __init__(self, path: typing.Union[str, pathlib.Path], *, max_bytes: int = 64 * 1024 * 1024) -> None:
+        super().__init__(path)
+        self.max_bytes: int = max_bytes
+
+    @staticmethod
+    def _key(key: typing.Any) -> str:
+        return key if isinstance(key, str) else json.dumps(key, sort_keys=True)
+
+    async def get(self, key: typing.Any) -> typing.Optional[StoredEntry]:
+        row = await self._run(
+            lambda db: db.execute(
+                "SELECT kind, data, validator, stored_at FROM entries WHERE key = ?", (self._key(key),)
+            ).fetchone()
+        )
+        if row is None:
+            return None
+        kind, data, validator, stored_at = row
+        value = bytes(data) if kind == "bytes" else json.loads(data)
+        return StoredEntry(value, validator, stored_at)
+
+    async def put(self, key: typing.Any, value: typing.Any, validator: typing.Optional[str] = None) -> None:
+        if isinstance(value, (bytes, bytearray)):
+            kind, data = "bytes", bytes(value)
+        else:
+            kind, data = "json", json.dumps(value).encode()
+
+        def store(db: sqlite3.Connection) -> None:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, data, size, validator, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (self._key(key), kind, data, len(data), validator, time.time()),
+            )
+            self._prune(db)
+
+        await self._run(store)
+
+    async def touch(self, key: typing.Any) -> None:
+        """Mark the stored value as checked just now."""
+        await self._run(
+            lambda db: db.execute("UPDATE entries SET stored_at = ? WHERE key = ?", (time.time(), self._key(key)))
+        )
+
+    async def delete(self, key: typing.Any) -> None:
+        await self._run(lambda db: db.execute("DELETE FROM entries WHERE key = ?", (self._key(key),)))
+
+    async def clear(self, prefix: typing.Optional[str] = None) -> None:
+        """Drop every entry, or only those whose key starts with `prefix`."""
+        if prefix is None:
+            await self._run(lambda db: db.execute("DELETE FROM entries"))
+        else:
+            await self._run(lambda db: db.execute("DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)))
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        total = db.execute("SELECT coalesce(sum(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in db.execute("SELECT key, size FROM entries ORDER BY stored_at"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        db.executemany("DELETE FROM entries WHERE key = ?", doomed)
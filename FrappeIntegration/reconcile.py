@@ -0,0 +1,77 @@
+import dataclasses
+import typing
+
+
+@dataclasses.dataclass
+class EventRoleDiff:
+    """Verschillen tussen de eventrollen in de server en de event ranking in de database."""
+
+    # (member_id, events): rol komt overeen met de database
+    correct: typing.List[typing.Tuple[int, int]] = dataclasses.field(default_factory=list)
+    # (member_id, events volgens rol, events volgens database)
+    wrong_count: typing.List[typing.Tuple[int, int, int]] = dataclasses.field(default_factory=list)
+    # (member_id, events): in database en server, maar zonder eventrol
+    missing: typing.List[typing.Tuple[int, int]] = dataclasses.field(default_factory=list)
+    # member_id: wel een eventrol, niet in de database
+    surplus: typing.List[int] = dataclasses.field(default_factory=list)
+    # member_id: wel in de database, niet in de server
+    not_in_server: typing.List[int] = dataclasses.field(default_factory=list)
+    # Aantallen events waarvoor geen rol bestaat
+    missing_roles: typing.List[int] = dataclasses.field(default_factory=list)
+
+    @property
+    def in_sync(self) -> bool:
+        return not (self.wrong_count or self.missing or self.surplus)
+
+
+def index_ranking(ranking: typing.Iterable[dict]) -> typing.Dict[int, int]:
+    """Index the `event_ranking` rows as discord_id -> events, skipping rows without a valid id."""
+    index: typing.Dict[int, int] = {}
+    for row in ranking:
+        try:
+            index[int(row["discord_id"])] = row["events"]
+        except (KeyError, TypeError, ValueError):
+            continue
+    return index
+
+
+def reconcile_event_roles(
+    ranking: typing.Iterable[dict],
+    role_members: typing.Mapping[int, typing.Optional[typing.Iterable[int]]],
+    in_server: typing.Callable[[int], bool],
+) -> EventRoleDiff:
+    """
+    Compare the event roles with the database in time linear in members plus rows.
+
+    `role_members` maps every event count to the ids of the members with that role,
+    or to None when the role does not exist. `in_server` tells whether a member id is in the guild.
+    """
+    database = index_ranking(ranking)
+    diff = EventRoleDiff()
+    with_role: typing.Set[int] = set()
+    surplus: typing.Set[int] = set()
+
+    for events in sorted(role_members, reverse=True):
+        member_ids = role_members[events]
+        if member_ids is None:
+            diff.missing_roles.append(events)
+            continue
+        for member_id in member_ids:
+            with_role.add(member_id)
+            database_events = database.get(member_id)
+            if database_events is None:
+                if member_id not in surplus:
+                    surplus.add(member_id)
+                    diff.surplus.append(member_id)
+            elif database_events == events:
+                diff.correct.append((member_id, events))
+            else:
+                diff.wrong_count.append((member_id, events, database_events))
+
+    for member_id, events in database.items():
+        if not in_server(member_id):
+            diff.not_in_server.append(member_id)
+        elif member_id not in with_role and events > 0:
+            diff.missing.append((member_id, events))
+
+    return diff
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+import typing
+
+import discord
+
+from .metrics import Metrics
+
+log = logging.getLogger(__name__)
+
+T = typing.TypeVar("T")
+
+# Discord answers at most 100 user ids per REQUEST_GUILD_MEMBERS.
+CHUNK_SIZE = 100
+
+
+class MemberResolver:
+    """
+    Resolves Discord ids to guild members when the gateway member cache may be incomplete.
+
+    Ids missing from `guild.get_member` are looked up in chunks of `CHUNK_SIZE` with
+    `guild.query_members`, at most `concurrency` chunks at a time. A query by user ids doesn't need
+    the members intent, so this works whether or not the cache is complete. Found members are
+    kept for `ttl` seconds, ids that aren't in the guild for `absent_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 2,
+        ttl: float = 300,
+        absent_ttl: float = 300,
+        timeout: float = 30.0,
+        metrics: typing.Optional[Metrics] = None,
+    ) -> None:
+        self.concurrency: int = concurrency
+        self.ttl: float = ttl
+        self.absent_ttl: float = absent_ttl
+        self.timeout: float = timeout
+        self.metrics: typing.Optional[Metrics] = metrics
+        # guild id -> member id -> (member or None when absent, resolved at)
+        self._cache: typing.Dict[int, typing.Dict[int, typing.Tuple[typing.Optional[discord.Member], float]]] = {}
+
+    async def resolve(self, guild: discord.Guild, member_ids: typing.Iterable[int]) -> typing.Dict[int, discord.Member]:
+        """Map each of `member_ids` that is in the guild to its member; ids not in the guild are left out."""
+        cache = self._cache.setdefault(guild.id, {})
+        now = time.monotonic()
+        found: typing.Dict[int, discord.Member] = {}
+        missing: typing.List[int] = []
+        for member_id in dict.fromkeys(member_ids):
+            member = guild.get_member(member_id)
+            if member is not None:
+                found[member_id] = member
+                continue
+            cached = cache.get(member_id)
+            if cached is not None and now - cached[1] < (self.ttl if cached[0] is not None else self.absent_ttl):
+                if cached[0] is not None:
+                    found[member_id] = cached[0]
+                continue
+            missing.append(member_id)
+        if not missing:
+            return found
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        chunks = [missing[start : start + CHUNK_SIZE] for start in range(0, len(missing), CHUNK_SIZE)]
+        results = await asyncio.gather(*(self._query_chunk(guild, chunk, semaphore) for chunk in chunks))
+
+        resolved_at = time.monotonic()
+        for members in results:
+            if members is None:
+                continue
+            for member_id, member in members.items():
+                cache[member_id] = (member, resolved_at)
+                if member is not None:
+                    found[member_id] = member
+        return found
+
+    async def _query_chunk(
+        self, guild: discord.Guild, chunk: typing.List[int], semaphore: asyncio.Semaphore
+    ) -> typing.Optional[typing.Dict[int, typing.Optional[discord.Member]]]:
+        """The members of one chunk, with None for ids not in the guild; None when Discord didn't answer."""
+        async with semaphore:
+            try:
+                members = await self._tracked(
+                    "GATEWAY REQUEST_GUILD_MEMBERS",
+                    asyncio.wait_for(guild.query_members(user_ids=chunk, limit=len(chunk), cache=True), self.timeout),
+                )
+            except asyncio.TimeoutError:
+                log.warning(f"Opvragen van {len(chunk)} leden in {guild.id} duurde te lang.")
+                return None
+        result: typing.Dict[int, typing.Optional[discord.Member]] = dict.fromkeys(chunk)
+        result.update((member.id, member) for member in members)
+        return result
+
+    async def _tracked(self, endpoint: str, request: typing.Awaitable[T]) -> T:
+        if self.metrics is None:
+            return await request
+        with self.metrics.track("discord", endpoint):
+            return await request
+
+    def forget(self, guild_id: int, member_id: int) -> None:
+        self._cache.get(guild_id, {}).pop(member_id, None)
+
+    def invalidate(self, guild_id: typing.Optional[int] = None) -> None:
+        if guild_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(guild_id, None)
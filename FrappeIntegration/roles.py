@@ -0,0 +1,168 @@
+import asyncio
+import dataclasses
+import logging
+import re
+import typing
+
+import discord
+
+from .metrics import Metrics
+
+log = logging.getLogger(__name__)
+
+EVENT_ROLE_PATTERN = re.compile(r"^\s*(\d+) events?\s*$")
+
+ProgressCallback = typing.Callable[[int, int], typing.Awaitable[None]]
+
+
+def parse_event_role(name: str) -> typing.Optional[int]:
+    """Return the event count of an event role name such as `1 event` or `12 events`."""
+    match = EVENT_ROLE_PATTERN.match(name)
+    return int(match.group(1)) if match else None
+
+
+def event_role_name(events: int) -> str:
+    return "1 event" if events == 1 else f"{events} events"
+
+
+class EventRoleIndex:
+    """
+    Per-guild index from event count to event role and back, so lookups don't scan `guild.roles`.
+    Built on first use per guild and kept current by the cog's `on_guild_role_*` listeners.
+    """
+
+    def __init__(self) -> None:
+        self._by_events: typing.Dict[int, typing.Dict[int, int]] = {}
+        self._by_role: typing.Dict[int, typing.Dict[int, int]] = {}
+
+    def _ensure(self, guild: discord.Guild) -> None:
+        if guild.id in self._by_events:
+            return
+        by_events: typing.Dict[int, int] = {}
+        by_role: typing.Dict[int, int] = {}
+        # Same precedence as `discord.utils.get(guild.roles, name=...)`: the lowest role wins.
+        for role in guild.roles:
+            events = parse_event_role(role.name)
+            if events is not None:
+                by_events.setdefault(events, role.id)
+                by_role[role.id] = events
+        self._by_events[guild.id] = by_events
+        self._by_role[guild.id] = by_role
+
+    def invalidate(self, guild_id: typing.Optional[int] = None) -> None:
+        if guild_id is None:
+            self._by_events.clear()
+            self._by_role.clear()
+        else:
+            self._by_events.pop(guild_id, None)
+            self._by_role.pop(guild_id, None)
+
+    def get_role(self, guild: discord.Guild, events: int) -> typing.Optional[discord.Role]:
+        self._ensure(guild)
+        role_id = self._by_events[guild.id].get(events)
+        return guild.get_role(role_id) if role_id is not None else None
+
+    def get_events(self, role: discord.Role) -> typing.Optional[int]:
+        """The event count of `role`, or None when it is not an event role."""
+        self._ensure(role.guild)
+        return self._by_role[role.guild.id].get(role.id)
+
+    def member_event_roles(self, member: discord.Member) -> typing.List[discord.Role]:
+        self._ensure(member.guild)
+        by_role = self._by_role[member.guild.id]
+        return [role for role in member.roles if role.id in by_role]
+
+    def role_created(self, role: discord.Role) -> None:
+        if role.guild.id not in self._by_events:
+            return
+        events = parse_event_role(role.name)
+        if events is None:
+            return
+        if events in self._by_events[role.guild.id]:
+            # Another role already has this name; rebuilding keeps the lookup precedence right.
+            self.invalidate(role.guild.id)
+            return
+        self._by_events[role.guild.id][events] = role.id
+        self._by_role[role.guild.id][role.id] = events
+
+    def role_deleted(self, role: discord.Role) -> None:
+        if role.id in self._by_role.get(role.guild.id, {}):
+            self.invalidate(role.guild.id)
+
+    def role_updated(self, before: discord.Role, after: discord.Role) -> None:
+        if before.name == after.name:
+            return
+        if before.id in self._by_role.get(before.guild.id, {}):
+            self.invalidate(before.guild.id)
+        else:
+            self.role_created(after)
+
+
+@dataclasses.dataclass
+class RoleChange:
+    """The event roles one member should lose and the event role they should get."""
+
+    member: discord.Member
+    add: typing.Optional[discord.Role] = None
+    remove: typing.List[discord.Role] = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass
+class RoleApplyResult:
+    applied: typing.List[RoleChange] = dataclasses.field(default_factory=list)
+    failed: typing.List[typing.Tuple[RoleChange, Exception]] = dataclasses.field(default_factory=list)
+
+
+async def _apply_change(change: RoleChange, reason: typing.Optional[str], metrics: typing.Optional[Metrics]) -> None:
+    # Only the event roles themselves are touched, one request each: a PATCH with the full role list
+    # would be built from a cached member and undo any role change made since the plan was computed.
+    steps = [("DELETE /guilds/{id}/members/{id}/roles/{id}", change.member.remove_roles, role) for role in change.remove]
+    if change.add is not None:
+        steps.append(("PUT /guilds/{id}/members/{id}/roles/{id}", change.member.add_roles, change.add))
+    for endpoint, request, role in steps:
+        if metrics is None:
+            await request(role, reason=reason)
+            continue
+        with metrics.track("discord", endpoint):
+            await request(role, reason=reason)
+
+
+async def apply_role_changes(
+    changes: typing.Sequence[RoleChange],
+    *,
+    concurrency: int = 4,
+    reason: typing.Optional[str] = None,
+    progress: typing.Optional[ProgressCallback] = None,
+    metrics: typing.Optional[Metrics] = None,
+) -> RoleApplyResult:
+    """
+    Execute precomputed role changes through a bounded work queue.
+
+    All member role routes of a guild share one rate-limit bucket that discord.py already paces,
+    so a few workers keep that bucket saturated without queueing hundreds of waiting requests.
+    `progress(done, total)` is awaited after every change, and with `metrics` every request is recorded.
+    """
+    result = RoleApplyResult()
+    queue: asyncio.Queue = asyncio.Queue()
+    for change in changes:
+        queue.put_nowait(change)
+    total = len(changes)
+
+    async def worker() -> None:
+        while True:
+            try:
+                change = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await _apply_change(change, reason, metrics)
+            except discord.HTTPException as error:
+                log.warning(f"Rollen van {change.member} aanpassen mislukt: {error}")
+                result.failed.append((change, error))
+            else:
+                result.applied.append(change)
+            if progress is not None:
+                await progress(len(result.applied) + len(result.failed), total)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, total)))))
+    return result
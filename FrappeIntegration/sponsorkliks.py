@@ -0,0 +1,85 @@
+import asyncio
+import time
+import typing
+
+import aiohttp
+
+FIELDS = ("pending", "accepted", "sponsorkliks", "qualified", "transferred")
+
+
+class SponsorkliksClient:
+    """Async `commissions_total` fetcher with a short TTL cache; concurrent callers share one request."""
+
+    URL = "https://www.sponsorkliks.com/api/"
+
+    def __init__(self, club: int = 11592, ttl: float = 300, timeout: float = 15) -> None:
+        self.club: int = club
+        self.ttl: float = ttl
+        self.timeout: float = timeout
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._latest: typing.Optional[typing.Tuple[float, typing.Dict[str, float]]] = None
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={"User-Agent": "My User Agent 1.0"},
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def fetch(self, force: bool = False) -> typing.Dict[str, float]:
+        async with self._lock:
+            if not force and self._latest is not None and time.monotonic() - self._latest[0] < self.ttl:
+                return self._latest[1]
+            async with self.session.get(
+                self.URL, params={"club": str(self.club), "call": "commissions_total"}
+            ) as resp:
+                resp.raise_for_status()
+                # The API does not always send a JSON content type.
+                json_object = await resp.json(content_type=None)
+            totals = {field: float(json_object["commissions_total"][field]) for field in FIELDS}
+            self._latest = (time.monotonic(), totals)
+            return totals
+
+
+def to_snapshot(totals: typing.Mapping[str, float], timestamp: typing.Optional[float] = None) -> list:
+    """Compact `[unix_time, pending, accepted, sponsorkliks, qualified, transferred]` row."""
+    return [int(timestamp if timestamp is not None else time.time())] + [
+        round(totals[field], 2) for field in FIELDS
+    ]
+
+
+def from_snapshot(snapshot: typing.Sequence[float]) -> typing.Dict[str, float]:
+    return dict(zip(FIELDS, snapshot[1:]))
+
+
+def append_snapshot(history: list, snapshot: list, max_length: int = 2000) -> bool:
+    """
+    Append `snapshot` in place unless the values equal the previous one, so the history only
+    grows when something changed. Returns whether the history was modified.
+    """
+    if history and history[-1][1:] == snapshot[1:]:
+        return False
+    history.append(snapshot)
+    if len(history) > max_length:
+        del history[: len(history) - max_length]
+    return True
+
+
+def snapshot_at(history: typing.Sequence[list], timestamp: float) -> typing.Optional[list]:
+    """The latest snapshot taken at or before `timestamp`; values stay valid until the next row."""
+    low, high = 0, len(history)
+    while low < high:
+        middle = (low + high) // 2
+        if history[middle][0] <= timestamp:
+            low = middle + 1
+        else:
+            high = middle
+    return history[low - 1] if low else None
@@ -0,0 +1,56 @@
+import asyncio
+import pathlib
+import sqlite3
+import threading
+import typing
+
+
+class SQLiteStore:
+    """
+    A SQLite file opened once and used from worker threads, so queries never block the event loop.
+
+    Subclasses set `schema`, which `open` applies, and query through `_run`: every call runs in
+    one transaction, and calls are serialised by a lock because the connection is shared.
+    """
+
+    schema: str = ""
+    label: str = "Database"  # For the error when the store is used before `open`
+
+    def __init__(self, path: typing.Union[str, pathlib.Path]) -> None:
+        self.path: pathlib.Path = pathlib.Path(path)
+        self._db: typing.Optional[sqlite3.Connection] = None
+        self._db_lock: threading.Lock = threading.Lock()
+
+    def _execute(self, func: typing.Callable[[sqlite3.Connection], typing.Any]) -> typing.Any:
+        with self._db_lock:
+            if self._db is None:
+                raise RuntimeError(f"{self.label} is niet geopend")
+            with self._db:
+                return func(self._db)
+
+    async def _run(self, func: typing.Callable[[sqlite3.Connection], typing.Any]) -> typing.Any:
+        return await asyncio.to_thread(self._execute, func)
+
+    async def open(self) -> None:
+        def connect() -> None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(self.schema)
+            with self._db_lock:
+                self._db = db
+
+        await asyncio.to_thread(connect)
+
+    async def close(self) -> None:
+        def disconnect() -> None:
+            with self._db_lock:
+                if self._db is not None:
+                    self._db.close()
+                    self._db = None
+
+        await asyncio.to_thread(disconnect)
+
+    @property
+    def is_open(self) -> bool:
+        return self._db is not None
@@ -0,0 +1,321 @@
+import asyncio
+import dataclasses
+import json
+import logging
+import pathlib
+import sqlite3
+import time
+import typing
+
+from .frappe_api import AsyncFrappeClient, FRAPPE_ERRORS
+from .sqlite_store import SQLiteStore
+
+log = logging.getLogger(__name__)
+
+_OPERATORS = {"=": "=", "!=": "!=", ">": ">", "<": "<", ">=": ">=", "<=": "<="}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doctype TEXT NOT NULL,
+    name TEXT NOT NULL,
+    modified TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (doctype, name)
+);
+CREATE TABLE IF NOT EXISTS children (
+    doctype TEXT NOT NULL,
+    table_field TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS children_parent ON children (doctype, table_field, parent);
+CREATE TABLE IF NOT EXISTS state (
+    doctype TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    watermark TEXT,
+    deletions_checked REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+@dataclasses.dataclass
+class MirrorSpec:
+    """A doctype to mirror: its columns and the child tables (table field -> columns) to keep."""
+
+    doctype: str
+    fields: typing.List[str]
+    child_tables: typing.Dict[str, typing.List[str]] = dataclasses.field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        for required in ("name", "modified"):
+            if required not in self.fields:
+                self.fields = [required] + self.fields
+
+    def fingerprint(self) -> str:
+        return json.dumps([self.fields, self.child_tables], sort_keys=True)
+
+
+def _json_path(field: str) -> str:
+    return '$."' + field.replace('"', '""') + '"'
+
+
+class DoctypeMirror(SQLiteStore):
+    """
+    Local SQLite mirror of selected Frappe doctypes.
+
+    The first sync takes a full snapshot. After that only rows whose `modified` is at or after the
+    stored watermark are pulled, together with their child table rows. Deleted documents can't be
+    seen that way, so every `deletion_interval` seconds the list of names is diffed against the
+    mirror. Commands read from the mirror with `rows` and `children`.
+    """
+
+    schema = _SCHEMA
+    label = "Mirror"
+
+    def __init__(
+        self,
+        client: AsyncFrappeClient,
+        path: typing.Union[str, pathlib.Path],
+        specs: typing.Iterable[MirrorSpec],
+        *,
+        deletion_interval: float = 3600,
+    ) -> None:
+        super().__init__(path)
+        self.client: AsyncFrappeClient = client
+        self.specs: typing.Dict[str, MirrorSpec] = {spec.doctype: spec for spec in specs}
+        self.deletion_interval: float = deletion_interval
+        self._sync_locks: typing.Dict[str, asyncio.Lock] = {doctype: asyncio.Lock() for doctype in self.specs}
+        self._synced_at: typing.Dict[str, float] = {}
+
+    async def open(self) -> None:
+        await super().open()
+
+        def reset_changed_specs(db: sqlite3.Connection) -> None:
+            # A doctype whose columns changed since the last run needs a new full snapshot.
+            stored = dict(db.execute("SELECT doctype, spec FROM state"))
+            for doctype, spec in self.specs.items():
+                if stored.get(doctype) != spec.fingerprint():
+                    self._clear(db, doctype)
+                    db.execute(
+                        "INSERT OR REPLACE INTO state (doctype, spec, watermark, deletions_checked) VALUES (?, ?, NULL, 0)",
+                        (doctype, spec.fingerprint()),
+                    )
+
+        await self._run(reset_changed_specs)
+
+    @staticmethod
+    def _clear(db: sqlite3.Connection, doctype: str) -> None:
+        db.execute("DELETE FROM docs WHERE doctype = ?", (doctype,))
+        db.execute("DELETE FROM children WHERE doctype = ?", (doctype,))
+
+    # Syncing
+
+    async def sync(self, doctype: typing.Optional[str] = None) -> typing.Dict[str, int]:
+        """Sync one doctype, or all of them; returns the number of changed rows per doctype."""
+        doctypes = [doctype] if doctype else list(self.specs)
+        return {doctype: await self._sync(doctype) for doctype in doctypes}
+
+    async def ensure_fresh(self, doctype: str, max_age: float = 60) -> None:
+        """
+        Sync `doctype` unless that happened in the last `max_age` seconds. When Frappe can't be
+        reached but a snapshot exists, the snapshot is served and the error only logged.
+        """
+        if time.monotonic() - self._synced_at.get(doctype, float("-inf")) < max_age:
+            return
+        try:
+            await self._sync(doctype, max_age)
+        except FRAPPE_ERRORS as error:
+            watermark = await self._run(
+                lambda db: db.execute("SELECT watermark FROM state WHERE doctype = ?", (doctype,)).fetchone()
+            )
+            if not watermark or watermark[0] is None:
+                raise
+            log.warning(f"Synchroniseren van {doctype} mislukt, de lokale kopie wordt gebruikt: {error}")
+
+    async def _sync(self, doctype: str, max_age: float = 0) -> int:
+        spec = self.specs[doctype]
+        async with self._sync_locks[doctype]:
+            # Whoever waited for the lock can use the sync that just finished.
+            if time.monotonic() - self._synced_at.get(doctype, float("-inf")) < max_age:
+                return 0
+            watermark, deletions_checked = await self._run(
+                lambda db: db.execute(
+                    "SELECT watermark, deletions_checked FROM state WHERE doctype = ?", (doctype,)
+                ).fetchone()
+            )
+            # `>=` rather than `>`: rows saved in the same second as the watermark must not be missed.
+            filters = [["modified", ">=", watermark]] if watermark else None
+            requests = [self._collect(doctype, spec.fields, filters)]
+            requests += [
+                self.client.get_child_rows(doctype, table_field, columns, filters=filters)
+                for table_field, columns in spec.child_tables.items()
+            ]
+            rows, *child_rows = await asyncio.gather(*requests)
+
+            names = None
+            if watermark is None:
+                # A full snapshot lists every document already.
+                names = {row["name"] for row in rows}
+            elif time.time() - deletions_checked >= self.deletion_interval:
+                names = {row["name"] async for row in self.client.iter_list(doctype, fields=["name"], page_length=5000)}
+
+            def store(db: sqlite3.Connection) -> None:
+                self._store(db, spec, rows, dict(zip(spec.child_tables, child_rows)), names)
+
+            await self._run(store)
+            self._synced_at[doctype] = time.monotonic()
+            return len(rows)
+
+    async def _collect(
+        self, doctype: str, fields: typing.List[str], filters: typing.Optional[list]
+    ) -> typing.List[dict]:
+        # Pages keep single responses small; the rows are stored in one transaction all the same.
+        return [row async for row in self.client.iter_list(doctype, fields=fields, filters=filters)]
+
+    @staticmethod
+    def _store(
+        db: sqlite3.Connection,
+        spec: MirrorSpec,
+        rows: typing.List[dict],
+        child_rows: typing.Dict[str, typing.Dict[str, typing.List[dict]]],
+        names: typing.Optional[typing.Set[str]],
+        advance_watermark: bool = True,
+    ) -> None:
+        doctype = spec.doctype
+        db.executemany(
+            "INSERT OR REPLACE INTO docs (doctype, name, modified, data) VALUES (?, ?, ?, ?)",
+            [(doctype, row["name"], row["modified"], json.dumps(row)) for row in rows],
+        )
+        for table_field, grouped in child_rows.items():
+            db.executemany(
+                "DELETE FROM children WHERE doctype = ? AND table_field = ? AND parent = ?",
+                [(doctype, table_field, parent) for parent in grouped],
+            )
+            db.executemany(
+                "INSERT INTO children (doctype, table_field, parent, data) VALUES (?, ?, ?, ?)",
+                [
+                    (doctype, table_field, parent, json.dumps(child))
+                    for parent, children in grouped.items()
+                    for child in children
+                ],
+            )
+        if rows and advance_watermark:
+            db.execute(
+                "UPDATE state SET watermark = max(coalesce(watermark, ''), ?) WHERE doctype = ?",
+                (max(row["modified"] for row in rows), doctype),
+            )
+        if names is not None:
+            stored = {name for name, in db.execute("SELECT name FROM docs WHERE doctype = ?", (doctype,))}
+            deleted = [(doctype, name) for name in stored - names]
+            if deleted:
+                log.info(f"{len(deleted)} verwijderde {doctype} documenten uit de mirror gehaald")
+            db.executemany("DELETE FROM docs WHERE doctype = ? AND name = ?", deleted)
+            db.executemany("DELETE FROM children WHERE doctype = ? AND parent = ?", deleted)
+            db.execute("UPDATE state SET deletions_checked = ? WHERE doctype = ?", (time.time(), doctype))
+
+    async def upsert(self, doctype: str, doc: dict) -> None:
+        """
+        Store a full document, e.g. one received from a webhook, without waiting for the next sync.
+        The watermark stays put: older changes that were not pushed must still be pulled.
+        """
+        spec = self.specs[doctype]
+        if not doc.get("name") or not isinstance(doc.get("modified"), str):
+            # Without a `modified` the version can't be compared, and the column may not be empty.
+            log.warning(f"{doctype} document {doc.get('name')!r} zonder geldige modified overgeslagen")
+            return
+        row = {field: doc.get(field) for field in spec.fields}
+        child_rows = {
+            table_field: {doc["name"]: [{column: child.get(column) for column in columns} for child in doc.get(table_field) or []]}
+            for table_field, columns in spec.child_tables.items()
+        }
+
+        def store(db: sqlite3.Connection) -> None:
+            # Webhook calls can arrive out of order; never replace a newer version.
+            stored = db.execute("SELECT modified FROM docs WHERE doctype = ? AND name = ?", (doctype, doc["name"])).fetchone()
+            if stored is None or stored[0] <= row["modified"]:
+                self._store(db, spec, [row], child_rows, None, advance_watermark=False)
+
+        await self._run(store)
+
+    async def remove(self, doctype: str, name: str) -> None:
+        def delete(db: sqlite3.Connection) -> None:
+            db.execute("DELETE FROM docs WHERE doctype = ? AND name = ?", (doctype, name))
+            db.execute("DELETE FROM children WHERE doctype = ? AND parent = ?", (doctype, name))
+
+        await self._run(delete)
+
+    async def purge(self, field: str, values: typing.Sequence[typing.Any]) -> int:
+        """
+        Delete the documents of every mirrored doctype whose `field` is one of `values`, with their
+        child rows, e.g. everything of one Discord user. Returns the number of documents removed.
+        """
+
+        def delete(db: sqlite3.Connection) -> int:
+            removed = 0
+            for doctype, spec in self.specs.items():
+                if field not in spec.fields:
+                    continue
+                doomed = db.execute(
+                    f"SELECT ?, name FROM docs WHERE doctype = ? AND json_extract(data, ?) IN ({', '.join('?' * len(values))})",
+                    (doctype, doctype, _json_path(field), *values),
+                ).fetchall()
+                db.executemany("DELETE FROM docs WHERE doctype = ? AND name = ?", doomed)
+                db.executemany("DELETE FROM children WHERE doctype = ? AND parent = ?", doomed)
+                removed += len(doomed)
+            return removed
+
+        return await self._run(delete)
+
+    # Queries
+
+    async def rows(
+        self,
+        doctype: str,
+        filters: typing.Optional[typing.Union[dict, list]] = None,
+        order_by: typing.Optional[str] = None,
+        limit: typing.Optional[int] = None,
+    ) -> typing.List[dict]:
+        """
+        Rows of a mirrored doctype. `filters` and `order_by` take the same shapes as
+        `AsyncFrappeClient.get_list`, limited to comparison operators and `in`.
+        """
+        spec = self.specs[doctype]
+        sql = "SELECT data FROM docs WHERE doctype = ?"
+        params: typing.List[typing.Any] = [doctype]
+        if isinstance(filters, dict):
+            filters = [[field, "=", value] for field, value in filters.items()]
+        for field, operator, value in filters or []:
+            if field not in spec.fields:
+                raise ValueError(f"{field} wordt niet gemirrord voor {doctype}")
+            if operator == "in":
+                sql += f" AND json_extract(data, ?) IN ({', '.join('?' * len(value))})"
+                params += [_json_path(field), *value]
+            elif operator in _OPERATORS:
+                sql += f" AND json_extract(data, ?) {_OPERATORS[operator]} ?"
+                params += [_json_path(field), value]
+            else:
+                raise ValueError(f"Filter {operator} wordt niet ondersteund")
+        if order_by:
+            field, _, direction = order_by.partition(" ")
+            if field not in spec.fields:
+                raise ValueError(f"{field} wordt niet gemirrord voor {doctype}")
+            sql += " ORDER BY json_extract(data, ?) " + ("DESC" if direction.strip().lower() == "desc" else "ASC")
+            params.append(_json_path(field))
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return await self._run(lambda db: [json.loads(data) for data, in db.execute(sql, params)])
+
+    async def children(self, doctype: str, table_field: str) -> typing.Dict[str, typing.List[dict]]:
+        """Child rows grouped by parent name, like `AsyncFrappeClient.get_child_rows`."""
+
+        def load(db: sqlite3.Connection) -> typing.Dict[str, typing.List[dict]]:
+            grouped = {name: [] for name, in db.execute("SELECT name FROM docs WHERE doctype = ?", (doctype,))}
+            for parent, data in db.execute(
+                "SELECT parent, data FROM children WHERE doctype = ? AND table_field = ? ORDER BY rowid",
+                (doctype, table_field),
+            ):
+                grouped.setdefault(parent, []).append(json.loads(data))
+            return grouped
+
+        return await self._run(load)
@@ -0,0 +1,71 @@
+import typing
+
+import discord
+
+TIER_LID = "lid"
+TIER_PLUS = "plus"
+TIER_GUEST = "guest"
+
+TIER_ICONS = {
+    TIER_LID: "<:szglogo:945293100824277002>",
+    TIER_PLUS: "<:SZGplus:1188373927119040562>",
+    TIER_GUEST: "<:szglogozwart:945293372099272724>",
+}
+
+
+class MemberTierCache:
+    """
+    Classify members as SZGlid, SZG+ or guest in O(1) after the first lookup.
+
+    The role ids of each tier are precomputed per guild. A member's tier is cached until
+    `on_member_update` reports a role change, and the role sets are rebuilt when roles change.
+    """
+
+    def __init__(self) -> None:
+        self._tier_roles: typing.Dict[int, typing.Tuple[typing.FrozenSet[int], typing.FrozenSet[int]]] = {}
+        self._tiers: typing.Dict[int, typing.Dict[int, str]] = {}
+
+    def _ensure(self, guild: discord.Guild) -> typing.Tuple[typing.FrozenSet[int], typing.FrozenSet[int]]:
+        tier_roles = self._tier_roles.get(guild.id)
+        if tier_roles is None:
+            tier_roles = (
+                frozenset(role.id for role in guild.roles if "SZGlid" in role.name),
+                frozenset(role.id for role in guild.roles if "SZG+" in role.name),
+            )
+            self._tier_roles[guild.id] = tier_roles
+            self._tiers[guild.id] = {}
+        return tier_roles
+
+    def get_tier(self, member: discord.Member) -> str:
+        lid_roles, plus_roles = self._ensure(member.guild)
+        tiers = self._tiers[member.guild.id]
+        tier = tiers.get(member.id)
+        if tier is None:
+            role_ids = {role.id for role in member.roles}
+            if role_ids & lid_roles:
+                tier = TIER_LID
+            elif role_ids & plus_roles:
+                tier = TIER_PLUS
+            else:
+                tier = TIER_GUEST
+            tiers[member.id] = tier
+        return tier
+
+    def get_icon(self, member: discord.Member) -> str:
+        return TIER_ICONS[self.get_tier(member)]
+
+    def invalidate(self, guild_id: typing.Optional[int] = None) -> None:
+        """Forget the tier roles and member tiers of one guild, or of all guilds."""
+        if guild_id is None:
+            self._tier_roles.clear()
+            self._tiers.clear()
+        else:
+            self._tier_roles.pop(guild_id, None)
+            self._tiers.pop(guild_id, None)
+
+    def member_updated(self, before: discord.Member, after: discord.Member) -> None:
+        if before.roles != after.roles:
+            self.member_removed(after)
+
+    def member_removed(self, member: discord.Member) -> None:
+        self._tiers.get(member.guild.id, {}).pop(member.id, None)
@@ -0,0 +1,253 @@
+"""
+Minimal stand-ins for the discord.py and Red objects the cogs touch.
+
+Only the attributes and coroutines used by the benchmarked code paths exist. Every call that
+would hit the Discord REST API sleeps `guild.latency` seconds and is counted in `guild.api_calls`.
+"""
+import asyncio
+import random
+import typing
+
+from fake_frappe import BIRTHDAY_ROLE_ID, GUILD_ID, discord_id
+
+
+class FakeRole:
+    def __init__(self, guild: "FakeGuild", role_id: int, name: str, position: int) -> None:
+        self.guild = guild
+        self.id = role_id
+        self.name = name
+        self.position = position
+
+    def __repr__(self) -> str:
+        return f"<FakeRole {self.name}>"
+
+    @property
+    def mention(self) -> str:
+        return f"<@&{self.id}>"
+
+    @property
+    def members(self) -> typing.List["FakeMember"]:
+        return [member for member in self.guild.members if self in member.roles]
+
+    def is_default(self) -> bool:
+        return self.id == self.guild.id
+
+
+class FakeMember:
+    def __init__(self, guild: "FakeGuild", member_id: int, roles: typing.List[FakeRole]) -> None:
+        self.guild = guild
+        self.id = member_id
+        self.name = f"lid{member_id}"
+        self.display_name = self.name
+        self.roles = [guild.default_role] + roles
+
+    def __repr__(self) -> str:
+        return f"<FakeMember {self.id}>"
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    def get_role(self, role_id: int) -> typing.Optional[FakeRole]:
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    async def add_roles(self, *roles: FakeRole, reason: typing.Optional[str] = None) -> None:
+        for role in roles:
+            await self.guild.api_call()
+            if role not in self.roles:
+                self.roles.append(role)
+
+    async def remove_roles(self, *roles: FakeRole, reason: typing.Optional[str] = None) -> None:
+        for role in roles:
+            await self.guild.api_call()
+            if role in self.roles:
+                self.roles.remove(role)
+
+    async def edit(self, *, roles: typing.Optional[typing.List[FakeRole]] = None, reason: typing.Optional[str] = None) -> None:
+        await self.guild.api_call()
+        if roles is not None:
+            self.roles = [self.guild.default_role] + [role for role in roles if not role.is_default()]
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int = GUILD_ID, *, latency: float = 0.0) -> None:
+        self.id = guild_id
+        self.name = "Shadowzone Gaming (benchmark)"
+        self.latency = latency
+        self.api_calls = 0
+        self.scheduled_events: typing.List[dict] = []
+        self.default_role = FakeRole(self, guild_id, "@everyone", 0)
+        self.roles: typing.List[FakeRole] = [self.default_role]
+        self._roles: typing.Dict[int, FakeRole] = {guild_id: self.default_role}
+        self._members: typing.Dict[int, FakeMember] = {}
+
+    async def api_call(self) -> None:
+        self.api_calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def add_role(self, role_id: int, name: str) -> FakeRole:
+        role = FakeRole(self, role_id, name, len(self.roles))
+        self.roles.append(role)
+        self._roles[role_id] = role
+        return role
+
+    def add_member(self, member_id: int, roles: typing.List[FakeRole]) -> FakeMember:
+        member = FakeMember(self, member_id, roles)
+        self._members[member_id] = member
+        return member
+
+    @property
+    def members(self) -> typing.List[FakeMember]:
+        return list(self._members.values())
+
+    @property
+    def member_count(self) -> int:
+        return len(self._members)
+
+    def get_member(self, member_id: int) -> typing.Optional[FakeMember]:
+        return self._members.get(member_id)
+
+    def get_role(self, role_id: int) -> typing.Optional[FakeRole]:
+        return self._roles.get(role_id)
+
+    async def query_members(
+        self, *, user_ids: typing.List[int], limit: int = 5, cache: bool = True
+    ) -> typing.List[FakeMember]:
+        await self.api_call()
+        return [self._members[member_id] for member_id in user_ids if member_id in self._members][:limit]
+
+    def get_channel(self, channel_id: int) -> None:
+        return None
+
+    async def edit(self, **fields: typing.Any) -> None:
+        await self.api_call()
+
+    async def create_scheduled_event(self, **fields: typing.Any) -> dict:
+        await self.api_call()
+        self.scheduled_events.append(fields)
+        return fields
+
+
+def build_guild(dataset: dict, *, latency: float = 0.0, seed: int = 0) -> FakeGuild:
+    """
+    A guild with the event, tier and birthday roles, where 90% of the ranked members are present.
+    Of those, about 70% hold the right event role, 15% a wrong one and 15% none.
+    """
+    rng = random.Random(seed)
+    guild = FakeGuild(latency=latency)
+    guild.add_role(BIRTHDAY_ROLE_ID, "Jarig")
+    lid = guild.add_role(1, "SZGlid")
+    plus = guild.add_role(2, "SZG+")
+    counts = sorted({row["events"] for row in dataset["ranking"] if row["events"] > 0})
+    event_roles = {
+        events: guild.add_role(1000 + events, "1 event" if events == 1 else f"{events} events") for events in counts
+    }
+    members = dataset["docs"]["Member"]
+    for index, row in enumerate(dataset["ranking"]):
+        if rng.random() >= 0.9:
+            continue
+        roles = []
+        member = members.get(f"MEM-{index:06d}", {})
+        roles.append(lid if member.get("membership_type") == "Lid" else plus)
+        chance = rng.random()
+        if row["events"] and chance < 0.7:
+            roles.append(event_roles[row["events"]])
+        elif chance < 0.85 and counts:
+            roles.append(event_roles[rng.choice(counts)])
+        guild.add_member(discord_id(index), roles)
+    return guild
+
+
+class FakeMessage:
+    def __init__(self, content: typing.Optional[str] = None, embed: typing.Any = None) -> None:
+        self.content = content
+        self.embed = embed
+        self.jump_url = "https://discord.com/channels/benchmark"
+
+    async def edit(self, **fields: typing.Any) -> "FakeMessage":
+        self.content = fields.get("content", self.content)
+        return self
+
+
+class FakeContext:
+    """Collects everything a command sends instead of posting it."""
+
+    def __init__(self, bot: "FakeBot", guild: FakeGuild) -> None:
+        self.bot = bot
+        self.guild = guild
+        self.sent: typing.List[FakeMessage] = []
+
+    async def send(self, content: typing.Optional[str] = None, *, embed: typing.Any = None, **fields: typing.Any) -> FakeMessage:
+        message = FakeMessage(content, embed)
+        self.sent.append(message)
+        return message
+
+
+class FakeBot:
+    """Just enough of `Red` for the cogs: guild and cog lookups and shared API tokens."""
+
+    def __init__(self, guild: FakeGuild, tokens: typing.Dict[str, typing.Dict[str, str]]) -> None:
+        self.guild = guild
+        self.tokens = tokens
+        self.cogs: typing.Dict[str, typing.Any] = {}
+        self._ready = asyncio.Event()
+
+    def get_guild(self, guild_id: int) -> typing.Optional[FakeGuild]:
+        return self.guild if guild_id == self.guild.id else None
+
+    def get_cog(self, name: str) -> typing.Any:
+        return self.cogs.get(name)
+
+    async def get_shared_api_tokens(self, service_name: str) -> typing.Dict[str, str]:
+        return dict(self.tokens.get(service_name, {}))
+
+    async def wait_until_ready(self) -> None:
+        # Never ready: the cogs' background loops must not run during a benchmark.
+        await self._ready.wait()
+
+    def dispatch(self, event: str, *args: typing.Any) -> None:
+        pass
+
+
+class FakeConfig:
+    """In-memory `redbot.core.Config` replacement holding only registered globals and guild values."""
+
+    class _Value:
+        def __init__(self, store: dict, key: str) -> None:
+            self._store = store
+            self._key = key
+
+        async def __call__(self) -> typing.Any:
+            return self._store[self._key]
+
+        async def set(self, value: typing.Any) -> None:
+            self._store[self._key] = value
+
+    def __init__(self) -> None:
+        self._globals: typing.Dict[str, typing.Any] = {}
+
+    @classmethod
+    def get_conf(cls, cog: typing.Any, identifier: int, force_registration: bool = False) -> "FakeConfig":
+        return cls()
+
+    def register_global(self, **defaults: typing.Any) -> None:
+        self._globals.update(defaults)
+
+    def register_guild(self, **defaults: typing.Any) -> None:
+        pass
+
+    def __getattr__(self, key: str) -> "_Value":
+        if key.startswith("_") or key not in self._globals:
+            raise AttributeError(key)
+        return self._Value(self._globals, key)
+
+
+class FakeMenu:
+    """Replaces Red's `SimpleMenu`: sends the first page only."""
+
+    def __init__(self, pages: typing.List[typing.Any], **kwargs: typing.Any) -> None:
+        self.pages = pages
+
+    async def start(self, ctx: FakeContext) -> None:
+        await ctx.send(embed=self.pages[0])
@@ -0,0 +1,298 @@
+"""
+Local stand-in for the shadowzone.nl Frappe site, with generated data.
+
+Only the parts of the REST API the cogs use are implemented: `/api/resource` list, get, update,
+the `frappe.client` methods, login, `event_ranking` and `/files`. Every request can be delayed
+by `latency` seconds to model the round trip to the real server.
+"""
+import asyncio
+import datetime
+import email.utils
+import hashlib
+import json
+import random
+import typing
+
+from aiohttp import web
+
+GUILD_ID = 331058477541621774
+BIRTHDAY_ROLE_ID = 943779141688381470
+FIRST_DISCORD_ID = 100_000_000_000_000_000
+PNG = bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010806000000") + bytes(64)
+
+# Child table fields of a doctype: table field -> child doctype.
+CHILD_TABLES = {"Member": {"custom_contributies": "Contributie"}}
+
+
+def _timestamp(moment: datetime.datetime) -> str:
+    return moment.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def discord_id(index: int) -> int:
+    return FIRST_DISCORD_ID + index
+
+
+def generate_dataset(members: int, seed: int = 0) -> typing.Dict[str, typing.Any]:
+    """
+    Generate `members` Member documents with contributions, an event ranking, event sign-ups,
+    Beheer events, Discord events and a banner for today. The same seed gives the same data.
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.now()
+    today = datetime.date.today()
+    docs: typing.Dict[str, typing.Dict[str, dict]] = {
+        "Member": {},
+        "Event deelnemers": {},
+        "Beheer events": {},
+        "Discord events": {},
+        "Discord server banners": {},
+    }
+    ranking = []
+
+    for index in range(members):
+        name = f"MEM-{index:06d}"
+        lid = rng.random() < 0.6
+        start = datetime.date(rng.randint(2012, 2024), rng.randint(1, 12), 1)
+        ended = rng.random() < 0.15
+        birthday = today if rng.random() < 0.01 else datetime.date(rng.randint(1970, 2008), rng.randint(1, 12), rng.randint(1, 28))
+        docs["Member"][name] = {
+            "name": name,
+            "member_name": f"Lid{index}",
+            "custom_achternaam": f"Achternaam{index}",
+            "membership_type": "Lid" if lid else "Donateur",
+            "custom_status": "Inactief" if ended else "Actief",
+            "custom_start_lidmaatschap": str(start) if lid else None,
+            "custom_einde_datum": str(start.replace(year=min(start.year + 3, 2025))) if ended else None,
+            "custom_startdatum_donateur": None if lid else str(start),
+            "custom_einddatum_donateur": None,
+            "custom_begin_datum": str(start),
+            "geboortedatum": str(birthday),
+            "discord_id": str(discord_id(index)),
+            "custom_contributies": [
+                {"jaar": year} for year in range(max(start.year, 2019), today.year + 1) if rng.random() < 0.8
+            ],
+            "creation": _timestamp(now - datetime.timedelta(days=members - index)),
+            "modified": _timestamp(now - datetime.timedelta(minutes=rng.randint(1, 100_000))),
+        }
+        ranking.append({"discord_id": str(discord_id(index)), "events": rng.choice([0, 0, 1, 2, 3, 4, 5, 6, 8, 10, 12, 15])})
+
+    event_count = max(1, members // 50)
+    for index in range(event_count):
+        name = f"EVT-{index:05d}"
+        docs["Beheer events"][name] = {
+            "name": name,
+            "event_name": f"Event {index}: {'Zomerkamp' if index % 2 else 'LAN party'} {2015 + index % 10}",
+            "creation": _timestamp(now - datetime.timedelta(days=event_count - index)),
+            "modified": _timestamp(now - datetime.timedelta(days=event_count - index)),
+        }
+    events = list(docs["Beheer events"].values())
+    for index in range(members * 2):
+        name = f"DLN-{index:07d}"
+        docs["Event deelnemers"][name] = {
+            "name": name,
+            "event": rng.choice(events)["event_name"],
+            "discord_id": str(discord_id(rng.randrange(members))),
+            "payment_status": rng.choice(["Completed", "Completed", "Pending", "Cancelled"]),
+            "pakket1": int(rng.random() < 0.2),
+            "aankomst": "vrijdag",
+            "vertrek": "zondag",
+            "dieetwensen_ideeën_voor_tussendoortjes_etc": "Vegetarisch" if rng.random() < 0.1 else None,
+            "ideeën_voor_het_event": None,
+            "opmerkingen": "Ik neem een tent mee" if rng.random() < 0.05 else None,
+            "creation": _timestamp(now - datetime.timedelta(minutes=members * 2 - index)),
+            "modified": _timestamp(now - datetime.timedelta(minutes=members * 2 - index)),
+        }
+
+    for index in range(max(1, members // 100)):
+        name = f"DEV-{index:05d}"
+        start = now + datetime.timedelta(days=rng.randint(-2, 30), hours=rng.randint(0, 23))
+        docs["Discord events"][name] = {
+            "name": name,
+            "title": f"Discord event {index}",
+            "description": "Gegenereerd voor de benchmark",
+            "concept": 0,
+            "status": None,
+            "start_time": start.strftime("%Y-%m-%d %H:%M:%S"),
+            "end_time": (start + datetime.timedelta(hours=2)).strftime("%Y-%m-%d %H:%M:%S"),
+            "date_create": (now + datetime.timedelta(days=rng.choice([-1, -1, -1, 3]))).strftime("%Y-%m-%d %H:%M:%S"),
+            "image": "/files/event.png" if rng.random() < 0.5 else None,
+            "location": "Shadowzone clubhuis",
+            "override_check": 1,
+            "creation": _timestamp(now),
+            "modified": _timestamp(now),
+        }
+    docs["Discord server banners"]["Banner vandaag"] = {
+        "name": "Banner vandaag",
+        "datum": str(today),
+        "banner": "/files/banner.png",
+        "eenmalig": 0,
+        "creation": _timestamp(now),
+        "modified": _timestamp(now),
+    }
+    return {"docs": docs, "ranking": ranking}
+
+
+def _compare(value: typing.Any, operator: str, expected: typing.Any) -> bool:
+    if operator in ("=", "=="):
+        return value == expected or (value is not None and str(value) == str(expected))
+    if operator == "!=":
+        return not _compare(value, "=", expected)
+    if operator == "in":
+        return value in expected or str(value) in map(str, expected)
+    if operator == "not in":
+        return not _compare(value, "in", expected)
+    if operator == "like":
+        return value is not None and str(expected).strip("%").lower() in str(value).lower()
+    if value is None:
+        return False
+    if isinstance(value, (int, float)) and not isinstance(expected, (int, float)):
+        expected = type(value)(expected)
+    return {">": value > expected, "<": value < expected, ">=": value >= expected, "<=": value <= expected}[operator]
+
+
+def _matches(doc: dict, filters: typing.Union[dict, list, None]) -> bool:
+    if not filters:
+        return True
+    if isinstance(filters, dict):
+        filters = [[field, "=", value] for field, value in filters.items()]
+    for condition in filters:
+        field, operator, value = condition[-3:]
+        if not _compare(doc.get(field), operator, value):
+            return False
+    return True
+
+
+class FakeFrappe:
+    """The fake Frappe site. Use `async with FakeFrappe(dataset) as frappe:` and point clients at `frappe.url`."""
+
+    def __init__(self, dataset: dict, *, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.dataset = dataset
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self._runner: typing.Optional[web.AppRunner] = None
+
+    @property
+    def docs(self) -> typing.Dict[str, typing.Dict[str, dict]]:
+        return self.dataset["docs"]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def __aenter__(self) -> "FakeFrappe":
+        app = web.Application(middlewares=[self._delay])
+        app.router.add_post("/api/method/login", self._login)
+        app.router.add_get("/api/method/frappe.client.get_value", self._get_value)
+        app.router.add_post("/api/method/frappe.client.delete", self._delete)
+        app.router.add_get("/api/method/event_ranking", self._event_ranking)
+        app.router.add_get("/api/resource/{doctype}", self._get_list)
+        app.router.add_get("/api/resource/{doctype}/{name}", self._get_doc)
+        app.router.add_put("/api/resource/{doctype}/{name}", self._update)
+        app.router.add_get("/files/{name}", self._file)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self._runner.cleanup()
+
+    @web.middleware
+    async def _delay(self, request: web.Request, handler) -> web.StreamResponse:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    def _touch(self, doc: dict) -> None:
+        doc["modified"] = _timestamp(datetime.datetime.now())
+
+    async def _login(self, request: web.Request) -> web.Response:
+        response = web.json_response({"message": "Logged In"})
+        response.set_cookie("sid", "benchmark")
+        return response
+
+    async def _get_list(self, request: web.Request) -> web.Response:
+        doctype = request.match_info["doctype"]
+        fields = json.loads(request.query.get("fields", '["name"]'))
+        filters = json.loads(request.query["filters"]) if "filters" in request.query else None
+        rows = [doc for doc in self.docs.get(doctype, {}).values() if _matches(doc, filters)]
+        order_by = request.query.get("order_by")
+        if order_by:
+            field, _, direction = order_by.partition(" ")
+            rows.sort(key=lambda doc: (doc.get(field) is None, doc.get(field) or ""), reverse=direction.strip().lower() == "desc")
+        start = int(request.query.get("limit_start", 0))
+        length = int(request.query.get("limit_page_length", 20))
+        rows = rows[start : start + length] if length else rows[start:]
+        return web.json_response({"data": self._project(doctype, rows, fields)})
+
+    def _project(self, doctype: str, rows: typing.List[dict], fields: typing.List[str]) -> typing.List[dict]:
+        """Select `fields`; `table.field as alias` joins a child table, one row per child like Frappe."""
+        plain = [field for field in fields if "." not in field]
+        joined = [field for field in fields if "." in field]
+        result = []
+        for doc in rows:
+            base = dict(doc) if "*" in plain else {field: doc.get(field) for field in plain}
+            if "*" in plain:
+                for table_field in CHILD_TABLES.get(doctype, {}):
+                    base.pop(table_field, None)
+            if not joined:
+                result.append(base)
+                continue
+            table_field = joined[0].split(".", 1)[0]
+            children = doc.get(table_field) or [{}]
+            for child in children:
+                row = dict(base)
+                for field in joined:
+                    column, _, alias = field.split(".", 1)[1].partition(" as ")
+                    row[alias.strip() or column] = child.get(column)
+                result.append(row)
+        return result
+
+    async def _get_doc(self, request: web.Request) -> web.Response:
+        doc = self.docs.get(request.match_info["doctype"], {}).get(request.match_info["name"])
+        if doc is None:
+            return web.json_response({"exc_type": "DoesNotExistError"}, status=404)
+        return web.json_response({"data": {"doctype": request.match_info["doctype"], **doc}})
+
+    async def _update(self, request: web.Request) -> web.Response:
+        doctype, name = request.match_info["doctype"], request.match_info["name"]
+        if name not in self.docs.get(doctype, {}):
+            return web.json_response({"exc_type": "DoesNotExistError"}, status=404)
+        form = await request.post()
+        doc = json.loads(form["data"])
+        doc.pop("doctype", None)
+        self.docs[doctype][name].update(doc)
+        self._touch(self.docs[doctype][name])
+        return web.json_response({"data": self.docs[doctype][name]})
+
+    async def _delete(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        self.docs.get(form["doctype"], {}).pop(form["name"], None)
+        return web.json_response({"message": None})
+
+    async def _get_value(self, request: web.Request) -> web.Response:
+        doctype = request.query["doctype"]
+        fieldname = request.query.get("fieldname", "name")
+        filters = json.loads(request.query["filters"]) if "filters" in request.query else None
+        for doc in self.docs.get(doctype, {}).values():
+            if _matches(doc, filters):
+                return web.json_response({"message": {fieldname: doc.get(fieldname)}})
+        return web.json_response({})
+
+    async def _event_ranking(self, request: web.Request) -> web.Response:
+        body = json.dumps({"result": self.dataset["ranking"]}).encode()
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(
+            body=body,
+            content_type="application/json",
+            headers={"ETag": etag, "Last-Modified": email.utils.formatdate(usegmt=True)},
+        )
+
+    async def _file(self, request: web.Request) -> web.Response:
+        return web.Response(body=PNG, content_type="image/png")
@@ -0,0 +1,200 @@
+"""
+Time the heavy Frappe and automatedevents code paths against a fake Frappe site and a fake guild.
+
+    python benchmarks/run.py --sizes 100 1000 10000 --repeat 3 --frappe-latency 0.02
+
+Needs the cogs' own requirements (Red-DiscordBot, aiohttp, pytz, python-dateutil); nothing
+leaves the machine. Per benchmark the median and best time are printed, together with the number
+of Frappe requests and Discord API calls a single run made.
+"""
+import argparse
+import asyncio
+import copy
+import datetime
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+import typing
+
+HERE = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(HERE.parent))
+
+from fake_discord import FakeBot, FakeConfig, FakeContext, FakeMenu, build_guild  # noqa: E402
+from fake_frappe import FakeFrappe, generate_dataset  # noqa: E402
+
+import FrappeIntegration.embeds as embeds_module  # noqa: E402
+import FrappeIntegration.frappe as frappe_module  # noqa: E402
+import szg_automatedevents.commands as automatedevents_module  # noqa: E402
+from FrappeIntegration.sync import DoctypeMirror  # noqa: E402
+
+
+class Harness:
+    """The fake site, guild, bot and the two cogs loaded against them."""
+
+    def __init__(self, frappe: FakeFrappe, dataset: dict, data_path: pathlib.Path, args: argparse.Namespace) -> None:
+        self.frappe = frappe
+        self.dataset = dataset
+        self.pristine = copy.deepcopy(dataset["docs"])
+        self.data_path = data_path
+        self.args = args
+        self.guild = build_guild(dataset, latency=args.discord_latency, seed=args.seed)
+        self.bot = FakeBot(
+            self.guild,
+            {
+                "frappelogin": {"url": frappe.url, "username": "benchmark", "password": "benchmark"},
+                "frappe": {"api_key": "benchmark", "api_secret": "benchmark"},
+            },
+        )
+        self.ctx = FakeContext(self.bot, self.guild)
+        self.frappe_cog = None
+        self.automatedevents = None
+        self._mirrors = 0
+
+    async def __aenter__(self) -> "Harness":
+        # Red's Config and data path need a running bot; the benchmark keeps both in memory or in a temp dir.
+        frappe_module.Config = FakeConfig
+        frappe_module.cog_data_path = lambda cog: self.data_path
+        embeds_module.SimpleMenu = FakeMenu
+
+        self.frappe_cog = frappe_module.Frappe(self.bot)
+        await self.frappe_cog.cog_load()
+        # automatedevents uses the client and cache of the Frappe cog
+        self.bot.cogs["Frappe"] = self.frappe_cog
+        self.automatedevents = automatedevents_module.automatedevents(self.bot)
+        await self.automatedevents.cog_load()
+        self.bot.cogs["automatedevents"] = self.automatedevents
+        return self
+
+    async def __aexit__(self, *args: typing.Any) -> None:
+        await self.automatedevents.cog_unload()
+        await self.frappe_cog.cog_unload()
+
+    def reset_guild(self) -> None:
+        self.guild = build_guild(self.dataset, latency=self.args.discord_latency, seed=self.args.seed)
+        self.bot.guild = self.ctx.guild = self.guild
+        self.frappe_cog.event_roles.invalidate()
+        self.frappe_cog.tiers.invalidate()
+
+    def reset_docs(self, *doctypes: str) -> None:
+        for doctype in doctypes:
+            self.dataset["docs"][doctype] = copy.deepcopy(self.pristine[doctype])
+
+    async def empty_mirror(self) -> None:
+        old = self.frappe_cog.mirror
+        await old.close()
+        self._mirrors += 1
+        self.frappe_cog.mirror = DoctypeMirror(
+            old.client, self.data_path / f"mirror-{self._mirrors}.sqlite3", old.specs.values()
+        )
+        await self.frappe_cog.mirror.open()
+
+
+Benchmark = typing.Tuple[
+    str,
+    typing.Callable[[Harness], typing.Awaitable[None]],
+    typing.Callable[[Harness], typing.Awaitable[typing.Any]],
+]
+
+
+async def _nothing(harness: Harness) -> None:
+    pass
+
+
+async def _invalidate_ranking(harness: Harness) -> None:
+    harness.frappe_cog.ranking_cache.invalidate()
+
+
+async def _fresh_guild(harness: Harness) -> None:
+    harness.frappe_cog.ranking_cache.invalidate()
+    harness.reset_guild()
+
+
+async def _fresh_discord_events(harness: Harness) -> None:
+    harness.reset_docs("Discord events")
+
+
+def _year() -> int:
+    return datetime.date.today().year
+
+
+BENCHMARKS: typing.List[Benchmark] = [
+    (
+        "contributie (lege mirror)",
+        lambda harness: harness.empty_mirror(),
+        lambda harness: harness.frappe_cog.contributie.callback(harness.frappe_cog, harness.ctx, _year()),
+    ),
+    (
+        "contributie",
+        _nothing,
+        lambda harness: harness.frappe_cog.contributie.callback(harness.frappe_cog, harness.ctx, _year()),
+    ),
+    (
+        "checksystem",
+        _invalidate_ranking,
+        lambda harness: harness.frappe_cog.checksystem.callback(harness.frappe_cog, harness.ctx),
+    ),
+    (
+        "roleupdate",
+        _invalidate_ranking,
+        lambda harness: harness.frappe_cog.roleupdate.callback(harness.frappe_cog, harness.ctx, False),
+    ),
+    (
+        "roleupdate toepassen",
+        _fresh_guild,
+        lambda harness: harness.frappe_cog.roleupdate.callback(harness.frappe_cog, harness.ctx, True),
+    ),
+    (
+        "_birthday",
+        _fresh_guild,
+        lambda harness: harness.automatedevents._birthday(harness.automatedevents._frappe()),
+    ),
+    (
+        "_serverevents",
+        _fresh_discord_events,
+        lambda harness: harness.automatedevents._serverevents(harness.automatedevents._frappe()),
+    ),
+]
+
+
+async def run_size(members: int, args: argparse.Namespace) -> typing.List[tuple]:
+    dataset = generate_dataset(members, seed=args.seed)
+    rows = []
+    with tempfile.TemporaryDirectory() as data_path:
+        async with FakeFrappe(dataset, latency=args.frappe_latency) as frappe:
+            async with Harness(frappe, dataset, pathlib.Path(data_path), args) as harness:
+                for name, setup, benchmark in BENCHMARKS:
+                    if args.only and name not in args.only:
+                        continue
+                    timings = []
+                    for _ in range(args.repeat):
+                        await setup(harness)
+                        requests, api_calls = frappe.requests, harness.guild.api_calls
+                        start = time.perf_counter()
+                        await benchmark(harness)
+                        timings.append(time.perf_counter() - start)
+                        requests, api_calls = frappe.requests - requests, harness.guild.api_calls - api_calls
+                    rows.append((members, name, statistics.median(timings), min(timings), requests, api_calls))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="aantallen leden")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--frappe-latency", type=float, default=0.0, help="seconden vertraging per Frappe request")
+    parser.add_argument("--discord-latency", type=float, default=0.0, help="seconden vertraging per Discord API call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="alleen deze benchmarks", choices=[name for name, _, _ in BENCHMARKS])
+    args = parser.parse_args()
+
+    print(f"{'leden':>7}  {'benchmark':<28}{'mediaan':>10}{'beste':>10}{'frappe':>8}{'discord':>9}")
+    for members in args.sizes:
+        for size, name, median, best, requests, api_calls in asyncio.run(run_size(members, args)):
+            print(f"{size:>7}  {name:<28}{median * 1000:>8.1f}ms{best * 1000:>8.1f}ms{requests:>8}{api_calls:>9}")
+
+
+if __name__ == "__main__":
+    main()
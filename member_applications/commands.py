@@ -1,4 +1,7 @@
+import contextlib
+import json
 import logging
+import types
 import discord
 from discord.ext import tasks
 from redbot.core import commands, Config
@@ -89,7 +92,7 @@ class memberapplications(commands.Cog):
                 )
                 
                 route = discord.http.Route("PATCH", f"/channels/{interaction.channel_id}/messages/{interaction.message.id}")
-                await self.bot.http.request(route, json={
+                await self._request(route, json={
                     "flags": 32768,  # IS_COMPONENTS_V2
                     "components": updated_components
                 })
@@ -123,7 +126,7 @@ class memberapplications(commands.Cog):
                     rejection_votes=votes_count
                 )
                 route = discord.http.Route("PATCH", f"/channels/{interaction.channel_id}/messages/{interaction.message.id}")
-                await self.bot.http.request(route, json={
+                await self._request(route, json={
                     "flags": 32768,  # IS_COMPONENTS_V2
                     "components": updated_components
                 })
@@ -141,7 +144,7 @@ class memberapplications(commands.Cog):
                         status_banner=f"❌ **Aanvraag definitief afgewezen door {voters_str} (3/3 stemmen).**"
                     )
                     route = discord.http.Route("PATCH", f"/channels/{interaction.channel_id}/messages/{interaction.message.id}")
-                    await self.bot.http.request(route, json={
+                    await self._request(route, json={
                         "flags": 32768,  # IS_COMPONENTS_V2
                         "components": updated_components
                     })
@@ -300,7 +303,7 @@ class memberapplications(commands.Cog):
             }
 
             route = discord.http.Route("POST", f"/channels/{forum_channel_id}/threads")
-            await self.bot.http.request(route, json=payload)
+            await self._request(route, json=payload)
             self.log.info(f"✅ Voorstel-thread in V2 Container succesvol aangemaakt voor user {user_id}")
         except Exception as e:
             self.log.exception(f"Fout bij het aanmaken van V2 forum-thread: {e}")
@@ -308,11 +311,25 @@ class memberapplications(commands.Cog):
     # ------------------------------------------------------------------
     # DISCORD REST API ENDPOINTS
     # ------------------------------------------------------------------
+    async def _request(self, route: discord.http.Route, **kwargs):
+        """bot.http.request, met duur, fouten en verstuurde bytes per route in [p]frappe metrics als de Frappe cog geladen is."""
+        with self._track(route) as call:
+            if "json" in kwargs:
+                call.bytes_out = len(json.dumps(kwargs["json"]))
+            # Het antwoord is al geparste JSON; opnieuw serialiseren alleen om bytes te tellen kost te veel, dus die blijven ongeteld
+            return await self.bot.http.request(route, **kwargs)
+
+    def _track(self, route: discord.http.Route):
+        frappe = self.bot.get_cog("Frappe")
+        if frappe is None:
+            return contextlib.nullcontext(types.SimpleNamespace())
+        return frappe.metrics_for(self).track("discord", frappe.route_key(route.method, route.path))
+
     async def fetch_join_requests(self, guild_id: int, limit: int = 25):
         """Haalt openstaande join requests op via het REST endpoint."""
         route = discord.http.Route("GET", f"/guilds/{guild_id}/requests?status=SUBMITTED&limit={limit}")
         try:
-            response = await self.bot.http.request(route)
+            response = await self._request(route)
             if isinstance(response, list):
                 return response
             elif isinstance(response, dict):
@@ -331,7 +348,7 @@ class memberapplications(commands.Cog):
         route = discord.http.Route("PATCH", f"/guilds/{guild_id}/requests/{user_id}")
         payload = {"action": action}
         try:
-            await self.bot.http.request(route, json=payload)
+            await self._request(route, json=payload)
             return True
         except discord.HTTPException as e:
             self.log.error(f"HTTP Fout bij bijwerken van join request voor user {user_id}: {e}")
@@ -425,7 +442,7 @@ class memberapplications(commands.Cog):
                 "flags": 32768,  # IS_COMPONENTS_V2
                 "components": v2_components
             }
-            await self.bot.http.request(route, json=payload)
+            await self._request(route, json=payload)
 
             # Sla op in de Redbot Config
             async with self.config.guild(guild).processed_requests() as proc_list:
@@ -1,3 +1,4 @@
+import asyncio
 import discord
 from discord.ext import tasks
 import logging
@@ -5,31 +6,26 @@ from redbot.core.bot import Red
 from redbot.core import commands
 import datetime
 from dateutil.relativedelta import relativedelta
-import aiohttp
-from frappeclient import FrappeClient
 import pytz
 
 class automatedevents(commands.Cog):
     def __init__(self, bot: Red) -> None:
         self.bot = bot
-        self.Frappeclient = None
         self.local_timezone = pytz.timezone('Europe/Amsterdam')
         self.target_guild_id = 331058477541621774
         self.log = logging.getLogger(__name__)
 
+        # Discord events met een date_create in de toekomst, gepland op naam
+        self._scheduled_events = {}
+        # Lopende runs die door zo'n planning gestart zijn
+        self._scheduled_runs = set()
+        self._serverevents_lock = asyncio.Lock()
+        self._serverevents_checked = False
+
         # Set local time for loop
         self.daily_loop_local_time = datetime.time(0, 0, 0, tzinfo=self.local_timezone)
 
     async def cog_load(self):
-        frappe_keys = await self.bot.get_shared_api_tokens("frappelogin")
-        api_key =  frappe_keys.get("username")
-        api_secret = frappe_keys.get("password")
-        if api_key and api_secret:
-            self.Frappeclient = FrappeClient("https://shadowzone.nl")
-            self.Frappeclient.login(api_key, api_secret)
-        else:
-            self.log.error("API keys for Frappe are missing.")
-        
         self.daily_loop.change_interval(time=self.daily_loop_local_time)
         self.daily_loop.start()
         self.hourly_loop.start()
@@ -37,14 +33,40 @@ class automatedevents(commands.Cog):
     async def cog_unload(self):
         self.daily_loop.cancel()
         self.hourly_loop.cancel()
+        for handle in self._scheduled_events.values():
+            handle.cancel()
+        for task in self._scheduled_runs:
+            task.cancel()
+
+    # De Frappe cog beheert de client, de cache en de metrics; zonder die cog wordt niets uit Frappe gehaald
+
+    def _frappe(self):
+        """De gedeelde client, cache en metrics; zonder Frappe cog of login een melding voor de gebruiker"""
+        frappe = self.bot.get_cog("Frappe")
+        if frappe is None:
+            raise commands.UserFeedbackCheckFailure("⚠️ De Frappe cog is niet geladen.")
+        return frappe.services(self)
+
+    async def _run_logged(self, what: str, job):
+        """Voer een taak buiten een commando uit; een Frappe fout wordt gelogd in plaats van de loop te stoppen"""
+        try:
+            frappe = self._frappe()
+        except commands.UserFeedbackCheckFailure as error:
+            self.log.error(f"{what} overgeslagen: {error.message}")
+            return
+        try:
+            await job(frappe)
+        except frappe.errors as error:
+            self.log.error(f"{what} mislukt: {error!r}")
 
     @tasks.loop()
     async def daily_loop(self):
         """
         This task will run daily at the specified time.
+        A Frappe error is logged instead of stopping the loop.
         """
-        await self._serverbanner()
-        await self._birthday()
+        await self._run_logged("Server banner bijwerken", self._serverbanner)
+        await self._run_logged("Verjaardagen bijwerken", self._birthday)
 
     @daily_loop.before_loop
     async def before_daily_loop(self):
@@ -55,19 +77,76 @@ class automatedevents(commands.Cog):
     async def hourly_loop(self):
         """
         This task will run every hour.
+        Skipped while the Frappe cog receives webhooks: changes are pushed and
+        future events are scheduled, so only the first run after loading is needed.
         """
-        await self._serverevents()
+        frappe = self.bot.get_cog("Frappe")
+        if self._serverevents_checked and frappe and frappe.webhook_running:
+            return
+        await self._run_logged("Server events aanmaken", self._serverevents)
 
     @hourly_loop.before_loop
     async def before_hourly_loop(self):
         await self.bot.wait_until_ready()
         self.log.info("Hourly loop is ready to start.")
 
+    async def cog_command_error(self, ctx: commands.Context, error: Exception):
+        frappe = self.bot.get_cog("Frappe")
+        if frappe is None and isinstance(getattr(error, "original", error), commands.UserFeedbackCheckFailure):
+            await ctx.send(error.original.message)
+        elif frappe is None or not await frappe.handle_command_error(ctx, error):
+            await self.bot.on_command_error(ctx, error, unhandled_by_cog=True)
+
+    @commands.Cog.listener()
+    async def on_frappe_doc_event(self, doctype: str, event: str, doc: dict):
+        """Voer wijzigingen uit Frappe direct uit in plaats van bij de volgende loop"""
+        if event in ("on_trash", "after_delete"):
+            if doctype == 'Discord events' and doc['name'] in self._scheduled_events:
+                self._scheduled_events.pop(doc['name']).cancel()
+            return
+        today = datetime.datetime.now(self.local_timezone).date()
+        if doctype == 'Discord events' and doc.get('concept') == 0:
+            await self._run_logged("Server events aanmaken", self._serverevents)
+        elif doctype == 'Discord server banners' and doc.get('datum') == str(today):
+            await self._run_logged("Server banner bijwerken", self._serverbanner)
+        elif doctype == 'Member' and doc.get('discord_id'):
+            if not str(doc['discord_id']).isdigit():
+                self.log.warning(f"Member {doc.get('name')!r} heeft een ongeldig discord_id: {doc['discord_id']!r}")
+                return
+            guild = self.bot.get_guild(self.target_guild_id)
+            discordmember = guild.get_member(int(doc['discord_id'])) if guild else None
+            has_role = discordmember is not None and discordmember.get_role(943779141688381470) is not None
+            is_birthday = bool(doc.get('geboortedatum')) and doc['geboortedatum'][5:] == today.strftime('%m-%d')
+            if has_role != (is_birthday and doc.get('custom_status') == 'Actief'):
+                await self._run_logged("Verjaardagen bijwerken", self._birthday)
+
+    def _schedule_serverevents(self, event: dict):
+        """Plan een run van _serverevents op de date_create van `event`"""
+        delay = (datetime.datetime.strptime(event['date_create'], '%Y-%m-%d %H:%M:%S') - datetime.datetime.now()).total_seconds()
+        if event['name'] in self._scheduled_events:
+            self._scheduled_events[event['name']].cancel()
+
+        def run():
+            self._scheduled_events.pop(event['name'], None)
+            task = asyncio.create_task(self._run_logged("Geplande server events aanmaken", self._serverevents))
+            self._scheduled_runs.add(task)
+            task.add_done_callback(self._scheduled_runs.discard)
+
+        self._scheduled_events[event['name']] = asyncio.get_running_loop().call_later(max(delay, 0) + 1, run)
+
+    async def _set_event_status(self, frappe, event: dict, status: str):
+        # Alleen schrijven als de status verandert, anders leidt de update via de webhook tot een nieuwe ronde
+        if event.get('status') == status:
+            return
+        doc_to_update = await frappe.client.get_doc('Discord events', event['name'])
+        doc_to_update['status'] = status
+        await frappe.client.update(doc_to_update)
+
     @commands.command(aliases=["banner"])
     @commands.is_owner()
     async def serverbanner(self, ctx: commands.Context):
         """Update server banner based on database"""
-        await self._serverbanner(ctx)
+        await self._serverbanner(self._frappe())
         await ctx.send("Update completed")
     
     @commands.command(aliases=["bd"])
@@ -78,72 +157,82 @@ class automatedevents(commands.Cog):
         Adds role to members whose birthday is today and removes role
         from members who have the role but their birthday is not today.
         """
-        await self._birthday(ctx)
+        await self._birthday(self._frappe())
         await ctx.send("Update completed")
 
     @commands.command()
     @commands.has_permissions(manage_channels=True)
     async def serverevents(self, ctx: commands.Context):
         """Add server events based on database"""
-        await self._serverevents(ctx)
+        await self._serverevents(self._frappe())
         await ctx.send("Update completed")
 
-    async def _serverbanner(self, ctx: commands.Context = None):
+    async def _download(self, frappe, url: str, modified: str) -> bytes:
+        """Download een bestand uit Frappe, of neem het uit de cache als het document sindsdien niet gewijzigd is"""
+        if frappe.cache is not None:
+            entry = await frappe.cache.get(('file', url))
+            if entry is not None and entry.validator == modified:
+                return entry.value
+        data = await frappe.client.get_file(url)
+        if frappe.cache is not None:
+            await frappe.cache.put(('file', url), data, modified)
+        return data
+
+    async def _serverbanner(self, frappe):
         """Update server banner based on database"""
-        if not self.Frappeclient:
-            self.log.error("FrappeClient is not available. Cannot update banner.")
-            return
-        response = self.Frappeclient.get_list('Discord server banners', fields = ['*'], filters = {'datum':str(datetime.datetime.now(self.local_timezone).date())}, limit_page_length=float('inf'))
+        response = await frappe.client.get_list('Discord server banners', fields = ['*'], filters = {'datum':str(datetime.datetime.now(self.local_timezone).date())}, limit_page_length=1)
         if response:
-            banner_url = "http://shadowzone.nl/" + response[0]['banner']
+            banner_url = response[0]['banner']
             guild = self.bot.get_guild(self.target_guild_id)
-            async with aiohttp.ClientSession() as session:
-                async with session.get(banner_url) as resp:
-                    if resp.status == 200:
-                        image_data = await resp.read()
-                        await guild.edit(
-                            banner=image_data,
-                            reason=f"De server banner is veranderd naar: {response[0]['name']}",
-                        )
-                        if response[0]['eenmalig'] == 1:
-                            self.Frappeclient.delete('Discord server banners', response[0]['name'])
-                        else:
-                            doc = self.Frappeclient.get_doc('Discord server banners', response[0]['name'])
-                            date = datetime.datetime.strptime(doc['datum'], '%Y-%m-%d').date()
-                            newDate = date + relativedelta(years=1)
-                            doc['datum'] = str(newDate)
-                            self.Frappeclient.update(doc)
-                    else:
-                        self.log.error(f"Failed to download banner image from {banner_url}. Status: {resp.status}")
+            try:
+                image_data = await self._download(frappe, banner_url, response[0]['modified'])
+            except frappe.CircuitOpenError:
+                raise
+            except frappe.FrappeError as error:
+                self.log.error(f"Failed to download banner image from {banner_url}. Status: {error.status}")
+                return
+            with frappe.metrics.track("discord", "PATCH /guilds/{id}") as call:
+                call.bytes_out = len(image_data)
+                await guild.edit(
+                    banner=image_data,
+                    reason=f"De server banner is veranderd naar: {response[0]['name']}",
+                )
+            if response[0]['eenmalig'] == 1:
+                await frappe.client.delete('Discord server banners', response[0]['name'])
+            else:
+                doc = await frappe.client.get_doc('Discord server banners', response[0]['name'])
+                date = datetime.datetime.strptime(doc['datum'], '%Y-%m-%d').date()
+                newDate = date + relativedelta(years=1)
+                doc['datum'] = str(newDate)
+                await frappe.client.update(doc)
     
-    async def _birthday(self, ctx: commands.Context = None):
+    async def _birthday(self, frappe):
         """
         Updates birthday roles based on Frappe data.
         Adds role to members whose birthday is today and removes role
         from members who have the role but their birthday is not today.
         """
-        frappe_members = self.Frappeclient.get_list('Member', fields=['discord_id', 'geboortedatum', 'custom_status'], filters={'custom_status': 'Actief'}, limit_page_length=float('inf'))
+        frappe_members = frappe.client.iter_list('Member', fields=['discord_id', 'geboortedatum'], filters={'custom_status': 'Actief'})
         guild = self.bot.get_guild(self.target_guild_id)
         role = guild.get_role(943779141688381470)
         today = datetime.datetime.now(self.local_timezone).date()
 
         # Build a set of Discord IDs for members whose birthday is today according to Frappe
         today_birthdays_discord_ids = set()
-        if frappe_members:
-            for member_data in frappe_members:
-                # Ensure 'geboortedatum' and 'discord_id' exist and are not None
-                if member_data.get('geboortedatum') and member_data.get('discord_id'):
+        async for member_data in frappe_members:
+            # Ensure 'geboortedatum' and 'discord_id' exist and are not None
+            if member_data.get('geboortedatum') and str(member_data.get('discord_id') or '').isdigit():
 
-                    geboortedatum = datetime.datetime.strptime(member_data['geboortedatum'], '%Y-%m-%d').date()
+                geboortedatum = datetime.datetime.strptime(member_data['geboortedatum'], '%Y-%m-%d').date()
 
-                    if geboortedatum.day == today.day and geboortedatum.month == today.month:
-                        # Add the discord_id (as a string) to the set
-                        today_birthdays_discord_ids.add(member_data['discord_id'])
+                if geboortedatum.day == today.day and geboortedatum.month == today.month:
+                    # Add the discord_id (as a string) to the set
+                    today_birthdays_discord_ids.add(member_data['discord_id'])
 
-                        # Get the discord.Member object and add the role
-                        discordmember = guild.get_member(int(member_data['discord_id']))
-                        if discordmember and role not in discordmember.roles:
-                            await discordmember.add_roles(role, reason="Vandaag jarig")
+                    # Get the discord.Member object and add the role
+                    discordmember = guild.get_member(int(member_data['discord_id']))
+                    if discordmember and role not in discordmember.roles:
+                        await discordmember.add_roles(role, reason="Vandaag jarig")
 
         # Remove the role if their ID is NOT in the set of today's birthdays
         for birthdaymember in role.members:
@@ -151,66 +240,69 @@ class automatedevents(commands.Cog):
             if str(birthdaymember.id) not in today_birthdays_discord_ids:
                 await birthdaymember.remove_roles(role, reason="Verjaardag voorbij")
 
-    async def _serverevents(self, ctx: commands.Context = None):
+    async def _serverevents(self, frappe):
         """Maak server events gepland via de database"""
-        response = self.Frappeclient.get_list('Discord events', fields = ['*'], filters = {'concept': 0}, limit_page_length=float('inf'))
-        if response:
-            guild = self.bot.get_guild(self.target_guild_id)
-            image_data = None
-            for event in response:
-                if event['end_time'] and datetime.datetime.strptime(event['start_time'], '%Y-%m-%d %H:%M:%S') >= datetime.datetime.strptime(event['end_time'], '%Y-%m-%d %H:%M:%S'):
-                    self.log.error(f"[{event['title']}] Starttijd moet voor eindtijd zijn")
-                    doc_to_update = self.Frappeclient.get_doc('Discord events', event['name'])
-                    doc_to_update['status'] = 'Starttijd moet voor eindtijd zijn'
-                    self.Frappeclient.update(doc_to_update)
-                    continue
-                start_time_local = self.local_timezone.localize(datetime.datetime.strptime(event['start_time'], '%Y-%m-%d %H:%M:%S'))
-                if start_time_local <= datetime.datetime.now(self.local_timezone):
-                    doc_to_update = self.Frappeclient.get_doc('Discord events', event['name'])
-                    doc_to_update['status'] = 'Starttijd moet in de toekomst zijn'
-                    self.Frappeclient.update(doc_to_update)
-                    self.log.error(f"[{event['title']}] Starttijd van nieuwe events kan niet in het verleden liggen")
-                    continue
+        # Loop, webhook en geplande runs mogen niet tegelijk hetzelfde event aanmaken
+        async with self._serverevents_lock:
+            await self._create_serverevents(frappe)
+            self._serverevents_checked = True
+
+    async def _create_serverevents(self, frappe):
+        guild = self.bot.get_guild(self.target_guild_id)
+        image_data = None
+        # Verwerkte events worden verwijderd; iter_list pagineert op naam zodat er niets overgeslagen wordt
+        async for event in frappe.client.iter_list('Discord events', fields = ['*'], filters = {'concept': 0}):
+            if event['end_time'] and datetime.datetime.strptime(event['start_time'], '%Y-%m-%d %H:%M:%S') >= datetime.datetime.strptime(event['end_time'], '%Y-%m-%d %H:%M:%S'):
+                self.log.error(f"[{event['title']}] Starttijd moet voor eindtijd zijn")
+                await self._set_event_status(frappe, event, 'Starttijd moet voor eindtijd zijn')
+                continue
+            start_time_local = self.local_timezone.localize(datetime.datetime.strptime(event['start_time'], '%Y-%m-%d %H:%M:%S'))
+            if start_time_local <= datetime.datetime.now(self.local_timezone):
+                await self._set_event_status(frappe, event, 'Starttijd moet in de toekomst zijn')
+                self.log.error(f"[{event['title']}] Starttijd van nieuwe events kan niet in het verleden liggen")
+                continue
+            
+            if datetime.datetime.strptime(event['date_create'], '%Y-%m-%d %H:%M:%S') <= datetime.datetime.now():
+                event_args = {
+                "name": event['title'],
+                "description": event['description'],
+                "start_time": self.local_timezone.localize(datetime.datetime.strptime(event['start_time'], "%Y-%m-%d %H:%M:%S")).astimezone(datetime.timezone.utc),
+                "end_time": self.local_timezone.localize(datetime.datetime.strptime(event['end_time'], "%Y-%m-%d %H:%M:%S")).astimezone(datetime.timezone.utc) if event['end_time'] else None,
+                "privacy_level": discord.PrivacyLevel.guild_only,
+                }
                 
-                if datetime.datetime.strptime(event['date_create'], '%Y-%m-%d %H:%M:%S') <= datetime.datetime.now():
-                    event_args = {
-                    "name": event['title'],
-                    "description": event['description'],
-                    "start_time": self.local_timezone.localize(datetime.datetime.strptime(event['start_time'], "%Y-%m-%d %H:%M:%S")).astimezone(datetime.timezone.utc),
-                    "end_time": self.local_timezone.localize(datetime.datetime.strptime(event['end_time'], "%Y-%m-%d %H:%M:%S")).astimezone(datetime.timezone.utc) if event['end_time'] else None,
-                    "privacy_level": discord.PrivacyLevel.guild_only,
-                    }
-                    
-                    if event['image']:
-                        image = "http://shadowzone.nl/" + event['image']
-                        async with aiohttp.ClientSession() as session:
-                            async with session.get(image) as resp:
-                                if resp.status == 200:
-                                    image_data = await resp.read()
-                                    event_args["image"] = image_data
-                                else:
-                                    self.log.error(f"[{event['title']}] Kan afbeelding niet downloaden")
-                                    doc_to_update = self.Frappeclient.get_doc('Discord events', event['name'])
-                                    doc_to_update['status'] = 'Kan afbeelding niet downloaden'
-                                    self.Frappeclient.update(doc_to_update)
-                                    continue
-
-                    if 'location' in event and event['location']:
-                        try:
-                            int(event['location'])
-                            if guild.get_channel(int(event['location'])):
-                                event_args["channel"] = guild.get_channel(int(event['location']))
-                            else:
-                                event_args["entity_type"] = discord.EntityType.external
-                                event_args["location"] = event['location']
-                        except ValueError:
+                if event['image']:
+                    try:
+                        image_data = await self._download(frappe, event['image'], event['modified'])
+                        event_args["image"] = image_data
+                    except frappe.CircuitOpenError:
+                        # Frappe is onbereikbaar: niet het event de schuld geven, de volgende run probeert het opnieuw
+                        raise
+                    except frappe.FrappeError:
+                        self.log.error(f"[{event['title']}] Kan afbeelding niet downloaden")
+                        await self._set_event_status(frappe, event, 'Kan afbeelding niet downloaden')
+                        continue
+
+                if 'location' in event and event['location']:
+                    try:
+                        int(event['location'])
+                        if guild.get_channel(int(event['location'])):
+                            event_args["channel"] = guild.get_channel(int(event['location']))
+                        else:
                             event_args["entity_type"] = discord.EntityType.external
                             event_args["location"] = event['location']
+                    except ValueError:
+                        event_args["entity_type"] = discord.EntityType.external
+                        event_args["location"] = event['location']
 
-                    if 'entity_type' in event_args and event_args["entity_type"] == discord.EntityType.external:
-                        if not event_args["end_time"] and event['override_check'] == 1: 
-                            event_args["end_time"] = event_args["start_time"] + datetime.timedelta(hours=1)
-                            self.log.error(f"[{event['title']}] Moet een eindtijd hebben, is automatisch gezet op 1 uur later")
+                if 'entity_type' in event_args and event_args["entity_type"] == discord.EntityType.external:
+                    if not event_args["end_time"] and event['override_check'] == 1: 
+                        event_args["end_time"] = event_args["start_time"] + datetime.timedelta(hours=1)
+                        self.log.error(f"[{event['title']}] Moet een eindtijd hebben, is automatisch gezet op 1 uur later")
 
+                with frappe.metrics.track("discord", "POST /guilds/{id}/scheduled-events") as call:
+                    call.bytes_out = len(event_args.get("image") or b"")
                     await guild.create_scheduled_event(**event_args)
-                    self.Frappeclient.delete('Discord events', event['name'])
\ No newline at end of file
+                await frappe.client.delete('Discord events', event['name'])
+            else:
+                self._schedule_serverevents(event)
\ No newline at end of file
@@ -0,0 +1,61 @@
+import asyncio
+
+from FrappeIntegration.cache import ResponseCache
+from FrappeIntegration.persistent_cache import PersistentCache
+
+
+def test_responses_survive_a_restart_and_invalidate_only_their_namespace(tmp_path):
+    calls = []
+
+    async def fetch(etag, last_modified):
+        calls.append(last_modified)
+        return {"rows": len(calls)}, None, "2024-01-01"
+
+    async def run():
+        store = PersistentCache(tmp_path / "cache.sqlite3")
+        await store.open()
+        ranking = ResponseCache(store=store)
+        cards = ResponseCache(store=store, namespace="usercard")
+        assert await ranking.get("ranking", fetch) == {"rows": 1}
+        assert await cards.get("card", fetch) == {"rows": 2}
+
+        # A new cache on the same store serves the stored response without fetching.
+        assert await ResponseCache(store=store, namespace="usercard").get("card", fetch) == {"rows": 2}
+
+        ranking.invalidate()
+        await asyncio.sleep(0.05)
+        ranking_left = await store.get(ranking._store_key("ranking"))
+        card_left = await store.get(cards._store_key("card"))
+        await store.close()
+        return ranking_left, card_left
+
+    ranking_left, card_left = asyncio.run(run())
+    assert calls == [None, None]
+    assert ranking_left is None
+    assert card_left is not None and card_left.value == {"rows": 2}
+
+
+def test_stale_value_is_served_while_one_refresh_runs():
+    calls = []
+
+    async def fetch(etag, last_modified):
+        calls.append(last_modified)
+        await asyncio.sleep(0.01)
+        return None, None, last_modified
+
+    async def run():
+        cache = ResponseCache()
+        assert await cache.get("key", lambda etag, last_modified: _value(7)) == 7
+        cache._entries["key"].last_modified = "v1"
+        cache._entries["key"].fetched_at -= 120
+        results = await asyncio.gather(*(cache.get("key", fetch, ttl=60) for _ in range(3)))
+        await asyncio.sleep(0.05)
+        return results, cache._entries["key"].age
+
+    async def _value(value):
+        return value, None, None
+
+    results, age = asyncio.run(run())
+    assert results == [7, 7, 7]
+    assert calls == ["v1"]
+    assert age < 60
@@ -0,0 +1,53 @@
+import pytest
+
+from FrappeIntegration import frappe_api
+from FrappeIntegration.frappe_api import CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(frappe_api.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_the_threshold_and_fails_fast(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+        breaker.check()
+    breaker.record_failure()
+    assert breaker.is_open
+
+    clock[0] += 10
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.check()
+    assert error.value.retry_in == pytest.approx(20)
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_lets_one_probe_through_per_window(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+
+    clock[0] += 30
+    breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    breaker.record_failure()
+    clock[0] += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    clock[0] += 1
+    breaker.check()
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.check()
@@ -0,0 +1,54 @@
+from FrappeIntegration.embeds import EmbedPages, join_within
+
+
+def _descriptions(pages):
+    return [embed.description for embed in pages.build()]
+
+
+def test_lines_are_kept_whole_across_pages():
+    pages = EmbedPages("Test", limit=20)
+    pages.extend(["a" * 8, "b" * 8, "c" * 8])
+    assert _descriptions(pages) == ["a" * 8 + "\n" + "b" * 8, "c" * 8]
+
+
+def test_leading_blank_lines_are_dropped_on_a_new_page():
+    pages = EmbedPages("Test", limit=10)
+    pages.add_line("a" * 8)
+    pages.add_line("\nb")
+    assert _descriptions(pages) == ["a" * 8, "b"]
+
+
+def test_a_line_longer_than_a_page_is_split():
+    pages = EmbedPages("Test", limit=10)
+    pages.add_line("x" * 25)
+    assert _descriptions(pages) == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_footer_numbers_only_when_there_are_several_pages():
+    single = EmbedPages("Test", footer="voet")
+    single.add_line("regel")
+    assert [embed.footer.text for embed in single.build()] == ["voet"]
+
+    several = EmbedPages("Test", footer="voet", limit=5)
+    several.extend(["regel", "regel"])
+    assert [embed.footer.text for embed in several.build()] == ["voet • 1/2", "voet • 2/2"]
+
+
+def test_join_within_breaks_only_between_items():
+    mentions = [f"<@{member_id}>" for member_id in range(100000, 100040)]
+    chunks = list(join_within(mentions, limit=50))
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks).split(" ") == mentions
+
+
+def test_long_mention_lists_never_cut_a_mention():
+    pages = EmbedPages("Test")
+    pages.add_line("Wel rol, niet in database: ")
+    pages.extend(join_within(f"<@{member_id}>" for member_id in range(10**17, 10**17 + 400)))
+    descriptions = _descriptions(pages)
+    assert len(descriptions) > 1
+    for description in descriptions:
+        assert len(description) <= 4096
+        for line in description.split("\n"):
+            if line.startswith("<@"):
+                assert all(mention.startswith("<@") and mention.endswith(">") for mention in line.split(" "))
@@ -0,0 +1,48 @@
+from FrappeIntegration.event_index import EventNameIndex
+
+
+def _row(name, event_name, creation):
+    return {"name": name, "event_name": event_name, "creation": creation}
+
+
+def test_shared_event_name_survives_removal_of_one_doc():
+    index = EventNameIndex()
+    index.load([
+        _row("EVT-1", "Event 13: Winter", "2024-01-01"),
+        _row("EVT-2", "Event 13: Winter", "2024-02-01"),
+    ])
+    assert index.all_names() == ["Event 13: Winter"]
+
+    index.load([_row("EVT-2", "Event 13: Winter", "2024-02-01")])
+    assert index.search("win") == ["Event 13: Winter"]
+    assert index.resolve("event 13: winter") == "Event 13: Winter"
+
+    index.load([])
+    assert index.search("win") == []
+    assert index.resolve("Event 13: Winter") is None
+
+
+def test_shared_event_name_survives_rename_of_one_doc():
+    index = EventNameIndex()
+    index.load([
+        _row("EVT-1", "Event 13: Winter", "2024-01-01"),
+        _row("EVT-2", "Event 13: Winter", "2024-02-01"),
+    ])
+    index.load([
+        _row("EVT-1", "Event 14: Zomer", "2024-01-01"),
+        _row("EVT-2", "Event 13: Winter", "2024-02-01"),
+    ])
+    assert index.search("win") == ["Event 13: Winter"]
+    assert index.search("zom") == ["Event 14: Zomer"]
+    assert index.all_names() == ["Event 13: Winter", "Event 14: Zomer"]
+
+
+def test_long_event_name_gets_a_short_key_that_resolves():
+    long_name = "Event 15: " + "heel lang " * 12
+    index = EventNameIndex()
+    index.load([_row("EVT-1", long_name, "2024-01-01"), _row("EVT-2", "Event 16", "2024-02-01")])
+
+    assert index.short_key("Event 16") == "Event 16"
+    assert index.short_key(long_name) == "EVT-1"
+    assert index.resolve("EVT-1") == long_name
+    assert index.short_key(long_name, limit=3) is None
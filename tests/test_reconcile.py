@@ -0,0 +1,37 @@
+from FrappeIntegration.reconcile import index_ranking, reconcile_event_roles
+
+
+def _row(discord_id, events):
+    return {"discord_id": discord_id, "events": events}
+
+
+def test_index_ranking_skips_rows_without_a_valid_id():
+    ranking = [_row("1", 3), _row(None, 2), _row("abc", 1), {"events": 4}, _row(5, 0)]
+    assert index_ranking(ranking) == {1: 3, 5: 0}
+
+
+def test_reconcile_sorts_members_into_the_right_buckets():
+    ranking = [_row("1", 3), _row("2", 2), _row("3", 1), _row("4", 5), _row("6", 0)]
+    role_members = {3: [1], 1: [2, 7], 5: None}
+    diff = reconcile_event_roles(ranking, role_members, lambda member_id: member_id != 4)
+
+    assert diff.correct == [(1, 3)]
+    assert diff.wrong_count == [(2, 1, 2)]
+    assert diff.missing == [(3, 1)]
+    assert diff.surplus == [7]
+    assert diff.not_in_server == [4]
+    assert diff.missing_roles == [5]
+    assert not diff.in_sync
+
+
+def test_member_with_two_roles_is_only_surplus_once():
+    diff = reconcile_event_roles([], {2: [9], 1: [9]}, lambda member_id: True)
+    assert diff.surplus == [9]
+
+
+def test_in_sync_ignores_missing_roles_and_absent_members():
+    ranking = [_row("1", 2), _row("2", 1)]
+    diff = reconcile_event_roles(ranking, {2: [1], 1: None}, lambda member_id: member_id == 1)
+    assert diff.correct == [(1, 2)]
+    assert diff.not_in_server == [2]
+    assert diff.in_sync
@@ -0,0 +1,71 @@
+import asyncio
+
+from FrappeIntegration.roles import RoleChange, apply_role_changes, event_role_name, parse_event_role
+
+
+class _Role:
+    def __init__(self, role_id, name):
+        self.id = role_id
+        self.name = name
+
+    def is_default(self):
+        return self.id == 0
+
+
+class _Member:
+    def __init__(self, member_id, roles):
+        self.id = member_id
+        self.roles = [_Role(0, "@everyone")] + roles
+        self.calls = []
+
+    async def add_roles(self, *roles, reason=None):
+        self.calls.append("add")
+        self.roles += [role for role in roles if role not in self.roles]
+
+    async def remove_roles(self, *roles, reason=None):
+        self.calls.append("remove")
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def edit(self, *, roles, reason=None):
+        self.calls.append("edit")
+        self.roles = [self.roles[0]] + list(roles)
+
+
+def test_event_role_names_round_trip():
+    assert event_role_name(1) == "1 event"
+    assert event_role_name(12) == "12 events"
+    assert parse_event_role("12 events") == 12
+    assert parse_event_role(" 1 event ") == 1
+    assert parse_event_role("Events") is None
+
+
+def test_apply_role_changes_swaps_event_roles_and_keeps_the_others():
+    one, two, other = _Role(1, "1 event"), _Role(2, "2 events"), _Role(3, "Lid")
+    promoted = _Member(10, [one, other])
+    added = _Member(11, [other])
+    changes = [RoleChange(promoted, add=two, remove=[one]), RoleChange(added, add=one)]
+    progress = []
+
+    async def report(done, total):
+        progress.append((done, total))
+
+    result = asyncio.run(apply_role_changes(changes, progress=report))
+
+    assert result.applied == changes and not result.failed
+    assert [role.id for role in promoted.roles] == [0, 3, 2]
+    assert [role.id for role in added.roles] == [0, 3, 1]
+    assert added.calls == ["add"]
+    assert progress[-1] == (2, 2)
+
+
+def test_apply_role_changes_keeps_roles_added_after_planning():
+    one, two, boost = _Role(1, "1 event"), _Role(2, "2 events"), _Role(4, "Booster")
+    member = _Member(10, [one])
+    change = RoleChange(member, add=two, remove=[one])
+    # Granted elsewhere between planning and applying
+    member.roles.append(boost)
+
+    asyncio.run(apply_role_changes([change]))
+
+    assert [role.id for role in member.roles] == [0, 4, 2]
+    assert "edit" not in member.calls
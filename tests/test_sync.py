@@ -0,0 +1,95 @@
+import asyncio
+
+from FrappeIntegration.sync import DoctypeMirror, MirrorSpec
+
+
+def _doc(name, modified, **fields):
+    return {"name": name, "modified": modified, **fields}
+
+
+class _Client:
+    """Serves `docs` like Frappe does: filtered on `modified`, with the child rows per parent."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.filters = []
+
+    def _matching(self, filters):
+        self.filters.append(filters)
+        if not filters:
+            return list(self.docs)
+        (_, operator, watermark), = filters
+        assert operator == ">="
+        return [doc for doc in self.docs if doc["modified"] >= watermark]
+
+    async def iter_list(self, doctype, fields, filters=None, page_length=None):
+        for doc in self._matching(filters):
+            yield {field: doc.get(field) for field in fields}
+
+    async def get_child_rows(self, doctype, table_field, columns, filters=None):
+        return {
+            doc["name"]: [{column: child.get(column) for column in columns} for child in doc.get(table_field, [])]
+            for doc in self._matching(filters)
+        }
+
+
+def _mirror(tmp_path, client):
+    spec = MirrorSpec("Member", ["discord_id"], {"custom_contributies": ["jaar"]})
+    return DoctypeMirror(client, tmp_path / "mirror.sqlite3", [spec])
+
+
+def test_sync_pulls_only_rows_from_the_watermark_on(tmp_path):
+    client = _Client([
+        _doc("M-1", "2024-01-01 10:00:00", discord_id="1", custom_contributies=[{"jaar": 2023}]),
+        _doc("M-2", "2024-01-02 10:00:00", discord_id="2"),
+    ])
+    mirror = _mirror(tmp_path, client)
+
+    async def run():
+        await mirror.open()
+        try:
+            assert await mirror.sync() == {"Member": 2}
+            client.docs.append(_doc("M-3", "2024-01-02 10:00:00", discord_id="3"))
+            client.docs[0] = _doc("M-1", "2024-01-03 09:00:00", discord_id="1", custom_contributies=[{"jaar": 2024}])
+            assert await mirror.sync() == {"Member": 3}
+            return await mirror.rows("Member", order_by="discord_id"), await mirror.children("Member", "custom_contributies")
+        finally:
+            await mirror.close()
+
+    rows, children = asyncio.run(run())
+    assert client.filters[-1] == [["modified", ">=", "2024-01-02 10:00:00"]]
+    assert [row["discord_id"] for row in rows] == ["1", "2", "3"]
+    assert children == {"M-1": [{"jaar": 2024}], "M-2": [], "M-3": []}
+
+
+def test_upsert_never_replaces_a_newer_version(tmp_path):
+    mirror = _mirror(tmp_path, _Client([]))
+
+    async def run():
+        await mirror.open()
+        try:
+            await mirror.upsert("Member", _doc("M-1", "2024-01-02 10:00:00", discord_id="new"))
+            await mirror.upsert("Member", _doc("M-1", "2024-01-01 10:00:00", discord_id="old"))
+            return await mirror.rows("Member")
+        finally:
+            await mirror.close()
+
+    rows = asyncio.run(run())
+    assert [row["discord_id"] for row in rows] == ["new"]
+
+
+def test_upsert_skips_a_document_without_modified(tmp_path):
+    mirror = _mirror(tmp_path, _Client([]))
+
+    async def run():
+        await mirror.open()
+        try:
+            await mirror.upsert("Member", _doc("M-1", "2024-01-01 10:00:00", discord_id="1"))
+            await mirror.upsert("Member", _doc("M-1", None, discord_id="2"))
+            await mirror.upsert("Member", {"name": "M-2", "discord_id": "3"})
+            return await mirror.rows("Member")
+        finally:
+            await mirror.close()
+
+    rows = asyncio.run(run())
+    assert [row["discord_id"] for row in rows] == ["1"]
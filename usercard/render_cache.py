@@ -0,0 +1,51 @@
+import collections
+import typing
+
+
+class RenderCache:
+    """
+    LRU cache of encoded images, bounded by the total number of bytes.
+
+    Keys describe everything a render depends on, so an entry never has to be invalidated: a
+    changed avatar, name or Frappe document gives a new key, and the old entry ages out.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_bytes: int = max_bytes
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: typing.OrderedDict[typing.Hashable, bytes] = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: typing.Hashable) -> typing.Optional[bytes]:
+        data = self._entries.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def put(self, key: typing.Hashable, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def discard(self, predicate: typing.Callable[[typing.Hashable], bool]) -> None:
+        """Drop every entry whose key matches `predicate`, e.g. all cards of one user."""
+        for key in [key for key in self._entries if predicate(key)]:
+            self.size -= len(self._entries.pop(key))
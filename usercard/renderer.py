@@ -0,0 +1,415 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import functools
+import io
+import logging
+import multiprocessing
+import os
+import pathlib
+import threading
+import time
+import typing
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+log = logging.getLogger(__name__)
+
+# The directory holding this cog, so a spawned worker process can import it.
+_COG_PARENT = pathlib.Path(__file__).resolve().parent.parent
+
+MODES = ("thread", "process")
+
+
+@dataclasses.dataclass(frozen=True)
+class Encoder:
+    """
+    How a card is saved. `png` uses zlib level `compress_level`, and with `optimize` Pillow searches
+    for the smallest output (slow, it implies level 9). `webp` is lossy with `quality`, or lossless,
+    where `quality` is the effort: 0 is fastest.
+    """
+
+    format: str = "png"
+    compress_level: int = 9
+    optimize: bool = True
+    quality: int = 80
+    lossless: bool = False
+
+    @classmethod
+    def from_config(cls, data: typing.Mapping[str, typing.Any]) -> "Encoder":
+        names = {field.name for field in dataclasses.fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+    def to_config(self) -> typing.Dict[str, typing.Any]:
+        return dataclasses.asdict(self)
+
+    @property
+    def extension(self) -> str:
+        return self.format
+
+    @property
+    def label(self) -> str:
+        if self.format == "png":
+            return f"png {self.compress_level}" + (" optimize" if self.optimize else "")
+        return f"webp {'lossless' if self.lossless else 'lossy'} q{self.quality}"
+
+    def save(self, img: Image.Image, buffer: io.BytesIO) -> None:
+        if self.format == "png":
+            img.save(buffer, format="png", compress_level=self.compress_level, optimize=self.optimize)
+        else:
+            img.save(buffer, format="webp", quality=self.quality, lossless=self.lossless)
+
+
+class RenderResult(typing.NamedTuple):
+    data: bytes
+    draw_seconds: float
+    encode_seconds: float
+
+
+@dataclasses.dataclass
+class CardJob:
+    """Everything needed to draw one usercard, as plain data so it can be sent to another process."""
+
+    size: typing.Tuple[int, int]
+    avatar: bytes
+    name: str
+    # The subtitle is placed after the width of `name_measure` and only drawn if it fits.
+    name_measure: typing.Optional[str]
+    subtitle: typing.Optional[str]
+    subtitle_measure: typing.Optional[str]
+    role: str
+    created_at: str
+    joined_at: str
+    member_since: str
+    involved_since: str
+    events: int
+    latest_event: str
+    encoder: Encoder = Encoder()
+
+
+class CardRenderer:
+    """
+    Draws usercards. Fonts and icons are loaded once; the static part of a card is built once per
+    canvas size and every render draws only the member's fields on a copy of it.
+    """
+
+    def __init__(self, data_path: pathlib.Path) -> None:
+        self.font: typing.Dict[int, ImageFont.ImageFont] = {
+            size: ImageFont.truetype(str(data_path / "arial.ttf"), size=size) for size in {28, 30, 36, 40, 54}
+        }
+        self.bold_font: typing.Dict[int, ImageFont.ImageFont] = {
+            size: ImageFont.truetype(str(data_path / "arial_bold.ttf"), size=size) for size in {30, 36, 40, 50, 60}
+        }
+        self.icons: typing.Dict[str, Image.Image] = {}
+        for name in ("logo", "person", "game", "background"):
+            try:
+                with Image.open(data_path / f"{name}.png") as image:
+                    self.icons[name] = image.copy()
+            except OSError as error:
+                log.warning(f"Icoon {name} kon niet geladen worden: {error}")
+        self._templates: typing.Dict[typing.Tuple[int, int], Image.Image] = {}
+        self._templates_lock: threading.Lock = threading.Lock()
+
+    def align_text_center(
+        self,
+        draw: ImageDraw.Draw,
+        xy: typing.Tuple[int, int, int, int],
+        text: str,
+        fill: typing.Optional[typing.Tuple[int, int, int, typing.Optional[int]]],
+        font: ImageFont.ImageFont,
+    ) -> typing.Tuple[int, int]:
+        x1, y1, x2, y2 = xy
+        text_size = font.getbbox(text)
+        x = int((x2 - x1 - text_size[2]) / 2)
+        x = max(x, 0)
+        y = int((y2 - y1 - text_size[3]) / 2)
+        y = max(y, 0)
+        if font in self.bold_font.values():
+            y -= 5
+        draw.text((x1 + x, y1 + y), text=text, fill=fill, font=font)
+        return text_size
+
+    def _template(self, size: typing.Tuple[int, int]) -> Image.Image:
+        """The static base of a card: background, panels, labels, icons and logo. Draw on a copy."""
+        with self._templates_lock:
+            template = self._templates.get(size)
+            if template is None:
+                template = self._templates[size] = self._build_template(size)
+            return template
+
+    def _build_background(self, size: typing.Tuple[int, int]) -> Image.Image:
+        img: Image.Image = Image.new("RGBA", size, (0, 0, 0, 0))
+        if "background" in self.icons:
+            image = self.icons["background"].convert("RGBA").resize(size)
+
+            # Create a mask for rounded corners (radius 50)
+            mask = Image.new("L", size, 0)
+            d = ImageDraw.Draw(mask)
+            d.rounded_rectangle((0, 0, size[0], size[1]), radius=50, fill=255)
+
+            # Paste the background image using the mask
+            img.paste(image, (0, 0), mask=mask)
+        else:
+            # Fallback to dark gray if background.png is missing or fails
+            draw_bg = ImageDraw.Draw(img)
+            draw_bg.rounded_rectangle(
+                (0, 0, img.width, img.height),
+                radius=50,
+                fill=(32, 34, 37),
+            )
+        return img
+
+    def _build_template(self, size: typing.Tuple[int, int]) -> Image.Image:
+        img: Image.Image = self._build_background(size)
+        draw: ImageDraw.ImageDraw = ImageDraw.Draw(img)
+        align_text_center = functools.partial(self.align_text_center, draw)
+
+        # Guild name & Guild icon.
+        image = self.icons["logo"].resize((55, 55))
+        img.paste(image, (30, 30, 85, 85), mask=image.split()[3])
+        draw.text(
+            (105, 30),
+            text='Shadowzone Gaming',
+            fill=(163, 163, 163),
+            font=self.font[54],
+        )
+
+        # `created_on`
+        draw.rounded_rectangle((1200, 75, 1545, 175), radius=15, fill=(47, 49, 54))
+        draw.rounded_rectangle((1220, 30, 1476, 90), radius=15, fill=(79, 84, 92))
+        align_text_center(
+            (1220, 30, 1476, 90),
+            text="Op Discord",
+            fill=(255, 255, 255),
+            font=self.bold_font[30],
+        )
+        # `joined_on`
+        draw.rounded_rectangle((1200 + 365, 75, 1545 + 365, 175), radius=15, fill=(47, 49, 54))
+        draw.rounded_rectangle((1220 + 365, 30, 1476 + 365, 90), radius=15, fill=(79, 84, 92))
+        align_text_center(
+            (1220 + 365, 30, 1476 + 365, 90),
+            text="In server",
+            fill=(255, 255, 255),
+            font=self.bold_font[30],
+        )
+
+        # Lidmaatschap
+        draw.rounded_rectangle((1306 - 125, 204, 1912, 585), radius=15, fill=(47, 49, 54))
+        align_text_center(
+            (1325 - 125, 214, 1325 - 125, 284),
+            text="Lidmaatschap",
+            fill=(255, 255, 255),
+            font=self.bold_font[40],
+        )
+        image = self.icons["person"].resize((70, 70))
+        img.paste(image, (1822, 214, 1892, 284), mask=image.split()[3])
+        draw.rounded_rectangle((1325 - 125, 301, 1892, 418), radius=15, fill=(32, 34, 37))
+        draw.rounded_rectangle((1325 - 125, 301, 1588 - 125, 418), radius=15, fill=(24, 26, 27))
+        align_text_center(
+            (1326 - 125, 301, 1601 - 125, 418),
+            text="Lid",
+            fill=(255, 255, 255),
+            font=self.bold_font[36],
+        )
+        draw.rounded_rectangle((1325 - 125, 448, 1892, 565), radius=15, fill=(32, 34, 37))
+        draw.rounded_rectangle((1325 - 125, 448, 1601 - 125, 565), radius=15, fill=(24, 26, 27))
+        align_text_center(
+            (1325 - 125, 448, 1601 - 125, 565),
+            text="Betrokken",
+            fill=(255, 255, 255),
+            font=self.bold_font[30],
+        )
+
+        # Events
+        draw.rounded_rectangle((1306 - 125, 615, 1912, 996), radius=15, fill=(47, 49, 54))
+        align_text_center(
+            (1326 - 125, 625, 1326 - 125, 695),
+            text="Events",
+            fill=(255, 255, 255),
+            font=self.bold_font[40],
+        )
+        image = self.icons["game"].resize((70, 70))
+        img.paste(image, (1822, 625, 1892, 695), mask=image.split()[3])
+        draw.rounded_rectangle((1326 - 125, 712, 1892, 829), radius=15, fill=(32, 34, 37))
+        draw.rounded_rectangle((1326 - 125, 712, 1601 - 125, 829), radius=15, fill=(24, 26, 27))
+        align_text_center(
+            (1326 - 125, 712, 1601 - 125, 829), text="Totaal", fill=(255, 255, 255), font=self.bold_font[36]
+        )
+        draw.rounded_rectangle((1326 - 125, 859, 1892, 976), radius=15, fill=(32, 34, 37))
+        draw.rounded_rectangle((1326 - 125, 859, 1601 - 125, 976), radius=15, fill=(24, 26, 27))
+        align_text_center(
+            (1326 - 125, 859, 1601 - 125, 976),
+            text="Laatste",
+            fill=(255, 255, 255),
+            font=self.bold_font[36],
+        )
+        return img
+
+    def draw(self, job: CardJob) -> Image.Image:
+        img: Image.Image = self._template(job.size).copy()
+        draw: ImageDraw.ImageDraw = ImageDraw.Draw(img)
+        align_text_center = functools.partial(self.align_text_center, draw)
+
+        # Member name & Member avatar.
+        image = Image.open(io.BytesIO(job.avatar))
+        image = image.resize((140, 140))
+        mask = Image.new("L", image.size, 0)
+        d = ImageDraw.Draw(mask)
+        d.rounded_rectangle(
+            (0, 0, image.width, image.height),
+            radius=20,
+            fill=255,
+        )
+        try:
+            img.paste(image, (30, 478, 170, 618), mask=ImageChops.multiply(mask, image.split()[3]))
+        except IndexError:
+            img.paste(image, (30, 478, 170, 618), mask=mask)
+        draw.text((190, 478), text=job.name, fill=(255, 255, 255), font=self.bold_font[50])
+        if job.subtitle is not None:
+            name_size = self.bold_font[50].getbbox(job.name_measure)
+            if name_size[2] + 25 + self.font[40].getbbox(job.subtitle_measure)[2] <= 1000:
+                draw.text(
+                    (190 + name_size[2] + 25, 496),
+                    text=job.subtitle,
+                    fill=(163, 163, 163),
+                    font=self.font[40],
+                )
+
+        # Rol
+        draw.text((190, 553), text=job.role, fill=(163, 163, 163), font=self.font[54])
+
+        # `created_on` & `joined_on`
+        align_text_center((1200, 75, 1545, 175), text=job.created_at, fill=(255, 255, 255), font=self.font[36])
+        align_text_center(
+            (1200 + 365, 75, 1545 + 365, 175), text=job.joined_at, fill=(255, 255, 255), font=self.font[36]
+        )
+
+        # Lidmaatschap
+        align_text_center((1601 - 125, 301, 1892, 418), text=job.member_since, fill=(255, 255, 255), font=self.font[36])
+        align_text_center(
+            (1601 - 125, 448, 1892, 565), text=job.involved_since, fill=(255, 255, 255), font=self.font[36]
+        )
+
+        # Events
+        align_text_center((1601 - 125, 712, 1892, 829), text=str(job.events), fill=(255, 255, 255), font=self.font[36])
+        align_text_center((1601 - 125, 859, 1892, 976), text=job.latest_event, fill=(255, 255, 255), font=self.font[36])
+        return img
+
+    def render(self, job: CardJob) -> RenderResult:
+        start = time.perf_counter()
+        img = self.draw(job)
+        drawn = time.perf_counter()
+        buffer = io.BytesIO()
+        job.encoder.save(img, buffer)
+        return RenderResult(buffer.getvalue(), drawn - start, time.perf_counter() - drawn)
+
+
+# One renderer per process and data path, created by the first job that needs it.
+_renderers: typing.Dict[str, CardRenderer] = {}
+_renderers_lock = threading.Lock()
+
+
+def _renderer(data_path: str) -> CardRenderer:
+    with _renderers_lock:
+        renderer = _renderers.get(data_path)
+        if renderer is None:
+            renderer = _renderers[data_path] = CardRenderer(pathlib.Path(data_path))
+        return renderer
+
+
+def _warm_up(data_path: str, sizes: typing.Tuple[typing.Tuple[int, int], ...] = ()) -> None:
+    """Load fonts and icons, and build the templates of `sizes`, before the first job."""
+    renderer = _renderer(data_path)
+    for size in sizes:
+        renderer._template(size)
+
+
+def _process_initializer(data_path: str, sizes: typing.Tuple[typing.Tuple[int, int], ...]) -> typing.Tuple[typing.Callable, tuple]:
+    """
+    Initializer and arguments for a spawned worker: put the cog's parent directory on the path,
+    import this module and warm up its renderer. The initializer is unpickled before this module
+    can be imported in the worker, so it has to be a builtin; hence `exec` on a small script.
+    """
+    script = (
+        f"import site\n"
+        f"site.addsitedir({str(_COG_PARENT)!r})\n"
+        f"import {__name__} as renderer\n"
+        f"renderer._warm_up({data_path!r}, {sizes!r})\n"
+    )
+    return exec, (script, {})
+
+
+def _render(data_path: str, job: CardJob) -> RenderResult:
+    return _renderer(data_path).render(job)
+
+
+class RenderExecutor:
+    """
+    Runs render jobs off the event loop.
+
+    `thread` renders in a thread pool of the bot process, sharing one renderer. `process` renders
+    in a pool of worker processes, each loading fonts and icons once, so concurrent cards use more
+    than one core instead of contending for the GIL. Jobs and results are plain data: the result
+    holds the encoded bytes and the time spent drawing and encoding.
+    """
+
+    def __init__(
+        self,
+        data_path: pathlib.Path,
+        mode: str = "thread",
+        workers: typing.Optional[int] = None,
+        sizes: typing.Iterable[typing.Tuple[int, int]] = (),
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Onbekende render modus: {mode}")
+        self.data_path: str = str(data_path)
+        self.mode: str = mode
+        self.workers: int = workers or min(4, os.cpu_count() or 1)
+        # Card sizes whose template is built when the pool starts.
+        self.sizes: typing.Tuple[typing.Tuple[int, int], ...] = tuple(sizes)
+        self._executor: typing.Optional[concurrent.futures.Executor] = None
+
+    def start(self) -> None:
+        if self.mode == "process":
+            # Spawned workers start clean instead of forking the bot with its threads. Each one
+            # preloads in its initializer, so every process is warm whichever jobs it picks up.
+            initializer, initargs = _process_initializer(self.data_path, self.sizes)
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initializer,
+                initargs=initargs,
+            )
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="usercard-render"
+            )
+            # The threads share one renderer, one warm-up covers them all.
+            self._executor.submit(_warm_up, self.data_path, self.sizes)
+
+    async def render(self, job: CardJob) -> RenderResult:
+        if self._executor is None:
+            self.start()
+        executor = self._executor
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, _render, self.data_path, job)
+        except concurrent.futures.BrokenExecutor:
+            # Every job of a broken pool fails at once: only the first to notice restarts it,
+            # the others retry on that new pool. After `close` nothing is restarted.
+            if self._executor is executor:
+                # A worker died (out of memory, killed); start a fresh pool and try once more.
+                log.warning("Render proces gestopt, de pool wordt opnieuw gestart.")
+                self.close()
+                self.start()
+            elif self._executor is None:
+                raise
+            return await loop.run_in_executor(self._executor, _render, self.data_path, job)
+
+    def close(self) -> None:
+        """Stop taking jobs; queued renders still finish, the pool shuts down in the background."""
+        if self._executor is not None:
+            threading.Thread(
+                target=self._executor.shutdown, kwargs={"wait": True}, name="usercard-render-shutdown", daemon=True
+            ).start()
+            self._executor = None
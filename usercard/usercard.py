@@ -1,31 +1,53 @@
 from AAA3A_utils import Cog  # isort:skip
-from redbot.core import commands  # isort:skip
+from redbot.core import Config, commands  # isort:skip
 from redbot.core.bot import Red  # isort:skip
 import discord  # isort:skip
 import typing  # isort:skip
 
-import asyncio
 import functools
 import io
+import math
 from pathlib import Path
 from datetime import datetime
 
 from fontTools.ttLib import TTFont
-from PIL import Image, ImageChops, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont
 from redbot.core.data_manager import bundled_data_path
-from frappeclient import FrappeClient
 
+from .render_cache import RenderCache
+from .renderer import CardJob, Encoder, RenderExecutor
 from .view import usercardView, WrappedView
 
 
 class usercard(Cog):
     """A cog to generate images"""
 
+    # Afmetingen van een kaart; de renderer bouwt het sjabloon hiervoor al bij het starten
+    CARD_SIZE: typing.Tuple[int, int] = (1942, 1096)
+
+    # De velden van een Member die op de kaart komen; alleen deze worden bewaard
+    MEMBER_FIELDS: typing.Tuple[str, ...] = (
+        "modified",
+        "membership_type",
+        "custom_status",
+        "custom_start_lidmaatschap",
+        "custom_begin_datum",
+    )
+
     def __init__(self, bot: Red) -> None:
         super().__init__(bot=bot)
-        self.Frappeclient = None
-        self.api_key = None
-        self.api_secret = None
+        self.render_cache: RenderCache = RenderCache()
+        self.renderer: typing.Optional[RenderExecutor] = None  # Gestart in cog_load, met de instellingen uit de config
+
+        self.config: Config = Config.get_conf(self, identifier=331058477541621774, force_registration=True)
+        self.config.register_global(
+            render_mode="thread",  # "thread": in de bot zelf, "process": aparte processen over alle cores
+            render_workers=0,  # 0: automatisch
+            encoder=Encoder().to_config(),  # Zie `Encoder`
+        )
+        self.config.register_guild(
+            encoder=None,  # Eigen encoder voor deze server, None: de globale
+        )
 
         self.font_path: Path = bundled_data_path(self) / "arial.ttf"
         self.bold_font_path: Path = bundled_data_path(self) / "arial_bold.ttf"
@@ -37,7 +59,13 @@ class usercard(Cog):
             size: ImageFont.truetype(str(self.bold_font_path), size=size)
             for size in {30, 36, 40, 50, 60}
         }
-        self.font_to_remove_unprintable_characters: TTFont = TTFont(self.font_path)
+        # Codepoints the font can draw, read once; names are checked against this set.
+        with TTFont(self.font_path) as font:
+            self.covered_codepoints: typing.FrozenSet[int] = frozenset(font.getBestCmap())
+        # sanitize_display_name(name) -> (text without undrawable characters, share of drawable characters)
+        self.sanitize_display_name: typing.Callable[[str], typing.Tuple[str, float]] = functools.lru_cache(maxsize=4096)(
+            self._sanitize_display_name
+        )
         self.icons: typing.Dict[str, Path] = {
             name: (bundled_data_path(self) / f"{name}.png")
             for name in (
@@ -50,442 +78,180 @@ class usercard(Cog):
 
     async def cog_load(self):
         await super().cog_load()
-        frappe_keys = await self.bot.get_shared_api_tokens("frappelogin")
-        self.api_key = frappe_keys.get("username")
-        self.api_secret = frappe_keys.get("password")
-        
-        if self.api_key and self.api_secret:
-            self.Frappeclient = FrappeClient("https://shadowzone.nl")
-            self.Frappeclient.login(self.api_key, self.api_secret)
-        else:
-            print("API keys for Frappe are missing.")
+        self.renderer = RenderExecutor(
+            bundled_data_path(self),
+            await self.config.render_mode(),
+            await self.config.render_workers() or None,
+            sizes=[self.CARD_SIZE],
+        )
+        self.renderer.start()
 
     async def cog_unload(self) -> None:
-        self.font_to_remove_unprintable_characters.close()
+        if self.renderer is not None:
+            self.renderer.close()
         await super().cog_unload() 
 
-    def get_frappe_member_data(self, discord_id):
-        """Haalt member data op en logt automatisch opnieuw in als de sessie verlopen is."""
-        if not self.Frappeclient:
-            return None
+    # De Frappe cog beheert de client, de cache en de metrics; zonder die cog zijn er geen kaarten
+
+    def _frappe(self):
+        """De gedeelde client, cache en metrics; zonder Frappe cog of login een melding voor de gebruiker"""
+        frappe = self.bot.get_cog("Frappe")
+        if frappe is None:
+            raise commands.UserFeedbackCheckFailure("⚠️ De Frappe cog is niet geladen.")
+        return frappe.services(self)
+
+    async def red_delete_data_for_user(self, *, requester, user_id: int) -> None:
+        frappe = self.bot.get_cog("Frappe")
+        # Ook zonder API keys: de cache staat los van de login
+        if frappe is not None:
+            frappe.responses_for(self).invalidate(('Member', str(user_id)))
+        self.render_cache.discard(lambda key: key[0] == user_id)
+
+    @classmethod
+    def card_fields(cls, doc: dict) -> dict:
+        """Alleen wat de kaart van een Member document gebruikt"""
+        fields = {field: doc.get(field) for field in cls.MEMBER_FIELDS}
+        fields["custom_events"] = [{"event_bezocht": item.get("event_bezocht")} for item in doc.get("custom_events") or []]
+        return fields
+
+    async def get_frappe_member_data(self, frappe, discord_id):
+        """
+        Haalt member data op. De client logt automatisch opnieuw in als de sessie verlopen is.
+        De velden voor de kaart staan op schijf: ook na een herstart komen ze direct uit de cache, en
+        zijn ze ouder dan een minuut dan controleert de achtergrond via `modified` of ze nog kloppen.
+        """
+        async def fetch(etag, modified):
+            docs = await frappe.client.get_list('Member', fields=['name', 'modified'], filters={'discord_id': str(discord_id)}, limit_page_length=1)
+            if not docs:
+                return {}, None, None
+            if docs[0]['modified'] == modified:
+                return None, None, modified
+            return self.card_fields(await frappe.client.get_doc("Member", docs[0]['name'])), None, docs[0]['modified']
 
         try:
-            docs = self.Frappeclient.get_list('Member', fields=['name'], filters={'discord_id': str(discord_id)})
-            if docs:
-                return self.Frappeclient.get_doc("Member", docs[0]['name'])
-        except Exception as e:
-            print(f"[UserCard] Fout bij ophalen data: {e}. Probeer opnieuw in te loggen...")
-            try:
-                if self.api_key and self.api_secret:
-                    self.Frappeclient.login(self.api_key, self.api_secret)
-                    docs = self.Frappeclient.get_list('Member', fields=['name'], filters={'discord_id': str(discord_id)})
-                    if docs:
-                        return self.Frappeclient.get_doc("Member", docs[0]['name'])
-            except Exception as e2:
-                print(f"[UserCard] Herstel mislukt: {e2}")
+            return await frappe.responses.get(('Member', str(discord_id)), fetch, ttl=60, stale_ttl=math.inf) or None
+        except frappe.errors as e:
+            print(f"[UserCard] Fout bij ophalen data: {e}")
         
         return None
 
-    def align_text_center(
-        self,
-        draw: ImageDraw.Draw,
-        xy: typing.Tuple[int, int, int, int],
-        text: str,
-        fill: typing.Optional[typing.Tuple[int, int, int, typing.Optional[int]]],
-        font: ImageFont.ImageFont,
-    ) -> typing.Tuple[int, int]:
-        x1, y1, x2, y2 = xy
-        text_size = font.getbbox(text)
-        x = int((x2 - x1 - text_size[2]) / 2)
-        x = max(x, 0)
-        y = int((y2 - y1 - text_size[3]) / 2)
-        y = max(y, 0)
-        if font in self.bold_font.values():
-            y -= 5
-        draw.text((x1 + x, y1 + y), text=text, fill=fill, font=font)
-        return text_size
+    def _sanitize_display_name(self, name: str) -> typing.Tuple[str, float]:
+        covered = self.covered_codepoints
+        in_font = sum(1 for char in name if ord(char) in covered)
+        text = "".join(char for char in name if char.isascii() and ord(char) in covered).strip().strip("-|_").strip()
+        return text, (in_font / len(name) if name else 0.0)
 
     def remove_unprintable_characters(self, text: str) -> str:
-        return (
-            "".join(
-                [
-                    char
-                    for char in text
-                    if ord(char) in self.font_to_remove_unprintable_characters.getBestCmap()
-                    and char.isascii()
-                ]
-            )
-            .strip()
-            .strip("-|_")
-            .strip()
-        )
+        return self.sanitize_display_name(text)[0]
+
+    def _is_printable(self, text: str) -> bool:
+        """Of de naam grotendeels met het lettertype getekend kan worden en daarna nog lang genoeg is."""
+        sanitized, ratio = self.sanitize_display_name(text)
+        return ratio > 0.8 and len(sanitized) >= 5
 
     def get_member_display(self, member: discord.Member) -> str:
+        if self._is_printable(member.display_name):
+            return self.remove_unprintable_characters(member.display_name)
+        if member.global_name is not None and self._is_printable(member.global_name):
+            return self.remove_unprintable_characters(member.global_name)
+        return member.name
+
+    @staticmethod
+    def render_key(_object: discord.Member, member: dict, encoder: Encoder) -> tuple:
+        """Alles waar de kaart van afhangt; verandert een van deze waarden, dan wordt opnieuw getekend."""
         return (
-            self.remove_unprintable_characters(member.display_name)
-            if (
-                sum(
-                    (
-                        1
-                        if ord(char) in self.font_to_remove_unprintable_characters.getBestCmap()
-                        else 0
-                    )
-                    for char in member.display_name
-                )
-                / len(member.display_name)
-                > 0.8
-            )
-            and len(self.remove_unprintable_characters(member.display_name)) >= 5
-            else (
-                self.remove_unprintable_characters(member.global_name)
-                if member.global_name is not None
-                and (
-                    sum(
-                        (
-                            1
-                            if ord(char)
-                            in self.font_to_remove_unprintable_characters.getBestCmap()
-                            else 0
-                        )
-                        for char in member.global_name
-                    )
-                    / len(member.global_name)
-                    > 0.8
-                )
-                and len(self.remove_unprintable_characters(member.global_name)) >= 5
-                else member.name
-            )
+            _object.id,
+            _object.display_avatar.key,
+            _object.display_name,
+            _object.global_name,
+            _object.name,
+            _object.joined_at,
+            member.get("modified"),
+            encoder,
         )
 
-    def _generate_prefix_image(
-        self,
-        _object: discord.Member,
-        size: typing.Tuple[int, int],
-        to_file: bool,
-        _object_display: typing.Optional[bytes],
-    ) -> typing.Union[Image.Image, discord.File]:
-        img: Image.Image = Image.new("RGBA", size, (0, 0, 0, 0))
-        try:
-            # Open the background image from the icons dictionary
-            image = Image.open(self.icons["background"])
-            image = image.convert("RGBA").resize(size)
-            
-            # Create a mask for rounded corners (radius 50)
-            mask = Image.new("L", size, 0)
-            d = ImageDraw.Draw(mask)
-            d.rounded_rectangle((0, 0, size[0], size[1]), radius=50, fill=255)
-            
-            # Paste the background image using the mask
-            img.paste(image, (0, 0), mask=mask)
-        except Exception as e:
-            # Fallback to dark gray if background.png is missing or fails
-            print(f"Failed to load background: {e}")
-            draw_bg = ImageDraw.Draw(img)
-            draw_bg.rounded_rectangle(
-                (0, 0, img.width, img.height),
-                radius=50,
-                fill=(32, 34, 37),
-            )
-
-        # Initialize the draw object for the text that follows
-        draw: ImageDraw.ImageDraw = ImageDraw.Draw(img)
-        align_text_center = functools.partial(self.align_text_center, draw)
-
-        member = self.get_frappe_member_data(_object.id)
-        
-        if member:
-            # Member name & Member avatar.
-            image = Image.open(io.BytesIO(_object_display))
-            image = image.resize((140, 140))
-            mask = Image.new("L", image.size, 0)
-            d = ImageDraw.Draw(mask)
-            d.rounded_rectangle(
-                (0, 0, image.width, image.height),
-                radius=20,
-                fill=255,
-            )
-            try:
-                img.paste(
-                    image, (30, 478, 170, 618), mask=ImageChops.multiply(mask, image.split()[3])
-                )
-            except IndexError:
-                img.paste(image, (30, 478, 170, 618), mask=mask)
-            if (
-                sum(
-                    (
-                        1
-                        if ord(char) in self.font_to_remove_unprintable_characters.getBestCmap()
-                        else 0
-                    )
-                    for char in _object.display_name
-                )
-                / len(_object.display_name)
-                > 0.8
-            ) and len(self.remove_unprintable_characters(_object.display_name)) >= 5:
-                draw.text(
-                    (190, 478),
-                    text=self.remove_unprintable_characters(_object.display_name),
-                    fill=(255, 255, 255),
-                    font=self.bold_font[50],
-                )
-                display_name_size = self.bold_font[50].getbbox(_object.display_name)
-                if (
-                    display_name_size[2]
-                    + 25
-                    + self.font[40].getbbox(_object.global_name or _object.name)[2]
-                ) <= 1000:
-                    draw.text(
-                        (190 + display_name_size[2] + 25, 496),
-                        text=(
-                            self.remove_unprintable_characters(_object.global_name)
-                            if _object.global_name is not None
-                            else _object.name
-                        ),
-                        fill=(163, 163, 163),
-                        font=self.font[40],
-                    )
-            elif (
-                _object.global_name is not None
-                and (
-                    sum(
-                        (
-                            1
-                            if ord(char)
-                            in self.font_to_remove_unprintable_characters.getBestCmap()
-                            else 0
-                        )
-                        for char in _object.global_name
-                    )
-                    / len(_object.global_name)
-                    > 0.8
-                )
-                and len(self.remove_unprintable_characters(_object.global_name)) >= 5
-            ):
-                draw.text(
-                    (190, 478),
-                    text=self.remove_unprintable_characters(_object.global_name),
-                    fill=(255, 255, 255),
-                    font=self.bold_font[50],
-                )
-            else:
-                draw.text(
-                    (190, 478), text=_object.name, fill=(255, 255, 255), font=self.bold_font[50]
-                )
-
-            # Rol
-            draw.text(
-                (190, 553),
-                text=f"{member.get('membership_type') if member.get('custom_status') == 'Actief' else ''}",
-                fill=(163, 163, 163),
-                font=self.font[54],
-            )
-
-            # Guild name & Guild icon.
-            image = Image.open(self.icons["logo"])
-            image = image.resize((55, 55))
-            img.paste(image, (30, 30, 85, 85), mask=image.split()[3])
-            draw.text(
-                (105, 30),
-                text='Shadowzone Gaming',
-                fill=(163, 163, 163),
-                font=self.font[54],
+    async def get_encoder(self, guild: typing.Optional[discord.Guild]) -> Encoder:
+        """De encoder van de server, of anders de globale."""
+        data = await self.config.guild(guild).encoder() if guild is not None else None
+        return Encoder.from_config(data or await self.config.encoder())
+
+    def _card_job(
+        self, _object: discord.Member, member: dict, avatar: bytes, size: typing.Tuple[int, int], encoder: Encoder
+    ) -> CardJob:
+        """Zet alles wat op de kaart komt om naar platte data voor de renderer."""
+        if self._is_printable(_object.display_name):
+            name = self.remove_unprintable_characters(_object.display_name)
+            name_measure = _object.display_name
+            subtitle = (
+                self.remove_unprintable_characters(_object.global_name)
+                if _object.global_name is not None
+                else _object.name
             )
-
-            # `created_on`
-            draw.rounded_rectangle((1200, 75, 1545, 175), radius=15, fill=(47, 49, 54))
-            align_text_center(
-                (1200, 75, 1545, 175),
-                text=_object.created_at.strftime("%d %B %Y"),
-                fill=(255, 255, 255),
-                font=self.font[36],
-            )
-            draw.rounded_rectangle((1220, 30, 1476, 90), radius=15, fill=(79, 84, 92))
-            align_text_center(
-                (1220, 30, 1476, 90),
-                text="Op Discord",
-                fill=(255, 255, 255),
-                font=self.bold_font[30],
-            )
-            # `joined_on`
-            draw.rounded_rectangle((1200 + 365, 75, 1545 + 365, 175), radius=15, fill=(47, 49, 54))
-            align_text_center(
-                (1200 + 365, 75, 1545 + 365, 175),
-                text=_object.joined_at.strftime("%d %B %Y"),
-                fill=(255, 255, 255),
-                font=self.font[36],
-            )
-            draw.rounded_rectangle((1220 + 365, 30, 1476 + 365, 90), radius=15, fill=(79, 84, 92))
-            align_text_center(
-                (1220 + 365, 30, 1476 + 365, 90),
-                text="In server",
-                fill=(255, 255, 255),
-                font=self.bold_font[30],
-            )
-
-        if not to_file:
-            return img
-        buffer = io.BytesIO()
-        img.save(buffer, format="png", optimize=True)
-        buffer.seek(0)
-        return discord.File(buffer, filename="image.png")
-
-    async def generate_prefix_image(
-        self,
-        _object: discord.Member,
-        size: typing.Tuple[int, int] = (1942, 1026),
-        to_file: bool = True,
-    ) -> typing.Union[Image.Image, discord.File]:
-        if isinstance(_object, typing.Tuple):
-            _object, _type = _object
+            subtitle_measure = _object.global_name or _object.name
         else:
-            _type = None
-        return await asyncio.to_thread(
-            self._generate_prefix_image,
-            _object=_object if _type is None else (_object, _type),
+            name = (
+                self.remove_unprintable_characters(_object.global_name)
+                if _object.global_name is not None and self._is_printable(_object.global_name)
+                else _object.name
+            )
+            name_measure = subtitle = subtitle_measure = None
+
+        # Events
+        events = 0
+        highest_event_value = 0
+        # Veiligheidscheck: custom_events kan soms leeg zijn
+        for item in member.get("custom_events") or []:
+            if item['event_bezocht'] not in ('Qmusic Foute Party: 24 - 26 juni 2022', 'Vakantie: 11-18 augustus 2023'):
+                events += 1
+                try:
+                    event_value = int(item["event_bezocht"].split()[1].strip(":"))
+                    if event_value > highest_event_value:
+                        highest_event_value = event_value
+                except (IndexError, ValueError):
+                    continue
+
+        return CardJob(
             size=size,
-            to_file=to_file,
-            _object_display=(
-                (await _object.display_avatar.read())
-                if isinstance(_object, discord.Member)
-                else (
-                    (await _object.display_icon.read())
-                    if isinstance(_object, discord.Role) and _object.display_icon is not None
-                    else None
-                )
-            ),
+            avatar=avatar,
+            name=name,
+            name_measure=name_measure,
+            subtitle=subtitle,
+            subtitle_measure=subtitle_measure,
+            role=f"{member.get('membership_type') if member.get('custom_status') == 'Actief' else ''}",
+            created_at=_object.created_at.strftime("%d %B %Y"),
+            joined_at=_object.joined_at.strftime("%d %B %Y"),
+            member_since=f"{datetime.strptime(member.get('custom_start_lidmaatschap'), '%Y-%m-%d').strftime('%d %B %Y') if member.get('custom_start_lidmaatschap') and  member.get('custom_status') == 'Actief' and  member.get('membership_type') == 'Lid' else '-'}",
+            involved_since=f"{datetime.strptime(member.get('custom_begin_datum'), '%Y-%m-%d').strftime('%d %B %Y') if member.get('custom_begin_datum') else '-'}",
+            events=events,
+            latest_event=f"{'Event ' + str(highest_event_value) if highest_event_value > 0 else '-'}",
+            encoder=encoder,
         )
 
-    def _generate_image(
-        self,
-        _object: discord.Member,
-        to_file: bool,
-        img: Image.Image,
-    ) -> typing.Union[Image.Image, discord.File]:
-        draw: ImageDraw.ImageDraw = ImageDraw.Draw(img)
-        align_text_center = functools.partial(self.align_text_center, draw)
-
-        # Data.
-        if isinstance(_object, (discord.Member)):
-            # FIX: Gebruik de nieuwe slimme functie
-            member = self.get_frappe_member_data(_object.id)
-
-            if member:
-                draw.rounded_rectangle((1306 - 125, 204, 1912, 585), radius=15, fill=(47, 49, 54))
-                align_text_center(
-                    (1325 - 125, 214, 1325 - 125, 284),
-                    text="Lidmaatschap",
-                    fill=(255, 255, 255),
-                    font=self.bold_font[40],
-                )
-                image = Image.open(self.icons["person"])
-                image = image.resize((70, 70))
-                img.paste(image, (1822, 214, 1892, 284), mask=image.split()[3])
-                draw.rounded_rectangle((1325 - 125, 301, 1892, 418), radius=15, fill=(32, 34, 37))
-                draw.rounded_rectangle((1325 - 125, 301, 1588 - 125, 418), radius=15, fill=(24, 26, 27))
-                align_text_center(
-                    (1326 - 125, 301, 1601 - 125, 418),
-                    text="Lid",
-                    fill=(255, 255, 255),
-                    font=self.bold_font[36],
-                )
-                align_text_center(
-                    (1601 - 125, 301, 1892, 418),
-                    text=f"{datetime.strptime(member.get('custom_start_lidmaatschap'), '%Y-%m-%d').strftime('%d %B %Y') if member.get('custom_start_lidmaatschap') and  member.get('custom_status') == 'Actief' and  member.get('membership_type') == 'Lid' else '-'}",
-                    fill=(255, 255, 255),
-                    font=self.font[36],
-                )
-                draw.rounded_rectangle((1325 - 125, 448, 1892, 565), radius=15, fill=(32, 34, 37))
-                draw.rounded_rectangle((1325 - 125, 448, 1601 - 125, 565), radius=15, fill=(24, 26, 27))
-                align_text_center(
-                    (1325 - 125, 448, 1601 - 125, 565),
-                    text="Betrokken",
-                    fill=(255, 255, 255),
-                    font=self.bold_font[30],
-                )
-                align_text_center(
-                    (1601 - 125, 448, 1892, 565),
-                    text=f"{datetime.strptime(member.get('custom_begin_datum'), '%Y-%m-%d').strftime('%d %B %Y') if member.get('custom_begin_datum') else '-'}",
-                    fill=(255, 255, 255),
-                    font=self.font[36],
-                )
-                
-                # Events
-                events = 0
-                highest_event_value = 0
-                # Veiligheidscheck: custom_events kan soms leeg zijn
-                if member.get("custom_events"):
-                    for item in member.get("custom_events"):
-                        if item['event_bezocht'] not in ('Qmusic Foute Party: 24 - 26 juni 2022', 'Vakantie: 11-18 augustus 2023'):
-                            events += 1
-                            try:
-                                event_value = int(item["event_bezocht"].split()[1].strip(":"))
-                                if event_value > highest_event_value:
-                                    highest_event = item['event_bezocht']
-                                    highest_event_value = event_value
-                            except (IndexError, ValueError):
-                                continue
-
-                draw.rounded_rectangle((1306 - 125, 615, 1912, 996), radius=15, fill=(47, 49, 54))
-                align_text_center(
-                    (1326 - 125, 625, 1326 - 125, 695),
-                    text="Events",
-                    fill=(255, 255, 255),
-                    font=self.bold_font[40],
-                )
-                image = Image.open(self.icons["game"])
-                image = image.resize((70, 70))
-                img.paste(image, (1822, 625, 1892, 695), mask=image.split()[3])
-                draw.rounded_rectangle((1326 - 125, 712, 1892, 829), radius=15, fill=(32, 34, 37))
-                draw.rounded_rectangle((1326 - 125, 712, 1601 - 125, 829), radius=15, fill=(24, 26, 27))
-                align_text_center(
-                    (1326 - 125, 712, 1601 - 125, 829), text="Totaal", fill=(255, 255, 255), font=self.bold_font[36]
-                )
-                align_text_center(
-                    (1601 - 125, 712, 1892, 829),
-                    text=(
-                        str(events)
-                    ),
-                    fill=(255, 255, 255),
-                    font=self.font[36],
-                )
-                draw.rounded_rectangle((1326 - 125, 859, 1892, 976), radius=15, fill=(32, 34, 37))
-                draw.rounded_rectangle((1326 - 125, 859, 1601 - 125, 976), radius=15, fill=(24, 26, 27))
-                align_text_center(
-                    (1326 - 125, 859, 1601 - 125, 976),
-                    text="Laatste",
-                    fill=(255, 255, 255),
-                    font=self.bold_font[36],
-                )
-                align_text_center(
-                    (1601 - 125, 859, 1892, 976),
-                    text=f"{'Event ' + str(highest_event_value) if highest_event_value > 0 else '-'}",
-                    fill=(255, 255, 255),
-                    font=self.font[36],
-                )
-        
-                if not to_file:
-                    return img
-                buffer = io.BytesIO()
-                img.save(buffer, format="png", optimize=True)
-                buffer.seek(0)
-                return discord.File(buffer, filename="image.png")
-
     async def generate_image(
         self,
         _object: discord.Member,
         to_file: bool = True,
     ) -> typing.Union[Image.Image, discord.File]:
-        img: Image.Image = await self.generate_prefix_image(
-            _object,
-            size=(1942, 1096),
-            to_file=False,
-        )  # (1940, 1481) / 1942 + 636
-        return await asyncio.to_thread(
-            self._generate_image,
-            _object,
-            to_file=to_file,
-            img=img,
-        )
+        try:
+            frappe = self._frappe()
+        except commands.UserFeedbackCheckFailure:
+            return None
+        member = await self.get_frappe_member_data(frappe, _object.id)
+        if not member:
+            return None
+        encoder = await self.get_encoder(_object.guild)
+        key = self.render_key(_object, member, encoder)
+        data = self.render_cache.get(key)
+        if data is None:
+            job = self._card_job(_object, member, await _object.display_avatar.read(), size=self.CARD_SIZE, encoder=encoder)
+            result = await self.renderer.render(job)
+            frappe.metrics.observe("render", "draw usercard", result.draw_seconds)
+            frappe.metrics.observe("render", f"encode {encoder.label}", result.encode_seconds, bytes_out=len(result.data))
+            data = result.data
+            self.render_cache.put(key, data)
+        if not to_file:
+            return Image.open(io.BytesIO(data))
+        return discord.File(io.BytesIO(data), filename=f"image.{encoder.extension}")
 
     # --- WRAPPED IMAGE GENERATOR ---
     async def generate_wrapped_image(
@@ -582,4 +348,92 @@ class usercard(Cog):
                 _object=member,
             ).start(ctx)
         else: 
-            await ctx.send('Niet mogelijk voor bot')
\ No newline at end of file
+            await ctx.send('Niet mogelijk voor bot')
+
+    @commands.is_owner()
+    @commands.group(name="usercardset")
+    async def usercardset(self, ctx: commands.Context) -> None:
+        """Instellingen voor het tekenen van usercards"""
+        pass
+
+    @usercardset.command(name="renderer")
+    async def usercardset_renderer(
+        self,
+        ctx: commands.Context,
+        modus: typing.Literal["thread", "process"],
+        workers: commands.Range[int, 0, 32] = 0,
+    ) -> None:
+        """
+        Kies waar usercards getekend worden
+
+        `thread` tekent in de bot zelf, `process` in aparte processen die elk een eigen core kunnen gebruiken.
+        `workers` is het aantal threads of processen, 0 kiest automatisch.
+        """
+        await self.config.render_mode.set(modus)
+        await self.config.render_workers.set(workers)
+        old = self.renderer
+        self.renderer = RenderExecutor(bundled_data_path(self), modus, workers or None, sizes=[self.CARD_SIZE])
+        self.renderer.start()
+        # Kaarten die nog in de oude pool staan worden afgemaakt
+        old.close()
+        await ctx.send(f"✅ Usercards worden getekend met `{modus}` en {self.renderer.workers} workers.")
+
+    @usercardset.group(name="encoder", invoke_without_command=True)
+    async def usercardset_encoder(self, ctx: commands.Context) -> None:
+        """
+        Toon hoe usercards opgeslagen worden
+
+        PNG met `optimaliseren` geeft de kleinste PNG maar kost de meeste CPU; een lager niveau of WebP is sneller.
+        De encodeertijd en grootte staan in `[p]frappe metrics` onder `render`.
+        """
+        global_encoder = Encoder.from_config(await self.config.encoder())
+        lines = [f"Globaal: `{global_encoder.label}`"]
+        if ctx.guild is not None:
+            guild_encoder = await self.config.guild(ctx.guild).encoder()
+            lines.append(f"Deze server: `{Encoder.from_config(guild_encoder).label}`" if guild_encoder else "Deze server: globaal")
+        await ctx.send("\n".join(lines))
+
+    async def _set_encoder(self, ctx: commands.Context, encoder: Encoder, server: bool) -> None:
+        if server:
+            if ctx.guild is None:
+                await ctx.send("Een server encoder kan alleen in een server ingesteld worden.")
+                return
+            await self.config.guild(ctx.guild).encoder.set(encoder.to_config())
+        else:
+            await self.config.encoder.set(encoder.to_config())
+        await ctx.send(f"✅ Usercards worden {'in deze server' if server else 'globaal'} opgeslagen als `{encoder.label}`.")
+
+    @usercardset_encoder.command(name="png")
+    async def usercardset_encoder_png(
+        self,
+        ctx: commands.Context,
+        niveau: commands.Range[int, 0, 9] = 6,
+        optimaliseren: bool = False,
+        server: bool = False,
+    ) -> None:
+        """Sla usercards op als PNG met zlib niveau 0-9, met `optimaliseren` zo klein mogelijk"""
+        await self._set_encoder(ctx, Encoder("png", compress_level=niveau, optimize=optimaliseren), server)
+
+    @usercardset_encoder.command(name="webp")
+    async def usercardset_encoder_webp(
+        self,
+        ctx: commands.Context,
+        kwaliteit: commands.Range[int, 0, 100] = 80,
+        lossless: bool = False,
+        server: bool = False,
+    ) -> None:
+        """Sla usercards op als WebP; bij `lossless` is `kwaliteit` de moeite, 0 is het snelst"""
+        await self._set_encoder(ctx, Encoder("webp", quality=kwaliteit, lossless=lossless), server)
+
+    @usercardset_encoder.command(name="reset")
+    async def usercardset_encoder_reset(self, ctx: commands.Context, server: bool = False) -> None:
+        """Zet de encoder terug naar de standaard, of laat deze server weer de globale gebruiken"""
+        if server:
+            if ctx.guild is None:
+                await ctx.send("Een server encoder kan alleen in een server ingesteld worden.")
+                return
+            await self.config.guild(ctx.guild).encoder.clear()
+            await ctx.send("✅ Deze server gebruikt weer de globale encoder.")
+        else:
+            await self.config.encoder.set(Encoder().to_config())
+            await ctx.send(f"✅ De globale encoder is weer `{Encoder().label}`.")